@@ -3,7 +3,11 @@
 from typing import Optional, List, Dict
 from pydantic import BaseModel
 
+from app.config import settings
 from app.integrations.gemini import generate
+from app.integrations.usage import usage_scope
+from app.services.context_packer import pack_context
+from app.services.stack_detector import detect_stack
 
 
 # === Response Schema ===
@@ -62,30 +66,49 @@ async def analyze_codebase(
     tree: str,
     files: list[dict],
     repo_name: str,
+    source_path: Optional[str] = None,
+    metrics: Optional[dict] = None,
 ) -> dict:
     """
     Analyze a codebase and generate stack migration recommendations.
-    Uses grounding to validate stack detection and provide accurate recommendations.
+    The stack is fingerprinted from dependency manifests; grounding is only
+    used to confirm it when the fingerprint is not confident enough.
     
     Args:
         tree: Directory tree structure
         files: List of {path, content, language} dicts
         repo_name: Name of the repository
+        source_path: Checkout root, lets the stack detector read manifests in full
+        metrics: Whole-tree line counts from the metrics engine (grounds complexity_score)
     
     Returns:
         AnalysisResult as dict
     """
-    # Build file context
+    # Build file context: most important files in full, the rest as outlines
+    packed = pack_context(files)
     file_context = "\n\n".join([
-        f"=== {f['path']} ({f['language']}) ===\n{f['content']}"
-        for f in files[:40]
+        f"=== {f['path']} ({f['language']}{', outline' if f['mode'] == 'outline' else ''}) ===\n{f['content']}"
+        for f in packed["files"]
     ])
-    
-    # Step 1: Quick heuristic detection
-    detected_stack = _detect_stack_heuristic(files, tree)
-    
-    # Step 2: Confirm with grounding
-    confirmed_stack = await _confirm_stack_with_grounding(detected_stack, files[:5])
+    if packed["omitted"]:
+        file_context += f"\n\n(Not shown, over budget: {', '.join(packed['omitted'][:50])})"
+    print(f"[Analyzer] Packed {len(packed['files'])} files (~{packed['tokens']} tokens), omitted {len(packed['omitted'])}")
+    
+    # Step 1: Fingerprint the stack from dependency manifests
+    fingerprint = detect_stack(files, source_path)
+    print(f"[Analyzer] Stack fingerprint: {fingerprint['stack']} (confidence {fingerprint['confidence']})")
+    
+    # Step 2: Confirm with grounding only when the manifests are inconclusive
+    if fingerprint["confidence"] >= settings.stack_detection_confidence_threshold:
+        confirmed_stack = fingerprint["stack"]
+        stack_source = "parsed from dependency manifests"
+    else:
+        # Highest-ranked files are the best evidence
+        with usage_scope(call_site="analyzer"):
+            confirmed_stack = await _confirm_stack_with_grounding(fingerprint, packed["files"][:5])
+        stack_source = "confirmed via web search"
+    
+    dependencies = ", ".join(fingerprint["dependencies"]) or "none found"
     
     # Build prompt
     prompt = f"""Analyze this legacy codebase: {repo_name}
@@ -98,8 +121,12 @@ async def analyze_codebase(
 ## Code
 {file_context}
 
-## Detected Stack (confirmed via web search)
+## Metrics (whole repository)
+{_format_metrics(metrics)}
+
+## Detected Stack ({stack_source})
 {confirmed_stack}
+Key dependencies: {dependencies}
 
 ## Your Task
 Analyze the logic deeply. 
@@ -110,7 +137,7 @@ Analyze the logic deeply.
 Return JSON with:
 
 - detected_stack: Use the confirmed stack above: "{confirmed_stack}"
-- complexity_score: 0-100 (how hard to migrate)
+- complexity_score: 0-100 (how hard to migrate; weigh the metrics above, not just the files shown)
 - complexity_reason: One sentence why
 - insight_title: The biggest modernization opportunity (catchy, specific)
 - insight_detail: 2-3 sentences. Identify specific files (e.g. portfolio.js) that contain critical logic.
@@ -123,11 +150,12 @@ Return JSON with:
 Remember: These are FULL STACK MIGRATIONS that Kandra will execute autonomously. Not quick fixes."""
     
     # Generate analysis with structured output
-    analysis = await generate(
-        prompt=prompt,
-        response_schema=AnalysisResult,
-        system_instruction=ANALYZER_SYSTEM_PROMPT,
-    )
+    with usage_scope(call_site="analyzer"):
+        analysis = await generate(
+            prompt=prompt,
+            response_schema=AnalysisResult,
+            system_instruction=ANALYZER_SYSTEM_PROMPT,
+        )
     
     # Ensure tree is included for the planner
     if isinstance(analysis, dict):
@@ -136,55 +164,38 @@ Remember: These are FULL STACK MIGRATIONS that Kandra will execute autonomously.
     return analysis
 
 
-def _detect_stack_heuristic(files: list[dict], tree: str) -> str:
-    """Fast heuristic stack detection based on file patterns."""
-    # Check for common framework indicators
-    if "package.json" in tree:
-        # Node.js project
-        for f in files:
-            if f['path'] == 'package.json':
-                content = f['content'].lower()
-                if 'express' in content:
-                    return "Express.js"
-                if 'fastify' in content:
-                    return "Fastify"
-                if 'next' in content:
-                    return "Next.js"
-                if 'react' in content:
-                    return "React"
-        return "Node.js"
-    
-    if "requirements.txt" in tree or "pyproject.toml" in tree:
-        # Python project
-        for f in files:
-            if f['path'] in ['requirements.txt', 'pyproject.toml']:
-                content = f['content'].lower()
-                if 'django' in content:
-                    return "Django"
-                if 'flask' in content:
-                    return "Flask"
-                if 'fastapi' in content:
-                    return "FastAPI"
-        return "Python"
-    
-    if "Gemfile" in tree:
-        return "Ruby on Rails"
-    
-    if "go.mod" in tree:
-        return "Go"
-    
-    if "Cargo.toml" in tree:
-        return "Rust"
-    
-    return "Unknown"
-
-
-async def _confirm_stack_with_grounding(initial_guess: str, sample_files: list[dict]) -> str:
-    """Use grounding to confirm and refine stack detection."""
+def _format_metrics(metrics: Optional[dict]) -> str:
+    """Render metrics as a compact table for the prompt."""
+    if not metrics:
+        return "Not available"
+    
+    totals = metrics["totals"]
+    lines = [
+        f"{totals['files']} files, {totals['code']} lines of code "
+        f"({totals['comment']} comment, {totals['blank']} blank), {totals['bytes'] // 1024} KB",
+        "",
+        "| Language | Files | Code | Comment |",
+        "|---|---|---|---|",
+    ]
+    for language, counts in list(metrics["languages"].items())[:10]:
+        lines.append(f"| {language} | {counts['files']} | {counts['code']} | {counts['comment']} |")
+    
+    if metrics.get("largest_files"):
+        lines.append("")
+        lines.append("Largest files: " + ", ".join(
+            f"{f['path']} ({f['lines']} lines)" for f in metrics["largest_files"][:5]
+        ))
+    return "\n".join(lines)
+
+
+async def _confirm_stack_with_grounding(fingerprint: dict, sample_files: list[dict]) -> str:
+    """Use grounding to confirm and refine a low-confidence stack fingerprint."""
     from app.integrations.gemini import generate_with_grounding
     
-    # Build evidence from sample files
-    evidence = "\n".join([
+    initial_guess = fingerprint["stack"]
+    
+    # Build evidence from the manifest findings and sample files
+    evidence = "\n".join(fingerprint["evidence"] + [
         f"File: {f['path']}\nContent preview: {f['content'][:200]}"
         for f in sample_files[:3]
     ])
@@ -11,6 +11,7 @@ import httpx
 from app.db.models import Job
 from app.agents.executor import ExecutorAgent
 from app.integrations import gemini
+from app.integrations.usage import usage_ledger, usage_scope
 
 logger = logging.getLogger(__name__)
 
@@ -87,7 +88,10 @@ class AuditAgent:
                 parity_score = max(0, int(100 - (error_rate * 100)))
 
             # Dossier generation
-            dossier = await self._generate_dossier(quality_metrics, type_coverage, integrity_data, security_data, parity_score, logic_map)
+            usage_ledger.attach(self.job)
+            with usage_scope(job_id=self.job.id, call_site="audit"):
+                dossier = await self._generate_dossier(quality_metrics, type_coverage, integrity_data, security_data, parity_score, logic_map)
+            usage_ledger.release(self.job)
             
             return {
                 "metrics": {
@@ -0,0 +1,61 @@
+"""Execution checkpoints - progress persisted at phase boundaries for resume.
+
+The executor writes a "checkpoint" JobEvent (is_checkpoint=1) whenever a
+phase finishes or fails:
+
+    {
+      "completed_phases": [phase ids],
+      "next_phase_index": index of the first incomplete phase (None when done),
+      "total_phases": int,
+      "tools": {package_manager, test_framework, build_tool, file_extensions},
+      "failure_lessons": {phase id: [lessons]},
+      "workspace_hash": digest of the target directory
+    }
+
+Resuming skips the completed phases; the workspace hash tells whether the
+files on disk are still the ones the checkpoint saw.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import JobEvent
+from app.services.scanner import SKIP_DIRS
+
+
+def workspace_hash(path: str) -> Optional[str]:
+    """
+    Digest of the relative paths and contents of the files below `path`
+    (dependency and build directories skipped). None if the path is missing.
+    """
+    if not os.path.isdir(path):
+        return None
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            digest.update(os.path.relpath(full_path, path).encode())
+            try:
+                with open(full_path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 16), b""):
+                        digest.update(block)
+            except OSError:
+                continue
+    return digest.hexdigest()
+
+
+async def latest_checkpoint(session: AsyncSession, job_id: str) -> Optional[Dict[str, Any]]:
+    """Payload of the job's most recent checkpoint, if any."""
+    result = await session.execute(
+        select(JobEvent)
+        .where(JobEvent.job_id == job_id, JobEvent.is_checkpoint == 1)
+        .order_by(JobEvent.created_at.desc())
+        .limit(1)
+    )
+    event = result.scalar_one_or_none()
+    return event.payload if event else None
@@ -3,7 +3,9 @@ import os
 import re
 import asyncio
 import difflib
-from typing import Any, Dict, List, Optional
+import traceback
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set
 from datetime import datetime
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,11 +13,18 @@ from google.genai import types
 
 from app.db.models import Job, JobEvent
 from app.integrations.redis_client import publish_event
-from app.integrations.gemini import get_client
+from app.integrations.gemini import create_context_cache, delete_context_cache, get_client, is_context_cache_error
+from app.integrations.model_router import ModelRouter
+from app.integrations.usage import TokenBudgetExceeded, usage_ledger, usage_scope
 from app.config import settings
+from app.services.clone import clone_service
+
+from app.agents.checkpoint import workspace_hash
+from app.agents.memory import ReActMemory
+from app.agents.phase_graph import build_dependencies, describe, normalize_target, target_files
 
 # Import tools
-from app.tools.base import BaseTool
+from app.tools.base import BaseTool, ToolResult
 from app.tools.shell import ShellTool
 from app.tools.file_ops import ListDirTool, ReadFileTool, WriteFileTool
 
@@ -28,12 +37,20 @@ class ToolArguments(BaseModel):
     max_depth: Optional[int] = Field(None, description="Recursion depth for list_dir")
     timeout: Optional[float] = Field(None, description="Optional custom timeout in seconds for run_command")
 
+class ToolCall(BaseModel):
+    tool: str = Field(description="The tool to call (run_command, read_file, etc.)")
+    args: Optional[ToolArguments] = Field(None, description="Arguments for the tool")
+
 class ExecutorAction(BaseModel):
     thought: str = Field(description="Internal reasoning about the next step")
     tool: Optional[str] = Field(None, description="The tool to call (run_command, read_file, etc.)")
     args: Optional[ToolArguments] = Field(None, description="Arguments for the tool")
+    actions: Optional[List[ToolCall]] = Field(None, description="Several tool calls for this step, run in order (instead of tool/args)")
     status: Optional[str] = Field(None, description="Set to 'complete' when the phase is finished")
 
+# Tools without side effects: consecutive calls to these run concurrently
+READ_ONLY_TOOLS = {"list_dir", "read_file"}
+
 EXECUTOR_SYSTEM_PROMPT_TEMPLATE = """You are an expert autonomous software engineer.
 Your task is to execute a specific phase of a migration plan.
 
@@ -79,6 +96,7 @@ You can:
 14. **Efficiency**: Batch your operations. Install multiple packages in one command.
 15. **Tool Schema**:
     - `run_command(command="...", timeout=...)` - Use `timeout` ONLY if you know a command takes longer than 60s.
+    - **Multiple Actions**: To make several independent calls in one step (e.g. read 4 legacy files), put them in `actions` instead of `tool`/`args`. They run in order; a failing `run_command`/`write_file` skips the rest of the batch.
 16. **PYTHON PROJECTS**:
     - **VIRTUAL ENV MANDATORY**: You MUST use a virtual environment. If `.venv` exists, use it. If not, create it (`python3 -m venv .venv`).
     - **PIP USAGE**: ALWAYS use `./.venv/bin/pip` (or `source .venv/bin/activate && pip`). NEVER use global `pip`.
@@ -91,7 +109,8 @@ You can:
     - **Analyze First**: Use your `thought` block to diagnose the failure based on the error output.
     - **Prove Hypothesis**: Before writing code to fix an error, use `read_file`, `ls`, or `diagnose` (if available) to verify your understanding of why it failed. 
     - **No Loop**: Repeating the same failed action with the same logic is a mark of stupidity. You MUST change your approach if the previous step failed.
-21. **REFLECTION**: Always look at the "FAILURE REFLECTION" block in your context. It contains a summarized history of what didn't work. Learn from it.
+21. **REFLECTION**: Always look at the "FAILURE LESSON" entries in your context. They summarize what didn't work. Learn from them.
+22. **CONTEXT**: The phase brief is the first message of the conversation. Later messages only carry observations and what changed; the brief stays in force for the whole phase.
 
 ## OUTPUT FORMAT
 You MUST output a JSON object matching the provided schema.
@@ -102,6 +121,15 @@ Example:
   "args": {{"command": "{package_manager} install pkg1 pkg2 pkg3"}}
 }}
 
+OR several calls in one step:
+{{
+  "thought": "I need the legacy models and routes before writing the new module.",
+  "actions": [
+    {{"tool": "read_file", "args": {{"path": "../source/models.js"}}}},
+    {{"tool": "read_file", "args": {{"path": "../source/routes.js"}}}}
+  ]
+}}
+
 OR if the phase is complete:
 {{
   "thought": "I have completed all tasks for this phase.",
@@ -110,6 +138,11 @@ OR if the phase is complete:
 """
 
 
+# Phase and step of the ReAct loop running in the current task (phases may run concurrently)
+_current_phase_id: ContextVar[Any] = ContextVar("executor_phase_id", default=None)
+_current_step: ContextVar[int] = ContextVar("executor_step", default=0)
+
+
 class ExecutorAgent:
     def __init__(self, job: Job, session: AsyncSession):
         self.job = job
@@ -136,10 +169,27 @@ class ExecutorAgent:
         self.activity_start_time = None
         self.activity_details = {}
         self.last_successful_action = None
-        self.current_phase_id = None
-        self.current_step = 0
+        self.activity_phase_id = None
+        self.activity_step = 0
         self.is_executing = False
         
+        # Explicit Gemini context caches holding each running phase's brief
+        self._phase_caches: Dict[Any, str] = {}
+        
+        # Concurrent phases: target files each running phase declared, and
+        # locks for the shared session, the per-phase workspace setup and
+        # the shell (commands share manifests, lockfiles and build output)
+        self._phase_claims: Dict[Any, Set[str]] = {}
+        self._session_lock = asyncio.Lock()
+        self._setup_lock = asyncio.Lock()
+        self._shell_lock = asyncio.Lock()
+        
+        # Tool schemas for the phase brief (see _tools_json)
+        self._tool_schemas: Optional[str] = None
+        
+        # Failure lessons per phase id (str), kept in checkpoints for resume
+        self._failure_lessons: Dict[str, List[str]] = {}
+        
         # 1. Determine stack-specific language lock whitelist
         self.allowed_extensions = self._get_allowed_extensions()
         
@@ -147,11 +197,34 @@ class ExecutorAgent:
         self.tools: Dict[str, BaseTool] = {
             "run_command": ShellTool(self.target_dir, allowed_extensions=self.allowed_extensions),
             "list_dir": ListDirTool(self.target_dir),
-            "read_file": ReadFileTool(self.target_dir),
+            "read_file": ReadFileTool(self.target_dir, materializer=self._materialize_source),
             "write_file": WriteFileTool(self.target_dir, allowed_extensions=self.allowed_extensions),
         }
 
 
+    @property
+    def current_phase_id(self) -> Any:
+        return _current_phase_id.get()
+
+    @current_phase_id.setter
+    def current_phase_id(self, value: Any):
+        _current_phase_id.set(value)
+
+    @property
+    def current_step(self) -> int:
+        return _current_step.get()
+
+    @current_step.setter
+    def current_step(self, value: int):
+        _current_step.set(value)
+
+    async def _materialize_source(self, full_path: str) -> bool:
+        """Fetch a legacy file that a sparse/partial clone left out of ../source."""
+        rel_path = os.path.relpath(os.path.abspath(full_path), os.path.abspath(self.source_dir))
+        if rel_path.startswith(".."):
+            return False
+        return await clone_service.materialize(self.source_dir, rel_path)
+
     def _setup_smart_wrappers(self):
         """Setup smart command wrappers based on discovered tools and target stack."""
         original_run_command = self.tools["run_command"].execute
@@ -299,12 +372,21 @@ class ExecutorAgent:
         # Default for JS or unknown
         return [".js", ".jsx"]
         
-    async def execute_plan(self, plan: Dict[str, Any]):
-        """Execute the migration plan phase by phase."""
+    async def execute_plan(self, plan: Dict[str, Any], resume_from: Optional[Dict[str, Any]] = None):
+        """
+        Execute the migration plan phase by phase.
+        
+        Args:
+            plan: The approved migration plan
+            resume_from: Checkpoint payload (see app/agents/checkpoint.py);
+                its completed phases are skipped
+        """
         print(f"⚡ [Executor] Starting execution for Job {self.job.id}")
         
-        # Extract discovered tools from plan
-        transformation = plan.get("transformation", {})
+        # Extract discovered tools from plan (a checkpoint's take precedence)
+        transformation = dict(plan.get("transformation", {}))
+        if resume_from:
+            transformation.update({k: v for k, v in (resume_from.get("tools") or {}).items() if v})
         self.package_manager = transformation.get("package_manager", "npm")  # fallback to npm
         self.test_framework = transformation.get("test_framework")
         self.build_tool = transformation.get("build_tool")
@@ -322,7 +404,12 @@ class ExecutorAgent:
             print(f"[Executor] Language lock updated to: {self.allowed_extensions}")
         
         # Update smart wrappers with discovered tools
+        self._serialize_shell()
         self._setup_smart_wrappers()
+        self._guard_concurrent_writes()
+        
+        # Continue the job's token accounting from planning
+        usage_ledger.attach(self.job)
         
         # Start watchdog for stuck detection
         self.is_executing = True
@@ -337,19 +424,38 @@ class ExecutorAgent:
                 await self._emit("execution_error", {"error": "Plan has no phases"})
                 return
 
-            for i, phase in enumerate(phases):
-                print(f"⚡ [Executor] Executing phase {i+1}/{len(phases)}: {phase.get('title')}")
-                await self._execute_phase(phase)
-                print(f"⚡ [Executor] Phase {i+1} complete")
+            completed = set()
+            if resume_from:
+                completed = set(resume_from.get("completed_phases") or [])
+                self._failure_lessons = dict(resume_from.get("failure_lessons") or {})
+                current_hash = await asyncio.to_thread(workspace_hash, self.target_dir)
+                workspace_matches = current_hash == resume_from.get("workspace_hash")
+                if not workspace_matches:
+                    print("[Executor] Workspace changed since the checkpoint; completed phases are still skipped")
+                await self._emit("execution_resumed", {
+                    "completed_phases": sorted(completed, key=str),
+                    "workspace_matches": workspace_matches,
+                })
+
+            await self._run_phase_graph(phases, completed)
                 
-            # All done
+            # All done: terminal, so a restart doesn't resume the job and the
+            # workspace reaper may expire it
             print("[Executor] All phases completed successfully")
+            self.job.status = "COMPLETED"  # Committed by the emit
+            usage_ledger.release(self.job)
             await self._emit("execution_complete", {"status": "success"})
+            await publish_event(f"job:{self.job.id}", {
+                "type": "status_changed",
+                "job_id": self.job.id,
+                "status": "COMPLETED",
+            })
             
         except Exception as e:
             print(f"[Executor] Transformation failed: {e}")
             traceback.print_exc()
             await self._emit("execution_error", {"error": str(e)})
+            raise
         
         finally:
             # Stop watchdog
@@ -359,10 +465,141 @@ class ExecutorAgent:
                 await watchdog_task
             except asyncio.CancelledError:
                 pass
-            raise
 
 
+    async def _run_phase_graph(self, phases: List[Dict[str, Any]], completed: Optional[Set[Any]] = None):
+        """
+        Run phases as soon as their dependencies are complete, up to
+        EXECUTOR_MAX_PARALLEL_PHASES at a time. Phases whose ids are in
+        `completed` are skipped. A checkpoint is written at every phase
+        boundary; a failure cancels the phases still running and is re-raised
+        once every phase that finished alongside it is recorded.
+        """
+        dependencies = build_dependencies(phases)
+        limit = max(1, settings.executor_max_parallel_phases)
+        await self._emit("phase_graph", {
+            "dependencies": describe(phases, dependencies),
+            "max_parallel": limit,
+        })
+        
+        done: Set[int] = {i for i, phase in enumerate(phases) if phase.get("id", i + 1) in (completed or set())}
+        pending = [i for i in range(len(phases)) if i not in done]
+        running: Dict[asyncio.Future, int] = {}
+        try:
+            while pending or running:
+                ready = [i for i in pending if dependencies[i] <= done]
+                if not ready and not running:
+                    # Declared depends_on form a cycle: fall back to plan order
+                    print(f"[Executor] Phase dependency cycle among {[i + 1 for i in pending]}; running in plan order")
+                    ready = pending[:1]
+                
+                for i in ready[:limit - len(running)]:
+                    pending.remove(i)
+                    print(f"⚡ [Executor] Executing phase {i+1}/{len(phases)}: {phases[i].get('title')}")
+                    running[asyncio.ensure_future(self._execute_phase(phases[i]))] = i
+                
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                failures = []
+                for task in finished:
+                    i = running.pop(task)
+                    if task.cancelled() or task.exception() is not None:
+                        failures.append((i, task))
+                    else:
+                        done.add(i)
+                        print(f"⚡ [Executor] Phase {i+1} complete")
+                # Phase boundary: persist progress (and failed phases' lessons)
+                await self._write_checkpoint(phases, done)
+                if failures:
+                    min(failures, key=lambda failure: failure[0])[1].result()  # Re-raise the first failure
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+    async def _write_checkpoint(self, phases: List[Dict[str, Any]], done: Set[int]):
+        """Persist a resumable checkpoint event (see app/agents/checkpoint.py)."""
+        next_index = next((i for i in range(len(phases)) if i not in done), None)
+        await self._emit("checkpoint", {
+            "completed_phases": [phases[i].get("id", i + 1) for i in sorted(done)],
+            "next_phase_index": next_index,
+            "total_phases": len(phases),
+            "tools": {
+                "package_manager": self.package_manager,
+                "test_framework": self.test_framework,
+                "build_tool": self.build_tool,
+                "file_extensions": self.discovered_extensions,
+            },
+            "failure_lessons": {k: v[-5:] for k, v in self._failure_lessons.items() if v},
+            "workspace_hash": await asyncio.to_thread(workspace_hash, self.target_dir),
+        }, checkpoint=True)
+
     async def _execute_phase(self, phase: Dict[str, Any]):
+        """Execute a single phase, releasing its context cache and file claims however it ends."""
+        phase_id = phase.get("id")
+        self._phase_claims[phase_id] = target_files(phase)
+        try:
+            await self._run_phase(phase)
+        finally:
+            self._phase_claims.pop(phase_id, None)
+            await self._release_phase_cache(phase_id)
+
+    def _serialize_shell(self):
+        """
+        Run one shell command at a time across concurrent phases: installs
+        and builds in different phases would race on package.json, lockfiles
+        and node_modules/.venv otherwise.
+        """
+        original_run_command = self.tools["run_command"].execute
+        
+        async def serialized_run_command(command: str, **kwargs):
+            async with self._shell_lock:
+                return await original_run_command(command, **kwargs)
+        
+        self.tools["run_command"].execute = serialized_run_command
+
+    def _guard_concurrent_writes(self):
+        """Refuse writes to a file that another running phase declared in its files_impacted."""
+        original_write = self.tools["write_file"].execute
+        
+        async def guarded_write(path: str, content: str, **kwargs):
+            target = normalize_target(path)
+            for phase_id, claims in self._phase_claims.items():
+                if phase_id != self.current_phase_id and target in claims:
+                    await self._emit("phase_conflict", {
+                        "phase_id": self.current_phase_id,
+                        "path": path,
+                        "owner_phase_id": phase_id,
+                    })
+                    return ToolResult(
+                        output="",
+                        error=f"CONFLICT: '{path}' belongs to phase {phase_id}, which is running concurrently. Leave it to that phase and continue with your own files."
+                    )
+            return await original_write(path, content, **kwargs)
+        
+        self.tools["write_file"].execute = guarded_write
+
+    async def _open_phase_cache(self, phase_id: Any, system_prompt: str, phase_brief: str) -> Optional[str]:
+        """
+        Register the static system prompt + phase brief as a Gemini context
+        cache so each ReAct step only sends history and the status delta.
+        Returns None when caching is unavailable (full prompts are sent).
+        """
+        name = await create_context_cache(
+            contents=[{"role": "user", "parts": [{"text": phase_brief}]}],
+            system_instruction=system_prompt,
+            display_name=f"kandra-{self.job.id}-phase-{phase_id}",
+        )
+        if name:
+            self._phase_caches[phase_id] = name
+        return name
+
+    async def _release_phase_cache(self, phase_id: Any):
+        name = self._phase_caches.pop(phase_id, None)
+        if name:
+            await delete_context_cache(name)
+
+    async def _run_phase(self, phase: Dict[str, Any]):
         """Execute a single phase using ReAct loop with Resilience Mastery."""
         
         phase_id = phase.get("id")
@@ -372,6 +609,9 @@ class ExecutorAgent:
         # Track phase info for diagnostics
         self.current_phase_id = phase_id
         
+        # Keep the workspace reaper away from this workspace
+        clone_service.touch(self.project_root)
+        
         await self._emit("phase_started", {
             "phase_id": phase_id, 
             "title": phase_title,
@@ -386,15 +626,16 @@ class ExecutorAgent:
             "phase_id": phase_id
         })
         
-        # 0. Python Environment Setup (Auto-Venv)
-        await self._ensure_python_venv()
+        async with self._setup_lock:
+            # 0. Python Environment Setup (Auto-Venv)
+            await self._ensure_python_venv()
 
-        # 1. Autonomous Purge: Clean the floor before the agent starts
-        purged_files = await self._purge_pollution()
+            # 1. Autonomous Purge: Clean the floor before the agent starts
+            purged_files = await self._purge_pollution()
         
         # 2. Context and Resilience State (Initialize BEFORE test gate)
-        history = [] # Proper role-based history: [{"role": "user" or "model", "content": "..."}]
-        failure_lessons = [] # List of unique failure summaries
+        history = ReActMemory() # Role-based turns [{"role": "user" or "model", "content": "..."}], older ones summarized
+        failure_lessons = self._failure_lessons.setdefault(str(phase_id), []) # Unique failure summaries (restored on resume)
         last_thought = ""
         max_steps = settings.agent_max_iterations if hasattr(settings, 'agent_max_iterations') else 50
         
@@ -404,6 +645,21 @@ class ExecutorAgent:
         
         action_history = [] # To detect tool loops
         
+        # Lessons restored from a checkpoint are shown once, like new ones
+        lessons_shown = max(0, len(failure_lessons) - 3)
+        
+        # Static per-phase prompt parts: the pinned first turn, or a context cache when possible
+        formatted_prompt = EXECUTOR_SYSTEM_PROMPT_TEMPLATE.format(
+            package_manager=self.package_manager or "npm",
+            test_framework=self.test_framework or "Not specified",
+            build_tool=self.build_tool or "Not specified"
+        )
+        phase_brief = self._build_phase_brief(phase, purged_files)
+        context_cache = await self._open_phase_cache(phase_id, formatted_prompt, phase_brief)
+        
+        # Routine steps may go to the fast model; failures escalate to the main one
+        router = ModelRouter("executor")
+        
         # 1.5 Pre-Execution Verification (Testing Phases Only)
         phase_lower = phase_title.lower()
         if "test" in phase_lower or "verif" in phase_lower or "qa" in phase_lower:
@@ -411,6 +667,7 @@ class ExecutorAgent:
             success, output = await self._run_test_gate()
             if not success:
                  print("[Test Gate] Initial baseline check FAILED.")
+                 router.escalate("failing baseline tests")
                  history.append({
                      "role": "user",
                      "content": f"PRE-CONDITION WARNING: The test suite is FAILING at the start of this phase. Your priority is to fix the environment or code before proceeding.\n\nERROR:\n{output[-1000:]}"
@@ -427,32 +684,24 @@ class ExecutorAgent:
                 if all(a == last_3[0] for a in last_3):
                     loop_warning = f"\n TOOL LOOP DETECTED: You have attempted {last_3[0][0]} 3 times with identical parameters. You MUST change your strategy.\n"
                     print(f"[Executor] Tool Loop Buster Triggered!")
+                    router.escalate("tool loop")
 
-            # 2. Build Multi-Turn Context (Strict Alternation)
-            reflection_str = "\n".join([f"- {l}" for l in failure_lessons[-3:]])
-            current_prompt = self._build_context(phase, [], purged_files, loop_warning, reflection_str)
-            
-            # Gemini strictly alternates User -> Model -> User
-            messages = []
+            # 2. Build Multi-Turn Context: pinned brief, history, status delta
+            new_lessons = failure_lessons[lessons_shown:]
+            lessons_shown = len(failure_lessons)
+            if new_lessons:
+                # Kept in history (not re-sent per step) until memory summarizes it
+                history.append({
+                    "role": "user",
+                    "content": "\n".join(f"FAILURE LESSON (LEARN FROM THIS): {l}" for l in new_lessons)
+                })
+            current_status = self._build_status(loop_warning)
             
-            if not history:
-                # Turn 1: Just the preamble
-                messages.append({"role": "user", "parts": [{"text": current_prompt}]})
-            else:
-                # Turns 2+: Build from history but MERGE the current_prompt into the last turn 
-                # to maintain strict alternation if history ends with user (observation)
-                for h in history[:-1]:
-                    messages.append({"role": h["role"], "parts": [{"text": h["content"]}]})
-                
-                last_turn = history[-1]
-                if last_turn["role"] == "user":
-                    # Merge current_prompt into the observation turn
-                    merged_content = f"{last_turn['content']}\n\n--- CURRENT STATUS ---\n{current_prompt}"
-                    messages.append({"role": "user", "parts": [{"text": merged_content}]})
-                else:
-                    # History ends with model? (Shouldn't happen with our cleanup, but safety first)
-                    messages.append({"role": last_turn["role"], "parts": [{"text": last_turn["content"]}]})
-                    messages.append({"role": "user", "parts": [{"text": current_prompt}]})
+            # The context cache belongs to the main model; the fast model gets the brief inline
+            model, route_reason = router.choose()
+            step_cache = None if router.is_fast(model) else context_cache
+            turns = self._build_turns(None if step_cache else phase_brief, history, current_status)
+            messages = [{"role": t["role"], "parts": [{"text": t["content"]}]} for t in turns]
 
             # 3. Call LLM with formatted system prompt
             try:
@@ -463,22 +712,24 @@ class ExecutorAgent:
                 await self._set_activity("waiting_for_llm", {
                     "step": step + 1,
                     "max_steps": max_steps,
-                    "prompt_size_chars": len(current_prompt),
-                    "history_length": len(history)
+                    "prompt_size_chars": sum(len(t["content"]) for t in turns),
+                    "history_length": len(history),
+                    "history_tokens": history.tokens,
+                    "model": model,
+                    "route": route_reason,
                 })
                 
-                # Format system prompt with discovered tools
-                formatted_prompt = EXECUTOR_SYSTEM_PROMPT_TEMPLATE.format(
-                    package_manager=self.package_manager or "npm",
-                    test_framework=self.test_framework or "Not specified",
-                    build_tool=self.build_tool or "Not specified"
-                )
-                
-                action_raw = await generate(
-                    prompt=messages, # Pass the list of messages!
-                    system_instruction=formatted_prompt,
-                    response_schema=ExecutorAction
-                )
+                await self._check_token_budget()
+                with self._usage_scope():
+                    action_raw = await generate(
+                        prompt=messages, # Pass the list of messages!
+                        system_instruction=formatted_prompt,
+                        response_schema=ExecutorAction,
+                        cache=False,  # A repeated step must get a fresh decision
+                        cached_content=step_cache,
+                        model=model,
+                    )
+                self.job.token_usage = usage_ledger.snapshot(self.job.id)  # Committed by the next _emit
                 
                 action_data = self._parse_action(action_raw)
                 thought = action_data.get("thought", "")
@@ -488,6 +739,7 @@ class ExecutorAgent:
                     similarity = difflib.SequenceMatcher(None, thought, last_thought).ratio()
                     if similarity > 0.85:
                         print(f"⚔️ [Executor] Thought Loop Detected ({similarity:.2f})!")
+                        router.escalate("thought loop")
                         history.append({"role": "model", "content": json.dumps(action_data)})
                         history.append({
                             "role": "user", 
@@ -498,24 +750,33 @@ class ExecutorAgent:
                 last_thought = thought
                 print(f"[Executor] Agent Action: {json.dumps(action_data)}")
                 
+            except TokenBudgetExceeded:
+                raise
             except Exception as e:
                 print(f"[Executor] LLM generation failed: {e}")
-                await asyncio.sleep(2) # Prevent fast-failing infinite loops
+                if step_cache and is_context_cache_error(e):
+                    # Cache expired or was evicted: fall back to full prompts
+                    self._phase_caches.pop(phase_id, None)
+                    context_cache = None
+                    continue
+                # Retries already happened in the rate limiter; wait out an open circuit
+                await asyncio.sleep(getattr(e, "retry_after", None) or 2) # Prevent fast-failing infinite loops
                 if step > 10 and "400" in str(e):
                     # If we keep getting 400 errors, stop the bleeding
                     raise Exception(f"Persistent LLM Error: {e}")
                 continue
 
             # 4. Check for Hallucination (Thought but no action)
-            tool_name = action_data.get("tool")
+            calls = self._tool_calls(action_data)
             status = action_data.get("status")
             
-            if not tool_name and status != "complete" and status != "incomplete" and status != "blocked":
+            if not calls and status != "complete" and status != "incomplete" and status != "blocked":
                 print("[Executor] Hallucination Nudge: Agent thought but didn't act.")
+                router.escalate("no action")
                 history.append({"role": "model", "content": json.dumps(action_data)})
                 history.append({
                     "role": "user",
-                    "content": "Error: You provided a thought but no 'tool' or 'status'. You MUST provide a concrete action or signal that you are finished."
+                    "content": "Error: You provided a thought but no 'tool', 'actions' or 'status'. You MUST provide a concrete action or signal that you are finished."
                 })
                 continue
 
@@ -541,6 +802,7 @@ class ExecutorAgent:
                             break
                     if not all_passed:
                         print("[Test Gate] Plan Verification Failed!")
+                        router.escalate("test gate failed")
                         error_msg = f"BLOCKING: Phase verification FAILED.\n\nERROR:\n{fail_output[-2000:]}"
                         history.append({"role": "user", "content": error_msg})
                         # Update Reflection
@@ -550,6 +812,7 @@ class ExecutorAgent:
                 elif "test" in phase_title.lower() or "verif" in phase_title.lower():
                     success, output = await self._run_test_gate()
                     if not success:
+                        router.escalate("test gate failed")
                         error_msg = f"BLOCKING: Heuristic verification FAILED.\n\nERROR:\n{output[-2000:]}"
                         history.append({"role": "user", "content": error_msg})
                         lesson = f"Attempted to finish phase but automated test gate failed with output: {output[-200:]}"
@@ -561,74 +824,45 @@ class ExecutorAgent:
                 return
             
             if status in ["incomplete", "blocked"]:
+                if router.is_fast(model):
+                    # Only the main model may give up on a phase
+                    print(f"[Executor] Fast model signaled {status}; retrying the step with the main model")
+                    router.escalate(f"fast model signaled {status}")
+                    continue
                 reason = action_data.get("thought", "Agent signaled failure")
                 print(f"[Executor] Agent gave up: {status} - {reason}")
                 await self._emit("phase_error", {"phase_id": phase_id, "error": f"Agent {status}: {reason}"})
                 raise Exception(f"Phase {phase_id} terminated by agent ({status}): {reason}")
 
-            # 5. Execute Tool
-            tool_name = action_data.get("tool")
-            tool_args = action_data.get("args", {})
-            # Filter out None values to prevent "unexpected keyword argument" errors
-            if isinstance(tool_args, dict):
-                tool_args = {k: v for k, v in tool_args.items() if v is not None}
-                
+            # 5. Execute Tools
+            tool_names = [call["tool"] for call in calls]
             thought = action_data.get("thought", "")
             
             await self._emit("agent_thought", {
                 "phase_id": phase_id,
                 "thought": thought,
-                "tool": tool_name
+                "tool": tool_names[0],
+                "tools": tool_names
             })
             
-            # Track activity: executing tool
+            # Track activity: executing tools
             await self._set_activity("executing_tool", {
-                "tool": tool_name,
-                "args": tool_args,
+                "tool": ", ".join(tool_names),
+                "args": calls[0]["args"] if len(calls) == 1 else [call["args"] for call in calls],
                 "step": step + 1
             })
             
-            result_output = ""
-            command_failed = False
-            if tool_name in self.tools:
-                try:
-                    tool = self.tools[tool_name]
-                    result = await tool.execute(**tool_args)
-                    result_output = result.output or result.error or "Success"
-                    
-                    # Check if command failed (for grounding trigger)
-                    if result.error and tool_name == "run_command":
-                        command_failed = True
-                    
-                    # === Telemetry: Broadcast Code Actions ===
-                    if tool_name == "run_command":
-                        output_to_send = result_output
-                        if not output_to_send or not output_to_send.strip():
-                             output_to_send = "[Command finished with no output]"
-                             
-                        await self._emit("terminal_output", {
-                            "command": tool_args.get("command"),
-                            "output": output_to_send
-                        })
-                        
-                    elif tool_name == "write_file":
-                        # Determine if create or modify (simple heuristic)
-                        # We just emit 'file_modified' for now as the UI handles it broadly
-                        await self._emit("file_modified", {
-                            "path": tool_args.get("path"),
-                            "content": tool_args.get("content")
-                        })
-                        
-                    elif tool_name == "read_file":
-                        # useful to show what the agent is looking at, but maybe not strictly 'modified'
-                        pass
-                        
-
-                except Exception as e:
-                    result_output = f"Tool execution error: {str(e)}"
-                    command_failed = True
-            else:
-                result_output = f"Error: Tool '{tool_name}' not found."
+            results = await self._run_tools(calls)
+            
+            for call_result in results:
+                router.record_tool(call_result["tool"], call_result["succeeded"])
+            
+            failed = next((r for r in results if r["command_failed"]), None)
+            command_failed = failed is not None
+            tool_name = failed["tool"] if failed else tool_names[-1]
+            tool_args = failed["args"] if failed else calls[-1]["args"]
+            result_output = self._combine_observations(results)
+            tool_succeeded = all(r["succeeded"] for r in results)
             
             # Track successful action (if not failed)
             if not command_failed:
@@ -651,7 +885,7 @@ class ExecutorAgent:
                 # Trigger grounding after 2 consecutive failures
                 if consecutive_failures >= 2:
                     print(f"[Executor] Command failed {consecutive_failures} times, searching for solution...")
-                    solution = await self._search_for_solution(result_output, cmd)
+                    solution = await self._search_for_solution(failed["output"], cmd)
                     
                     # Inject solution into history before observation
                     history.append({
@@ -660,7 +894,8 @@ class ExecutorAgent:
                     })
                     history.append({
                         "role": "user",
-                        "content": f"Observation: {result_output[:2000]}\n\n🔍 SOLUTION SUGGESTION (from web search):\n{solution}\n\nTry this approach or an alternative based on the research above."
+                        "content": f"Observation: {result_output}\n\n🔍 SOLUTION SUGGESTION (from web search):\n{solution}\n\nTry this approach or an alternative based on the research above.",
+                        "calls": results,
                     })
                     consecutive_failures = 0  # Reset after providing help
                     continue  # Skip normal history update, we already added it
@@ -669,8 +904,8 @@ class ExecutorAgent:
 
             # 7. Update action history for Loop Buster
             # We hash the args to quickly compare
-            args_str = json.dumps(tool_args, sort_keys=True)
-            action_history.append((tool_name, args_str))
+            args_str = json.dumps([call["args"] for call in calls], sort_keys=True)
+            action_history.append(("+".join(tool_names), args_str))
 
             # 8. Update ReAct History with Correct Roles
             # Add Model turn
@@ -680,25 +915,140 @@ class ExecutorAgent:
             })
             
             # Add User turn (The observation)
-            truncated_result = result_output[:2000] + ("\n... [Truncated]" if len(result_output) > 2000 else "")
             history.append({
                 "role": "user",
-                "content": f"Observation: {truncated_result}"
+                "content": f"Observation: {result_output}",
+                "succeeded": tool_succeeded,
+                "calls": results,
             })
-            
-            
-            # 8. Context Pruning (Preserve context)
-            prune_threshold = 40
-            if step > prune_threshold:
-                # Keep last 15 turns (model+user pairs) 
-                if len(history) > 30:
-                    history = history[-30:]
+            # (ReActMemory folds old turns into its summary to stay within budget)
 
         # If we reach here, max steps exceeded
         print(f"Phase {phase_id} max steps exceeded")
         await self._emit("phase_error", {"phase_id": phase_id, "error": f"Max steps exceeded ({max_steps})"})
         raise Exception(f"Phase {phase_id} failed to complete in {max_steps} steps")
 
+    def _tool_calls(self, action_data: Dict) -> List[Dict[str, Any]]:
+        """
+        Tool calls of an action: its `actions` list, or the single tool/args.
+        Unset args are dropped to prevent "unexpected keyword argument" errors.
+        """
+        raw_calls = action_data.get("actions") or []
+        if not raw_calls and action_data.get("tool"):
+            raw_calls = [{"tool": action_data["tool"], "args": action_data.get("args")}]
+        
+        calls = []
+        for call in raw_calls[:settings.executor_max_actions_per_step]:
+            if not isinstance(call, dict) or not call.get("tool"):
+                continue
+            args = call.get("args") if isinstance(call.get("args"), dict) else {}
+            calls.append({"tool": call["tool"], "args": {k: v for k, v in args.items() if v is not None}})
+        return calls
+
+    async def _run_tools(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run a step's tool calls. Consecutive read-only calls run concurrently;
+        anything else runs alone, in order. A failed side-effecting call skips
+        the rest of the batch, since later calls usually depend on it.
+        
+        Returns:
+            One result per call (see _run_tool), in call order
+        """
+        results: List[Dict[str, Any]] = []
+        i = 0
+        while i < len(calls):
+            if calls[i]["tool"] in READ_ONLY_TOOLS:
+                j = i
+                while j < len(calls) and calls[j]["tool"] in READ_ONLY_TOOLS:
+                    j += 1
+                results.extend(await asyncio.gather(*(self._run_tool(c["tool"], c["args"]) for c in calls[i:j])))
+                i = j
+                continue
+            
+            result = await self._run_tool(calls[i]["tool"], calls[i]["args"])
+            results.append(result)
+            i += 1
+            if not result["succeeded"] and i < len(calls):
+                for skipped in calls[i:]:
+                    results.append({
+                        "tool": skipped["tool"],
+                        "args": skipped["args"],
+                        "output": f"Skipped: the previous {calls[i - 1]['tool']} call failed.",
+                        "succeeded": False,
+                        "command_failed": False,
+                        "skipped": True,
+                    })
+                break
+        return results
+
+    async def _run_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute one tool call and broadcast its telemetry.
+        
+        Returns:
+            Dict with tool, args, output, succeeded and command_failed
+            (a failed run_command or a tool exception; triggers grounding)
+        """
+        result_output = ""
+        command_failed = False
+        succeeded = False
+        if tool_name in self.tools:
+            try:
+                tool = self.tools[tool_name]
+                result = await tool.execute(**tool_args)
+                result_output = result.output or result.error or "Success"
+                succeeded = not result.error
+                
+                # Check if command failed (for grounding trigger)
+                if result.error and tool_name == "run_command":
+                    command_failed = True
+                
+                # === Telemetry: Broadcast Code Actions ===
+                if tool_name == "run_command":
+                    output_to_send = result_output
+                    if not output_to_send or not output_to_send.strip():
+                         output_to_send = "[Command finished with no output]"
+                         
+                    await self._emit("terminal_output", {
+                        "command": tool_args.get("command"),
+                        "output": output_to_send
+                    })
+                    
+                elif tool_name == "write_file":
+                    # We just emit 'file_modified' for now as the UI handles it broadly
+                    await self._emit("file_modified", {
+                        "path": tool_args.get("path"),
+                        "content": tool_args.get("content")
+                    })
+
+            except Exception as e:
+                result_output = f"Tool execution error: {str(e)}"
+                command_failed = True
+        else:
+            result_output = f"Error: Tool '{tool_name}' not found."
+        
+        return {
+            "tool": tool_name,
+            "args": tool_args,
+            "output": result_output,
+            "succeeded": succeeded,
+            "command_failed": command_failed,
+        }
+
+    def _combine_observations(self, results: List[Dict[str, Any]]) -> str:
+        """One observation for the step; each call's output is truncated to 2000 chars."""
+        def truncated(output: str) -> str:
+            return output[:2000] + ("\n... [Truncated]" if len(output) > 2000 else "")
+        
+        if len(results) == 1:
+            return truncated(results[0]["output"])
+        
+        sections = []
+        for n, r in enumerate(results, 1):
+            target = r["args"].get("command") or r["args"].get("path") or ""
+            sections.append(f"[{n}] {r['tool']}({target}):\n{truncated(r['output'])}")
+        return "\n\n".join(sections)
+
     def _parse_action(self, raw: Any) -> Dict:
         """Robustly parse the action JSON from LLM."""
         if isinstance(raw, dict): return raw
@@ -742,10 +1092,12 @@ Be concise and actionable."""
         print(f"[Executor] Searching for solution to error...")
         
         try:
-            result = await generate_with_grounding(
-                prompt=search_prompt,
-                system_instruction="You are a debugging assistant. Search for solutions to migration errors and provide concise, actionable fixes based on official documentation."
-            )
+            with self._usage_scope():
+                result = await generate_with_grounding(
+                    prompt=search_prompt,
+                    system_instruction="You are a debugging assistant. Search for solutions to migration errors and provide concise, actionable fixes based on official documentation."
+                )
+            self.job.token_usage = usage_ledger.snapshot(self.job.id)
             
             solution = result['text']
             sources = result['grounding_metadata'].get('sources', [])
@@ -765,11 +1117,36 @@ Be concise and actionable."""
             return f"Unable to search for solution (grounding error: {str(e)}). Try a different approach based on the error message."
 
 
+    def _usage_scope(self):
+        """Attribute LLM calls to this job and the current phase/step."""
+        return usage_scope(
+            job_id=self.job.id,
+            phase_id=self.current_phase_id,
+            step=self.current_step,
+            call_site="executor",
+        )
+
+    async def _check_token_budget(self):
+        """Stop the phase once the job has used its token budget."""
+        try:
+            usage_ledger.check_budget(self.job)
+        except TokenBudgetExceeded as e:
+            print(f"[Executor] {e}")
+            await self._emit("token_budget_exceeded", {
+                "phase_id": self.current_phase_id,
+                "step": self.current_step,
+                "used_tokens": usage_ledger.total_tokens(self.job.id),
+                "budget": usage_ledger.budget_for(self.job),
+            })
+            raise
+
     async def _set_activity(self, activity: str, details: dict = None):
         """Track current agent activity and emit to frontend."""
         self.current_activity = activity
         self.activity_start_time = datetime.utcnow()
         self.activity_details = details or {}
+        self.activity_phase_id = self.current_phase_id
+        self.activity_step = self.current_step
         
         await self._emit("activity_update", {
             "activity": activity,
@@ -798,8 +1175,8 @@ Be concise and actionable."""
                         "duration_seconds": int(duration),
                         "last_successful_action": self.last_successful_action,
                         "diagnostics": diagnostics,
-                        "phase_id": self.current_phase_id,
-                        "step": self.current_step
+                        "phase_id": self.activity_phase_id,
+                        "step": self.activity_step
                     })
     
     def _get_stuck_diagnostics(self, duration: float) -> dict:
@@ -840,18 +1217,10 @@ Be concise and actionable."""
         return diagnostics
 
 
-    def _build_context(self, phase: Dict[str, Any], history: List[Dict[str, str]], purged_files: List[str] = None, loop_warning: str = "", failure_reflection: str = "") -> str:
-        """Construct the prompt context with Resilience warnings and Failure Reflection."""
+    def _build_phase_brief(self, phase: Dict[str, Any], purged_files: List[str] = None) -> str:
+        """Static part of the prompt: layout, stack constraints, phase brief and tool schemas."""
         
-        # Tool schemas
-        tools_json = json.dumps([
-            {
-                "name": name, 
-                "description": tool.description, 
-                "args": tool.get_schema()
-            } 
-            for name, tool in self.tools.items()
-        ], indent=2)
+        tools_json = self._tools_json()
         
         task_list = "\n".join([f"- {t}" for t in phase.get("tasks", [])])
         instructions = "\n".join([f"- {i}" for i in phase.get("instructions", [])])
@@ -884,9 +1253,7 @@ STACK DNA (HARD CONSTRAINTS):
 - Allowed Extensions: {', '.join(self.allowed_extensions)}
 - Lock Status: ACTIVE (Tool-level enforcement enabled)
 - Research Rule: HelpFirst protocol applies. RUN `<tool> --help` before first use.
-{purge_context}{loop_warning}
-FAILURE REFLECTION (LEARN FROM THIS):
-{failure_reflection if failure_reflection else "No previous failures in this phase."}
+{purge_context}
 CURRENT PHASE: {phase.get("title")}
 DESCRIPTION: {phase.get("description")}
 
@@ -905,11 +1272,44 @@ PHASE VERIFICATION (MANDATORY SUCCESS):
 
 AVAILABLE TOOLS:
 {tools_json}
-
-What is your next action? (Response MUST be JSON)
 """
         return prompt
 
+    def _tools_json(self) -> str:
+        """Tool schemas for the brief, serialized once per agent."""
+        if self._tool_schemas is None:
+            self._tool_schemas = json.dumps([
+                {
+                    "name": name,
+                    "description": tool.description,
+                    "args": tool.get_schema()
+                }
+                for name, tool in self.tools.items()
+            ], separators=(",", ":"))
+        return self._tool_schemas
+
+    def _build_status(self, loop_warning: str = "") -> str:
+        """Status delta sent with each step (new failure lessons go into the history)."""
+        if loop_warning:
+            return f"{loop_warning.strip()}\n\nWhat is your next action? (Response MUST be JSON)"
+        return "What is your next action? (Response MUST be JSON)"
+
+    def _build_turns(self, phase_brief: Optional[str], history: ReActMemory, status: str) -> List[Dict[str, str]]:
+        """
+        Conversation for one step: the brief as the pinned first turn (None when
+        it lives in the context cache), the history, and the status delta merged
+        into the last user turn. Same-role neighbours are merged so turns
+        alternate, and the brief keeps the request prefix stable across steps.
+        """
+        turns: List[Dict[str, str]] = []
+        opening = [{"role": "user", "content": phase_brief}] if phase_brief else []
+        for turn in opening + history.turns() + [{"role": "user", "content": status}]:
+            if turns and turns[-1]["role"] == turn["role"]:
+                turns[-1] = {"role": turn["role"], "content": f"{turns[-1]['content']}\n\n{turn['content']}"}
+            else:
+                turns.append(dict(turn))
+        return turns
+
     async def _ensure_python_venv(self):
         """Standardize Python environment: Create/verify .venv."""
         stack = self.job.target_stack.lower()
@@ -984,7 +1384,7 @@ What is your next action? (Response MUST be JSON)
         
         return purged_files
 
-    async def _emit(self, event_type: str, payload: Dict[str, Any]):
+    async def _emit(self, event_type: str, payload: Dict[str, Any], checkpoint: bool = False):
         """
         Dual-Write Emit:
         1. Persist to DB (Source of Truth)
@@ -995,10 +1395,12 @@ What is your next action? (Response MUST be JSON)
             event = JobEvent(
                 job_id=self.job.id,
                 event_type=event_type,
-                payload=payload
+                payload=payload,
+                is_checkpoint=1 if checkpoint else 0
             )
-            self.session.add(event)
-            await self.session.commit()
+            async with self._session_lock:  # Concurrent phases share the session
+                self.session.add(event)
+                await self.session.commit()
             
             # 2. RAM Broadcast (Speed)
             from app.integrations.event_bus import bus
@@ -0,0 +1,169 @@
+"""ReAct memory - recent turns verbatim, older turns folded into a running summary.
+
+The executor appends turns as {"role": "user"|"model", "content": str}. A
+model turn holds the action JSON; the observation turn after it may carry
+"succeeded" (bool) and, for multi-action steps, "calls" (one dict per tool
+call with tool, args, output, succeeded and skipped). Once the verbatim turns exceed the token budget, the
+oldest ones are evicted into a deterministic summary of files written,
+commands that succeeded or failed, key errors and warnings, so prompt size
+stays flat however long a phase runs.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+
+# Entries kept per summary section
+MAX_FILES = 20
+MAX_COMMANDS = 8
+MAX_ERRORS = 5
+MAX_NOTES = 5
+
+ERROR_LINE = re.compile(r"(error|exception|traceback|failed|not found|cannot|denied)", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _first_error_line(text: str) -> Optional[str]:
+    for line in text.splitlines():
+        if ERROR_LINE.search(line):
+            return line.strip()[:160]
+    return None
+
+
+def _append_unique(items: List[str], item: str, limit: int):
+    if item in items:
+        items.remove(item)
+    items.append(item)
+    del items[:-limit]
+
+
+class ReActMemory:
+    """Token-bounded conversation history for one executor phase."""
+
+    def __init__(self, token_budget: Optional[int] = None, min_turns: Optional[int] = None):
+        self.token_budget = token_budget or settings.react_memory_token_budget
+        self.min_turns = min_turns or settings.react_memory_min_turns
+        self._turns: List[Dict[str, Any]] = []
+        self._tokens = 0
+
+        # Running summary of evicted turns
+        self.summarized_steps = 0
+        self.files_written: List[str] = []
+        self.files_inspected: List[str] = []
+        self.commands_succeeded: List[str] = []
+        self.commands_failed: Dict[str, str] = {}
+        self.errors: List[str] = []
+        self.notes: List[str] = []
+        self._pending_action: Optional[dict] = None
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def __bool__(self) -> bool:
+        return bool(self._turns) or self.summarized_steps > 0 or bool(self.notes)
+
+    @property
+    def tokens(self) -> int:
+        """Estimated tokens of the verbatim turns plus the summary."""
+        return self._tokens + estimate_tokens(self.summary())
+
+    def append(self, turn: Dict[str, Any]):
+        self._turns.append(turn)
+        self._tokens += estimate_tokens(turn["content"])
+        while self._tokens > self.token_budget and len(self._turns) > self.min_turns:
+            self._evict()
+
+    def turns(self) -> List[Dict[str, str]]:
+        """Summary (as the first user turn) plus recent turns, same-role turns merged."""
+        turns: List[Dict[str, str]] = []
+        summary = self.summary()
+        if summary:
+            turns.append({"role": "user", "content": summary})
+        for turn in self._turns:
+            if turns and turns[-1]["role"] == turn["role"]:
+                turns[-1] = {"role": turn["role"], "content": f"{turns[-1]['content']}\n\n{turn['content']}"}
+            else:
+                turns.append({"role": turn["role"], "content": turn["content"]})
+        return turns
+
+    def summary(self) -> str:
+        """Deterministic digest of everything evicted so far ("" if nothing was)."""
+        if not (self.summarized_steps or self.notes):
+            return ""
+        lines = [f"EARLIER IN THIS PHASE (summary of {self.summarized_steps} earlier steps):"]
+        if self.files_written:
+            lines.append(f"- Files written: {', '.join(self.files_written)}")
+        if self.files_inspected:
+            lines.append(f"- Files/dirs inspected: {', '.join(self.files_inspected)}")
+        if self.commands_succeeded:
+            lines.append("- Commands that succeeded: " + ", ".join(f"`{c}`" for c in self.commands_succeeded))
+        for command, error in self.commands_failed.items():
+            lines.append(f"- FAILED: `{command}` -> {error}")
+        for error in self.errors:
+            lines.append(f"- Error seen: {error}")
+        for note in self.notes:
+            lines.append(f"- Note: {note}")
+        return "\n".join(lines)
+
+    def _evict(self):
+        turn = self._turns.pop(0)
+        self._tokens -= estimate_tokens(turn["content"])
+
+        if turn["role"] == "model":
+            try:
+                action = json.loads(turn["content"])
+            except ValueError:
+                action = None
+            self._pending_action = action if isinstance(action, dict) else None
+            return
+
+        action, self._pending_action = self._pending_action, None
+        calls = turn.get("calls")
+        if not calls and action and action.get("tool"):
+            calls = [{
+                "tool": action["tool"],
+                "args": action.get("args") or {},
+                "output": turn["content"],
+                "succeeded": turn.get("succeeded"),
+            }]
+        if calls:
+            self.summarized_steps += 1
+            for call in calls:
+                self._fold_call(call)
+        else:
+            first_line = turn["content"].strip().splitlines()[0] if turn["content"].strip() else ""
+            _append_unique(self.notes, first_line[:160], MAX_NOTES)
+
+    def _fold_call(self, call: Dict[str, Any]):
+        if call.get("skipped"):
+            return
+        tool = call.get("tool")
+        args = call.get("args") or {}
+        error = _first_error_line(call.get("output") or "")
+        succeeded = call.get("succeeded")
+        if succeeded is None:
+            succeeded = error is None
+
+        if tool == "write_file" and args.get("path") and succeeded:
+            _append_unique(self.files_written, args["path"], MAX_FILES)
+        elif tool in ("read_file", "list_dir") and succeeded:
+            _append_unique(self.files_inspected, args.get("path") or ".", MAX_FILES)
+        elif tool == "run_command" and args.get("command"):
+            command = args["command"][:120]
+            if succeeded:
+                self.commands_failed.pop(command, None)
+                _append_unique(self.commands_succeeded, command, MAX_COMMANDS)
+            else:
+                self.commands_failed.pop(command, None)
+                self.commands_failed[command] = error or "failed"
+                while len(self.commands_failed) > MAX_COMMANDS:
+                    self.commands_failed.pop(next(iter(self.commands_failed)))
+
+        if error and not succeeded and tool != "run_command":
+            _append_unique(self.errors, error, MAX_ERRORS)
@@ -0,0 +1,79 @@
+"""Phase graph - dependencies between plan phases for concurrent execution.
+
+Dependencies are derived from the plan, and a phase's "depends_on":
+[phase ids] can only add to them:
+- setup phases (scaffolding, installs) come before every later phase
+- test/verification phases come after every earlier phase
+- phases writing the same target file run in plan order
+"""
+
+import re
+from typing import Any, Dict, List, Set
+
+
+SETUP_PATTERN = re.compile(r"\b(setup|set up|init|initiali[sz]e|scaffold|bootstrap|environment|install|dependenc)", re.IGNORECASE)
+VERIFY_PATTERN = re.compile(r"\b(test|verif|qa|validat|integration|final)", re.IGNORECASE)
+
+
+def normalize_target(path: str) -> str:
+    """Path relative to target/ ("./target/app/x.py" -> "app/x.py")."""
+    path = path.strip()
+    while path.startswith("./"):
+        path = path[2:]
+    path = path.lstrip("/")
+    if path.startswith("target/"):
+        path = path[len("target/"):]
+    return path
+
+
+def target_files(phase: Dict[str, Any]) -> Set[str]:
+    """Target paths a phase declares in files_impacted."""
+    targets = set()
+    for entry in phase.get("files_impacted") or phase.get("files_affected") or []:
+        path = entry.get("target") if isinstance(entry, dict) else entry
+        if path and isinstance(path, str) and normalize_target(path):
+            targets.add(normalize_target(path))
+    return targets
+
+
+def _is_setup(phase: Dict[str, Any]) -> bool:
+    return bool(SETUP_PATTERN.search(phase.get("title") or ""))
+
+
+def _is_verification(phase: Dict[str, Any]) -> bool:
+    return bool(VERIFY_PATTERN.search(phase.get("title") or ""))
+
+
+def build_dependencies(phases: List[Dict[str, Any]]) -> List[Set[int]]:
+    """
+    Dependencies of each phase as indices into `phases`.
+
+    Derived edges are always kept (a planner that leaves out the setup
+    phase can't start work before it); declared depends_on adds edges.
+    Derived edges only point to earlier phases, so only declared ones can
+    form cycles.
+    """
+    index_by_id = {phase.get("id"): i for i, phase in enumerate(phases) if phase.get("id") is not None}
+    targets = [target_files(phase) for phase in phases]
+    dependencies: List[Set[int]] = []
+
+    for i, phase in enumerate(phases):
+        deps = set()
+        if i > 0 and (_is_setup(phase) or _is_verification(phase)):
+            deps.update(range(i))
+        for j in range(i):
+            if _is_setup(phases[j]) or targets[i] & targets[j]:
+                deps.add(j)
+
+        declared = phase.get("depends_on")
+        if isinstance(declared, list):
+            deps.update(index_by_id[d] for d in declared if d in index_by_id and index_by_id[d] != i)
+        dependencies.append(deps)
+
+    return dependencies
+
+
+def describe(phases: List[Dict[str, Any]], dependencies: List[Set[int]]) -> Dict[str, List[Any]]:
+    """{phase id: [ids it waits for]} for events and logs."""
+    ids = [phase.get("id", i + 1) for i, phase in enumerate(phases)]
+    return {str(ids[i]): [ids[j] for j in sorted(deps)] for i, deps in enumerate(dependencies)}
@@ -8,8 +8,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.db.models import Job, JobEvent
-from app.integrations.gemini import stream, generate_with_grounding
+from app.integrations.gemini import stream, stream_with_grounding
+from app.integrations.usage import usage_ledger, usage_scope
 from app.integrations.redis_client import publish_event
+from app.services.plan_stream import PhaseStreamParser
+
+
+# Minimum seconds between live plan_chunk events while the plan streams
+PLAN_CHUNK_INTERVAL_SECONDS = 0.5
 
 
 # === System Prompts ===
@@ -63,6 +69,7 @@ The JSON must follow this exact structure:
     {
       "id": 1,
       "title": "Phase Title",
+      "depends_on": [],
       "description": "High-level goal of this phase",
       "instructions": [
         "DETAILED technical instruction 1 (e.g., 'Map legacy MySQL types to SQLAlchemy models in models.py')",
@@ -99,6 +106,7 @@ The JSON must follow this exact structure:
 8. **VENV AWARENESS**: For Python projects, assume `./.venv` exists. Use `./.venv/bin/python`
 9. **HIGH PORT RANGE**: Use ports 9000+ for any service verification
 10. **ISOLATION**: Never reference legacy `../source/` directory in commands
+11. **DEPENDENCIES**: List in `depends_on` the ids of the phases that must finish first (phases without shared prerequisites may run in parallel)
 
 Generate a comprehensive, foolproof blueprint using REAL, CURRENT information from your searches.
 OUTPUT ONLY VALID JSON. BEGIN WITH { AND END WITH }"""
@@ -155,6 +163,17 @@ async def generate_plan(
             import traceback
             traceback.print_exc()
 
+    async def publish_live(event_type: str, payload: dict):
+        """Publish to the bus only; streaming progress is superseded by the final plan."""
+        from app.integrations.event_bus import bus
+        
+        await bus.publish(f"job:{job.id}", {
+            "type": event_type,
+            "job_id": job.id,
+            "payload": payload,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
     # Build the research-driven planning prompt
     prompt = build_research_driven_prompt(job, analysis_data)
     
@@ -168,19 +187,53 @@ async def generate_plan(
     
     # Emit loading event so frontend knows plan is being generated
     await emit("plan_generating", {"message": "Generating migration plan with research..."})
+    # Release SQLite's write lock before the long LLM call (the LLM cache writes too)
+    await session.commit()
     
     start_time = datetime.utcnow()
     print(f"[{start_time.isoformat()}]  Generating plan for job {job.id} with grounding...")
     
     try:
-        # Generate plan with grounding enabled
-        result = await generate_with_grounding(
-            prompt=prompt,
-            system_instruction=RESEARCH_DRIVEN_PLANNER_PROMPT
-        )
+        # Stream the plan with grounding enabled: the accumulated text goes out
+        # as plan_chunk events and each phase as soon as its JSON is complete
+        usage_ledger.attach(job)
+        parser = PhaseStreamParser()
+        grounding_metadata = {'sources': [], 'search_queries': []}
+        chunk_index = 0
+        last_chunk_at = 0.0
+        
+        with usage_scope(job_id=job.id, call_site="planner"):
+            async for kind, value in stream_with_grounding(
+                prompt=prompt,
+                system_instruction=RESEARCH_DRIVEN_PLANNER_PROMPT,
+                cache=False,  # A re-plan after /reject must not replay the rejected plan
+            ):
+                if kind == "grounding_metadata":
+                    grounding_metadata = value
+                    continue
+                
+                phases = parser.feed(value)
+                first_index = len(parser.phases) - len(phases) + 1
+                for offset, phase in enumerate(phases):
+                    await emit("plan_phase", {
+                        "phase": phase,
+                        "phase_index": first_index + offset,
+                    })
+                if phases:
+                    await session.commit()
+                
+                now = asyncio.get_running_loop().time()
+                if now - last_chunk_at >= PLAN_CHUNK_INTERVAL_SECONDS:
+                    last_chunk_at = now
+                    chunk_index += 1
+                    await publish_live("plan_chunk", {
+                        "content": parser.text,
+                        "chunk_index": chunk_index,
+                        "partial": True,
+                    })
+        usage_ledger.release(job)  # Saved with the plan; the job now waits on the user
         
-        plan_text = result['text']
-        grounding_metadata = result['grounding_metadata']
+        plan_text = parser.text
         
         duration = (datetime.utcnow() - start_time).total_seconds()
         print(f"[{datetime.utcnow().isoformat()}] Plan generated in {duration:.2f}s: {len(plan_text) if plan_text else 0} chars")
@@ -209,10 +262,11 @@ async def generate_plan(
             print("  Failed to parse plan JSON, using raw text")
             full_plan = plan_text
         
-        # Emit the complete plan as a single chunk
+        # Emit the complete plan (persisted; replaces the partial chunks)
+        chunk_index += 1
         await emit("plan_chunk", {
             "content": full_plan,
-            "chunk_index": 1,
+            "chunk_index": chunk_index,
         })
         
         # Update job status to AWAITING_APPROVAL
@@ -224,20 +278,21 @@ async def generate_plan(
         # CRITICAL: payload must include 'plan' for the /approve endpoint to read it
         await emit("plan_complete", {
             "plan": full_plan,
-            "chunk_count": 1
+            "chunk_count": chunk_index
         })
         await emit("status_changed", {"status": "AWAITING_APPROVAL"})
         
         # FINAL COMMIT: Ensure these last events are persisted!
         await session.commit()
         
-        print(f"Plan generated: 1 chunks, {len(full_plan)} chars")
+        print(f"Plan generated: {chunk_index} chunks, {len(parser.phases)} phases streamed, {len(full_plan)} chars")
         return full_plan
         
     except Exception as e:
         print(f"Planning error: {e}")
         
         # Update job to failed
+        usage_ledger.release(job)
         job.status = "FAILED"
         job.error = f"Planning failed: {str(e)}"
         job.updated_at = datetime.utcnow()
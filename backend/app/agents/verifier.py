@@ -4,6 +4,7 @@ from typing import Any, Dict, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import Job, JobEvent
 from app.integrations.gemini import generate
+from app.integrations.usage import usage_ledger, usage_scope
 from app.integrations.redis_client import publish_event
 from app.integrations.event_bus import bus
 from datetime import datetime
@@ -98,10 +99,13 @@ Generate the structured DNA report.
 
         try:
             # 3. Call LLM for Structured Audit
-            response = await generate(
-                prompt=prompt,
-                system_instruction=VERIFIER_SYSTEM_PROMPT
-            )
+            usage_ledger.attach(self.job)
+            with usage_scope(job_id=self.job.id, call_site="verifier"):
+                response = await generate(
+                    prompt=prompt,
+                    system_instruction=VERIFIER_SYSTEM_PROMPT
+                )
+            usage_ledger.release(self.job)
             
             # 4. Parse and Save the Report
             import re
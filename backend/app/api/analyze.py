@@ -1,11 +1,15 @@
 """Analysis endpoint - clones, scans, and analyzes repository."""
 
+import asyncio
 import traceback
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 from fastapi import APIRouter, HTTPException
 
+from app.integrations.redis_client import publish_event
+from app.integrations.usage import usage_scope
 from app.services.clone import clone_service
+from app.services.metrics import metrics_engine
 from app.services.scanner import scanner
 from app.agents.analyzer import analyze_codebase
 
@@ -16,6 +20,8 @@ class AnalyzeRequest(BaseModel):
     """Request body for analyze endpoint."""
     clone_url: str
     repo_name: str
+    partial: Optional[bool] = None  # Blob-less clone; defaults to settings.clone_partial
+    sparse_paths: Optional[List[str]] = None  # Only check out these directories (+ root files)
 
 
 class MigrationPath(BaseModel):
@@ -51,15 +57,30 @@ async def analyze_repository(body: AnalyzeRequest):
     try:
         # Step 1: Clone (or use cache)
         print("Step 1: Cloning...")
+        
+        async def report_progress(progress: dict):
+            """Forward git progress to listeners of this analysis."""
+            await publish_event(f"analysis:{body.repo_name}", {
+                "type": "clone_progress",
+                "repo_name": body.repo_name,
+                "payload": progress,
+            })
+        
         clone_result = await clone_service.clone(
             clone_url=body.clone_url,
             repo_name=body.repo_name,
+            on_progress=report_progress,
+            partial=body.partial,
+            sparse_paths=body.sparse_paths,
         )
         print(f"Cloned: {clone_result}")
         
-        # Step 2: Scan files
+        # Step 2: Scan files and count lines (blocking disk I/O, keep it off the event loop)
         print("Step 2: Scanning files...")
-        scan_result = scanner.scan(clone_result["source_path"])
+        scan_result, metrics = await asyncio.gather(
+            asyncio.to_thread(scanner.scan, clone_result["source_path"]),
+            _collect_metrics(clone_result["source_path"]),
+        )
         print(f"Scanned: {scan_result['stats']}")
         
         if not scan_result["files"]:
@@ -70,11 +91,15 @@ async def analyze_repository(body: AnalyzeRequest):
         
         # Step 3: Analyze with Gemini
         print("Step 3: Analyzing with Gemini...")
-        analysis = await analyze_codebase(
-            tree=scan_result["tree"],
-            files=scan_result["files"],
-            repo_name=body.repo_name,
-        )
+        # No job yet: usage waits under the workspace for the job created from it
+        with usage_scope(analysis_id=clone_result["workspace_path"]):
+            analysis = await analyze_codebase(
+                tree=scan_result["tree"],
+                files=scan_result["files"],
+                repo_name=body.repo_name,
+                source_path=clone_result["source_path"],
+                metrics=metrics,
+            )
         print(f"Analysis complete: {analysis.get('detected_stack')}")
         
         # Build response
@@ -99,3 +124,14 @@ async def analyze_repository(body: AnalyzeRequest):
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+
+
+async def _collect_metrics(source_path: str) -> Optional[dict]:
+    """Whole-tree metrics; analysis proceeds without them if counting fails."""
+    try:
+        metrics = await asyncio.to_thread(metrics_engine.collect, source_path)
+        print(f"Metrics: {metrics['totals']} (cached: {metrics['cached']})")
+        return metrics
+    except Exception as e:
+        print(f"Metrics unavailable: {e}")
+        return None
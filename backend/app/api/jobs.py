@@ -8,10 +8,14 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.db.database import get_session
+from app.agents.checkpoint import latest_checkpoint
+from app.db.database import async_session_context, get_session
 from app.db.models import Job, JobEvent
 from app.integrations.redis_client import get_redis, publish_event
+from app.integrations.usage import usage_ledger
 from app.services.exporter import ExporterService
+from app.services.clone import clone_service
+from app.services.job_scheduler import job_scheduler
 from fastapi.responses import FileResponse, StreamingResponse
 import os
 import shutil
@@ -25,9 +29,6 @@ from fpdf import FPDF
 
 router = APIRouter(prefix="/api/jobs", tags=["jobs"])
 
-# Global Lock to ensure serial execution in resource-constrained (1GB RAM) environments
-execution_lock = asyncio.Lock()
-
 
 # === Request/Response Models ===
 
@@ -37,6 +38,9 @@ class CreateJobRequest(BaseModel):
     repo_name: str
     target_stack: str
     workspace_path: str  # From analysis
+    token_budget: Optional[int] = None  # Defaults to JOB_TOKEN_BUDGET (0 = unlimited)
+    owner: Optional[str] = None  # Fair-queue key; defaults to the repository owner
+    priority: int = 0  # Higher priority executions are scheduled first
 
 
 class JobResponse(BaseModel):
@@ -49,6 +53,10 @@ class JobResponse(BaseModel):
     workspace_path: Optional[str] = None
     current_iteration: int = 0
     error: Optional[str] = None
+    token_usage: Optional[dict] = None
+    token_budget: Optional[int] = None
+    owner: Optional[str] = None
+    priority: Optional[int] = 0
     created_at: datetime
     updated_at: datetime
 
@@ -67,6 +75,117 @@ class EventResponse(BaseModel):
         from_attributes = True
 
 
+# === Execution ===
+
+async def _latest_plan(session: AsyncSession, job_id: str) -> Optional[dict]:
+    """The job's most recent generated plan (None if there is none; ValueError if unparseable)."""
+    import json
+    plan_event_result = await session.execute(
+        select(JobEvent)
+        .where(JobEvent.job_id == job_id, JobEvent.event_type == "plan_complete")
+        .order_by(JobEvent.created_at.desc())
+        .limit(1)
+    )
+    plan_event = plan_event_result.scalar_one_or_none()
+    if not plan_event:
+        return None
+    try:
+        return json.loads(plan_event.payload["plan"])
+    except Exception as e:
+        raise ValueError(f"Stored plan is invalid: {e}")
+
+
+async def run_execution(job_id: str, plan_data: dict, resume_from: Optional[dict] = None):
+    """Run the Executor Agent for a job (called by the scheduler once admitted)."""
+    from app.agents.executor import ExecutorAgent
+    
+    async with async_session_context() as new_session:
+        try:
+            # Re-fetch job in new session
+            job_result = await new_session.execute(select(Job).where(Job.id == job_id))
+            active_job = job_result.scalar_one()
+            
+            print(f"🚀 [Scheduler] Launching Executor Agent for job {job_id}...")
+            agent = ExecutorAgent(active_job, new_session)
+            await agent.execute_plan(plan_data, resume_from=resume_from)
+            
+        except asyncio.CancelledError:
+            # Cancelled via the API (status already set) or server shutdown (resumed on startup)
+            print(f"[Scheduler] Execution of job {job_id} cancelled")
+            raise
+        except Exception as e:
+            print(f"Execution failed: {e}")
+            import traceback
+            traceback.print_exc()
+            
+            # Update status to FAILED
+            try:
+                 usage_ledger.release(active_job)
+                 active_job.status = "FAILED"
+                 active_job.error = str(e)
+                 await new_session.commit()
+                 
+                 await publish_event(f"job:{job_id}", {
+                    "type": "status_changed", 
+                    "job_id": job_id, 
+                    "status": "FAILED",
+                    "error": str(e)
+                 })
+            except:
+                pass
+
+
+async def schedule_execution(job: Job, plan_data: dict, resume_from: Optional[dict] = None) -> int:
+    """
+    Queue a job's execution with the scheduler.
+    
+    Returns:
+        Queue position (0 if it started right away)
+    """
+    return await job_scheduler.submit(job, lambda: run_execution(job.id, plan_data, resume_from))
+
+
+async def recover_executions() -> int:
+    """
+    Startup recovery: requeue executions a previous process left EXECUTING,
+    resuming each from its last checkpoint.
+    
+    Returns:
+        Number of executions requeued
+    """
+    recovered = []
+    async with async_session_context() as session:
+        result = await session.execute(select(Job).where(Job.status == "EXECUTING"))
+        for job in result.scalars().all():
+            if job_scheduler.is_scheduled(job.id):
+                continue
+            try:
+                plan_data = await _latest_plan(session, job.id)
+            except ValueError:
+                plan_data = None
+            if not plan_data:
+                usage_ledger.release(job)
+                job.status = "FAILED"
+                job.error = "Execution interrupted by a restart and no plan to resume from"
+                continue
+            
+            checkpoint = await latest_checkpoint(session, job.id)
+            completed = (checkpoint or {}).get("completed_phases", [])
+            session.add(JobEvent(
+                job_id=job.id,
+                event_type="execution_requeued",
+                payload={"reason": "restart", "completed_phases": completed},
+            ))
+            recovered.append((job, plan_data, checkpoint))
+            print(f"[Recovery] Requeuing job {job.id} ({len(completed)} phases already complete)")
+        await session.commit()
+    
+    # Schedule only after the commit: executions write through their own sessions
+    for job, plan_data, checkpoint in recovered:
+        await schedule_execution(job, plan_data, checkpoint)
+    return len(recovered)
+
+
 # === Endpoints ===
 
 @router.post("", response_model=JobResponse)
@@ -87,8 +206,13 @@ async def create_job(
             repo_name=body.repo_name,
             target_stack=body.target_stack,
             workspace_path=body.workspace_path,
+            token_budget=body.token_budget,
+            owner=body.owner,
+            priority=body.priority,
             status="CREATED",
         )
+        # Analyzer tokens were spent before the job existed
+        usage_ledger.claim_analysis(job, body.workspace_path)
         session.add(job)
         await session.flush()  # Generate job.id
         
@@ -226,7 +350,7 @@ async def start_planning_endpoint(
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    if job.status not in ["CREATED", "FAILED"]:
+    if job.status not in ["CREATED", "FAILED", "CANCELLED"]:
         raise HTTPException(
             status_code=400, 
             detail=f"Cannot start planning from status: {job.status}"
@@ -274,26 +398,17 @@ async def approve_plan(
         )
     
     # Fetch the generated plan
-    plan_event_result = await session.execute(
-        select(JobEvent)
-        .where(JobEvent.job_id == job_id, JobEvent.event_type == "plan_complete")
-        .order_by(JobEvent.created_at.desc())
-        .limit(1)
-    )
-    plan_event = plan_event_result.scalar_one_or_none()
+    try:
+        plan_data = await _latest_plan(session, job_id)
+    except ValueError as e:
+        print(f"Failed to parse plan JSON: {e}")
+        raise HTTPException(status_code=500, detail="Stored plan is invalid")
     
-    if not plan_event:
+    if not plan_data:
         raise HTTPException(
             status_code=400,
             detail="No migration plan found for this job. Please generate a plan first."
         )
-        
-    try:
-        import json
-        plan_data = json.loads(plan_event.payload["plan"])
-    except Exception as e:
-        print(f"Failed to parse plan JSON: {e}")
-        raise HTTPException(status_code=500, detail="Stored plan is invalid")
 
     # Update status to EXECUTING with atomic-like check
     if job.status == "EXECUTING":
@@ -315,51 +430,128 @@ async def approve_plan(
         "status": "EXECUTING",
     })
     
-    # Start Execution in Background
-    async def run_executor():
-        from app.db.database import async_session_context
-        from app.agents.executor import ExecutorAgent
-        
-        async with async_session_context() as new_session:
-            try:
-                # Re-fetch job in new session
-                job_result = await new_session.execute(select(Job).where(Job.id == job_id))
-                active_job = job_result.scalar_one()
-                
-                # Serial Execution Lock: Wait for other jobs to finish
-                print(f"⏳ [Lock] Job {job_id} is waiting for the execution lock...")
-                async with execution_lock:
-                    print(f"🚀 [Lock] Job {job_id} acquired lock. Launching Executor Agent...")
-                    agent = ExecutorAgent(active_job, new_session)
-                    await agent.execute_plan(plan_data)
-                
-            except Exception as e:
-                print(f"Execution failed: {e}")
-                import traceback
-                traceback.print_exc()
-                
-                # Update status to FAILED
-                try:
-                     active_job.status = "FAILED"
-                     active_job.error = str(e)
-                     await new_session.commit()
-                     
-                     await publish_event(f"job:{job_id}", {
-                        "type": "status_changed", 
-                        "job_id": job_id, 
-                        "status": "FAILED",
-                        "error": str(e)
-                     })
-                except:
-                    pass
-
-    import asyncio
-    asyncio.create_task(run_executor())
+    # Start Execution once the scheduler has capacity for it
+    position = await schedule_execution(job, plan_data)
     
     return {
         "status": "approved",
         "job_id": job_id,
-        "message": "Plan approved. Execution started in background."
+        "queue_position": position,
+        "message": "Plan approved. Execution started in background." if position == 0
+            else f"Plan approved. Execution queued at position {position}."
+    }
+
+
+@router.post("/{job_id}/resume")
+async def resume_job(
+    job_id: str,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Resume a failed, cancelled or interrupted execution from its last
+    checkpoint. Completed phases are not run again.
+    """
+    result = await session.execute(
+        select(Job).where(Job.id == job_id)
+    )
+    job = result.scalar_one_or_none()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job.status not in ["FAILED", "CANCELLED", "EXECUTING"] or job_scheduler.is_scheduled(job_id):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot resume from status: {job.status}"
+        )
+    
+    try:
+        plan_data = await _latest_plan(session, job_id)
+    except ValueError:
+        raise HTTPException(status_code=500, detail="Stored plan is invalid")
+    
+    if not plan_data:
+        raise HTTPException(status_code=400, detail="No migration plan found for this job.")
+    
+    checkpoint = await latest_checkpoint(session, job_id)
+    completed = (checkpoint or {}).get("completed_phases", [])
+    
+    job.status = "EXECUTING"
+    job.error = None
+    job.updated_at = datetime.utcnow()
+    session.add(JobEvent(
+        job_id=job_id,
+        event_type="execution_requeued",
+        payload={"reason": "resume", "completed_phases": completed},
+    ))
+    await session.commit()
+    
+    await publish_event(f"job:{job_id}", {
+        "type": "status_changed",
+        "job_id": job_id,
+        "status": "EXECUTING",
+    })
+    
+    position = await schedule_execution(job, plan_data, checkpoint)
+    
+    return {
+        "status": "resumed",
+        "job_id": job_id,
+        "completed_phases": completed,
+        "queue_position": position,
+    }
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(
+    job_id: str,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Cancel an execution, whether it is still queued or already running.
+    Running commands are killed; the workspace is left as it is.
+    """
+    result = await session.execute(
+        select(Job).where(Job.id == job_id)
+    )
+    job = result.scalar_one_or_none()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job.status != "EXECUTING":
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot cancel from status: {job.status}. Expected EXECUTING"
+        )
+    
+    # End the read transaction so the refresh below sees the run's final status
+    await session.commit()
+    was = await job_scheduler.cancel(job_id) or "orphaned"
+    
+    await session.refresh(job)
+    if job.status != "EXECUTING":
+        # The run finished (COMPLETED/FAILED) before the cancel reached it
+        raise HTTPException(
+            status_code=409,
+            detail=f"Execution already finished with status: {job.status}"
+        )
+    usage_ledger.release(job)
+    job.status = "CANCELLED"
+    job.updated_at = datetime.utcnow()
+    session.add(JobEvent(job_id=job_id, event_type="job_cancelled", payload={"was": was}))
+    await session.commit()
+    
+    await publish_event(f"job:{job_id}", {
+        "type": "status_changed",
+        "job_id": job_id,
+        "status": "CANCELLED",
+    })
+    
+    return {
+        "status": "cancelled",
+        "job_id": job_id,
+        "was": was,
     }
 
 
@@ -434,9 +626,11 @@ async def get_audit_report(
         raise HTTPException(status_code=404, detail="Job not found")
         
     # 2. Run Audit (In real app, we might cache this)
+    clone_service.touch(job.workspace_path)
     try:
         agent = AuditAgent(job)
         report = await agent.generate_audit_report()
+        await session.commit()  # Persist the dossier's token usage
         return report
     except Exception as e:
         import traceback
@@ -512,6 +706,8 @@ async def download_job_code(
     
     if not job.workspace_path or not os.path.exists(job.workspace_path):
         raise HTTPException(status_code=404, detail="Workspace not found")
+    
+    clone_service.touch(job.workspace_path)
 
     # 2. Create ZIP in memory or temp file
     # We use StreamingResponse with a custom generator to avoid huge memory usage
@@ -580,6 +776,7 @@ async def download_dossier_pdf(
     try:
         agent = AuditAgent(job)
         report = await agent.generate_audit_report()
+        await session.commit()  # Persist the dossier's token usage
         dossier_text = report.get("dossier", "No dossier generated.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate dossier: {str(e)}")
@@ -1,6 +1,6 @@
 """Configuration loaded from environment variables."""
 
-from typing import List
+from typing import Dict, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -26,20 +26,66 @@ class Settings(BaseSettings):
     # Gemini (Single key, single model)
     gemini_api_key: str = ""
     gemini_model: str = "gemini-3-flash-preview"
+    gemini_fast_model: str = ""  # Cheap model for routine steps (empty = always use gemini_model)
+    model_routing: Dict[str, str] = {"executor": "tiered"}  # call site -> main, fast or tiered
+    model_escalation_steps: int = 3  # Steps kept on the main model after a failure signal
     gemini_max_tokens: int = 8192
     gemini_temperature: float = 0.1
     gemini_timeout_seconds: int = 60
+    gemini_max_concurrency: int = 8  # In-flight requests per model
+    gemini_model_concurrency: Dict[str, int] = {}  # Per-model overrides, e.g. {"gemini-3-pro-preview": 2}
+    gemini_max_connections: int = 32  # Dedicated httpx pool for async calls
+    gemini_requests_per_minute: int = 120  # Token bucket per model (0 = unlimited)
+    gemini_model_rpm: Dict[str, int] = {}  # Per-model overrides, e.g. {"gemini-2.5-pro": 60}
+    gemini_max_retries: int = 5  # Retries of 429/5xx/network failures
+    gemini_retry_base_delay: float = 1.0
+    gemini_retry_max_delay: float = 60.0  # Longer Retry-After requests fail fast
+    gemini_circuit_failure_threshold: int = 5  # Consecutive failures before the circuit opens
+    gemini_circuit_reset_seconds: float = 30.0
+    llm_transport: str = "live"  # live, record or replay (offline runs from a cassette)
+    llm_cassette_path: str = "./cassettes/gemini.jsonl"
+    llm_replay_latency: str = "recorded"  # recorded or zero
+    llm_replay_fallback: bool = False  # Serve the next exchange of the same endpoint when the body doesn't match
+    gemini_context_cache_enabled: bool = True  # Explicit caching of the executor's phase brief
+    gemini_context_cache_ttl_seconds: int = 3600
+    gemini_context_cache_min_tokens: int = 1024  # Smaller prefixes are not cacheable
     
     # Token optimization
-    context_max_files: int = 40
+    context_max_files: int = 40  # Files sent in full; lower-ranked files are outlined
+    context_candidate_files: int = 200  # Files scanned as packing candidates
+    context_token_budget: int = 30000
     context_max_chars_per_file: int = 3000
-    context_cache_ttl_seconds: int = 300
+    context_cache_ttl_seconds: int = 300  # TTL of cached LLM responses
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 256  # In-memory tier
+    llm_cache_max_rows: int = 5000  # SQLite tier, enforced when expired rows are purged (0 = no cap)
     use_structured_output: bool = True
+    scan_index_enabled: bool = True
+    scan_streaming: bool = False  # Stop walking once file/tree budgets are met
+    scan_tree_max_lines: int = 100  # Tree lines walked before a streaming scan may stop
+    scan_tree_max_chars: int = 6000  # Budget for the summarized tree sent to the LLM
+    metrics_parallel_threshold: int = 2000  # Count lines in a process pool above this many files
+    metrics_max_workers: int = 4  # Size of the shared line-counting process pool
+    stack_detection_confidence_threshold: float = 0.8  # Skip grounding above this
     
     # Agent limits
     agent_max_iterations: int = 50
     agent_iteration_timeout: int = 60
     agent_total_timeout: int = 1800  # 30 minutes
+    react_memory_token_budget: int = 12000  # Verbatim ReAct turns; older ones are summarized
+    react_memory_min_turns: int = 6  # Most recent turns always kept verbatim
+    executor_max_parallel_phases: int = 2  # Independent plan phases run concurrently
+    executor_max_actions_per_step: int = 8  # Tool calls the agent may batch into one step
+    job_token_budget: int = 0  # Default per-job token budget (0 = unlimited)
+    execution_recover_on_startup: bool = True  # Resume EXECUTING jobs from their last checkpoint
+    
+    # Job scheduling (weights in capacity units: ~1 CPU core and 1 GB of RAM each)
+    scheduler_capacity: float = 0  # 0 = min(CPU cores, GB of RAM) of this machine
+    scheduler_default_weight: float = 1.0
+    scheduler_stack_weights: Dict[str, float] = {
+        "java": 2.0, "spring": 2.0, "kotlin": 2.0, "scala": 2.0, ".net": 2.0, "c#": 2.0, "rust": 2.0,
+        "next.js": 1.5, "angular": 1.5,
+    }
     
     # Redis
     use_redis: bool = False
@@ -52,6 +98,12 @@ class Settings(BaseSettings):
     # Workspaces
     workspace_base_path: str = "./workspaces"
     workspace_cleanup_after_hours: int = 24
+    workspace_disk_quota_mb: int = 20480  # 0 disables quota-based eviction
+    workspace_gc_interval_seconds: int = 900
+    workspace_gc_min_idle_minutes: int = 30  # Never evict a workspace used more recently
+    clone_timeout_seconds: int = 120
+    clone_mirror_cache: bool = True  # Keep a bare mirror per remote and clone from it
+    clone_partial: bool = False  # Blob-less clone + sparse checkout of code/config files only
     
     @property
     def origins_list(self) -> List[str]:
@@ -50,3 +50,22 @@ async def init_db():
     """Create all tables."""
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+
+
+def _add_missing_columns(conn):
+    """
+    create_all() never alters existing tables, so add columns introduced
+    since a database was created. Only nullable columns are added this way.
+    """
+    for table in Base.metadata.sorted_tables:
+        rows = conn.exec_driver_sql(f"PRAGMA table_info({table.name})").fetchall()
+        existing = {row[1] for row in rows}
+        if not existing:
+            continue
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            print(f"[DB] Added column {table.name}.{column.name}")
@@ -21,7 +21,7 @@ class Job(Base):
     __tablename__ = "jobs"
     
     id = Column(String, primary_key=True, default=generate_uuid)
-    status = Column(String, default="CREATED")  # CREATED, ANALYZING, PLANNING, AWAITING_APPROVAL, EXECUTING, VERIFYING, COMPLETED, FAILED
+    status = Column(String, default="CREATED")  # CREATED, ANALYZING, PLANNING, AWAITING_APPROVAL, EXECUTING, VERIFYING, COMPLETED, FAILED, CANCELLED
     
     # Repository info
     repo_url = Column(String, nullable=False)
@@ -43,6 +43,14 @@ class Job(Base):
     # Execution tracking
     current_iteration = Column(Integer, default=0)
     
+    # Scheduling (see app/services/job_scheduler.py)
+    owner = Column(String)  # Fair-queue key; None = repository owner
+    priority = Column(Integer, default=0)  # Higher runs first
+    
+    # Token accounting (see app/integrations/usage.py)
+    token_usage = Column(JSON)
+    token_budget = Column(Integer)  # None = settings.job_token_budget
+    
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -73,3 +81,19 @@ class JobEvent(Base):
     
     # Relationships
     job = relationship("Job", back_populates="events")
+
+
+class LLMCacheEntry(Base):
+    """Cached Gemini response (persistent tier of the LLM response cache)."""
+    
+    __tablename__ = "llm_cache"
+    
+    key = Column(String, primary_key=True)  # sha256 of model, prompt, instruction, schema
+    model = Column(String)
+    
+    # Parsed response (dict for structured/grounded calls, str otherwise)
+    response = Column(JSON)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
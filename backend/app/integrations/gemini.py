@@ -1,36 +1,160 @@
 """Gemini API client with structured output support."""
 
+import asyncio
+import copy
 import json
-from typing import Any, Optional, Type
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
 
+import httpx
 from google import genai
 from google.genai import types
 from pydantic import BaseModel
 
 from app.config import settings
+from app.integrations.llm_cache import cache_key, llm_cache
+from app.integrations.llm_transport import build_transport
+from app.integrations.rate_limiter import limiter_for, reset_limiters
+from app.integrations.usage import usage_ledger
 
 
 # Initialize Gemini client
 _client: Optional[genai.Client] = None
 
+# Upstream calls in progress, by request key, with the usage they recorded (see _singleflight)
+_inflight: Dict[str, Tuple["asyncio.Task", List[tuple]]] = {}
+
+# Usage list of the singleflight task running in the current context
+_flight_usage: ContextVar[Optional[List[tuple]]] = ContextVar("gemini_flight_usage", default=None)
+
 
 def get_client() -> genai.Client:
-    """Get or create Gemini client."""
+    """
+    Get or create Gemini client.
+    
+    Async calls go through a dedicated httpx connection pool (passing a
+    transport also keeps the SDK from switching to aiohttp), so LLM traffic
+    neither occupies the default thread pool nor shares its connections.
+    With LLM_TRANSPORT=record/replay the pool is wrapped or replaced by a
+    cassette (see llm_transport.py); replay needs no API key.
+    """
     global _client
     
     if _client is None:
-        if not settings.gemini_api_key:
+        replaying = settings.llm_transport == "replay"
+        if not settings.gemini_api_key and not replaying:
             raise ValueError("GEMINI_API_KEY not configured")
         
-        _client = genai.Client(api_key=settings.gemini_api_key)
+        transport = build_transport(httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.gemini_max_connections,
+                max_keepalive_connections=settings.gemini_max_connections,
+            ),
+        ))
+        _client = genai.Client(
+            api_key=settings.gemini_api_key or "replay",
+            http_options=types.HttpOptions(async_client_args={"transport": transport}),
+        )
     
     return _client
 
 
+async def close_client():
+    """Close the async connection pool (called on shutdown)."""
+    global _client
+    
+    if _client is not None:
+        try:
+            await _client.aio.aclose()
+        except Exception as e:
+            print(f"Gemini client close failed: {e}")
+        _client = None
+    reset_limiters()
+
+
+async def _generate_content(
+    prompt: Any,
+    config: types.GenerateContentConfig,
+    model: Optional[str] = None,
+    kind: str = "generate",
+):
+    """
+    Call the async SDK through the model's rate limiter (which retries
+    429/5xx responses), recording token usage.
+    """
+    client = get_client()
+    model = model or settings.gemini_model
+    
+    async def request():
+        started = time.monotonic()
+        response = await client.aio.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=config,
+        )
+        latency_ms = (time.monotonic() - started) * 1000
+        usage_ledger.record(model, response, latency_ms, kind=kind)
+        flight = _flight_usage.get()
+        if flight is not None:
+            flight.append((model, response, latency_ms, kind))
+        return response
+    
+    try:
+        return await limiter_for(model).call(request)
+    except Exception as e:
+        print(f"Gemini API Error: {e}")
+        raise
+
+
+async def _singleflight(key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Share one upstream call among concurrent identical requests.
+    
+    The call runs as its own task, so a cancelled caller doesn't cancel it
+    for the others. Every caller gets its own copy of the result (callers
+    mutate them); failures propagate to all of them. The call's token usage
+    is charged to every caller's usage scope; the coalesced copies are kept
+    out of the process-wide totals, which count upstream calls.
+    """
+    entry = _inflight.get(key)
+    if entry is None:
+        usage: List[tuple] = []
+        
+        async def run():
+            _flight_usage.set(usage)
+            return await call()
+        
+        task = asyncio.ensure_future(run())
+        _inflight[key] = (task, usage)
+        task.add_done_callback(lambda t: _finish_flight(key, t))
+        coalesced = False
+    else:
+        task, usage = entry
+        coalesced = True
+        print("Gemini request coalesced with an identical in-flight call")
+    
+    result = await asyncio.shield(task)
+    if coalesced:
+        for model, response, latency_ms, kind in usage:
+            usage_ledger.record(model, response, latency_ms, kind=kind, coalesced=True)
+    return copy.deepcopy(result)
+
+
+def _finish_flight(key: str, task: "asyncio.Task"):
+    if _inflight.get(key, (None,))[0] is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()  # Mark retrieved even if every caller was cancelled
+
+
 async def generate(
     prompt: Any,
     response_schema: Optional[Type[BaseModel]] = None,
     system_instruction: Optional[str] = None,
+    cache: bool = True,
+    cached_content: Optional[str] = None,
+    model: Optional[str] = None,
 ) -> Any:
     """
     Generate content with Gemini.
@@ -38,22 +162,57 @@ async def generate(
     Args:
         prompt: The user prompt
         response_schema: Optional Pydantic model for structured output
-        system_instruction: Optional system prompt
+        system_instruction: Optional system prompt (ignored with cached_content,
+            which already carries it)
+        cache: Serve/store the response in the LLM response cache and share
+            one upstream call among concurrent identical requests
+        cached_content: Name of a context cache from create_context_cache()
+            (only valid for the model it was created with)
+        model: Model to call instead of GEMINI_MODEL (see model_router.py)
     
     Returns:
         If response_schema: Parsed dict matching schema
         Otherwise: Raw text response
     """
-    client = get_client()
+    model = model or settings.gemini_model
+    if not cache:
+        return await _generate_uncached(prompt, response_schema, system_instruction, cached_content, model)
+    
+    key = cache_key(
+        "generate", model, prompt, system_instruction, response_schema,
+        cached_content=cached_content,
+    )
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        print(f"Gemini response served from cache (model={model})")
+        return cached
     
+    async def call():
+        result = await _generate_uncached(prompt, response_schema, system_instruction, cached_content, model)
+        await llm_cache.set(key, model, result)
+        return result
+    
+    return await _singleflight(key, call)
+
+
+async def _generate_uncached(
+    prompt: Any,
+    response_schema: Optional[Type[BaseModel]],
+    system_instruction: Optional[str],
+    cached_content: Optional[str],
+    model: str,
+) -> Any:
+    """One upstream generate() call, parsed."""
     # Build config
     config = types.GenerateContentConfig(
         temperature=settings.gemini_temperature,
         max_output_tokens=settings.gemini_max_tokens,
     )
     
-    # Add system instruction if provided
-    if system_instruction:
+    # Add system instruction if provided (a context cache already holds it)
+    if cached_content:
+        config.cached_content = cached_content
+    elif system_instruction:
         config.system_instruction = system_instruction
     
     # Add response schema for structured output
@@ -61,50 +220,89 @@ async def generate(
         config.response_mime_type = "application/json"
         config.response_schema = response_schema
     
-    # Run blocking call in executor
-    import asyncio
-    from functools import partial
-    
-    loop = asyncio.get_running_loop()
+    print(f"Calling Gemini API (model={model}{', cached context' if cached_content else ''})...")
     
-    # Use partial to pass arguments to the synchronous function
-    generate_func = partial(
-        client.models.generate_content,
-        model=settings.gemini_model,
-        contents=prompt,
-        config=config,
-    )
-    
-    print(f"Calling Gemini API (model={settings.gemini_model})...")
-    
-    try:
-        response = await loop.run_in_executor(None, generate_func)
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
-        raise
+    response = await _generate_content(prompt, config, model=model)
         
     print(f"Gemini API Response received ({len(response.text) if response.text else 0} chars)")
     
     # Parse response
+    result = response.text
     if response_schema and settings.use_structured_output:
         # Parse JSON response
         try:
-            return json.loads(response.text)
+            result = json.loads(response.text)
         except json.JSONDecodeError:
             # Fallback: try to extract JSON from text
             text = response.text
             start = text.find("{")
             end = text.rfind("}") + 1
-            if start >= 0 and end > start:
-                return json.loads(text[start:end])
-            raise ValueError(f"Could not parse JSON from response: {text[:200]}")
+            if not (start >= 0 and end > start):
+                raise ValueError(f"Could not parse JSON from response: {text[:200]}")
+            result = json.loads(text[start:end])
+    
+    return result
+
+
+async def create_context_cache(
+    contents: Any,
+    system_instruction: Optional[str] = None,
+    ttl_seconds: Optional[int] = None,
+    display_name: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Register a static prefix (system instruction + leading turns) as an
+    explicit context cache, so later calls send only what follows it.
     
-    return response.text
+    Returns the cache name, or None if caching is disabled, the prefix is
+    below the model's minimum cacheable size, or the API refuses; callers
+    then send the full prompt as before.
+    """
+    if not settings.gemini_context_cache_enabled:
+        return None
+    
+    estimated_tokens = len(json.dumps(contents, default=str) + (system_instruction or "")) // 4
+    if estimated_tokens < settings.gemini_context_cache_min_tokens:
+        return None
+    
+    client = get_client()
+    ttl_seconds = ttl_seconds or settings.gemini_context_cache_ttl_seconds
+    try:
+        cached = await limiter_for(settings.gemini_model).call(lambda: client.aio.caches.create(
+            model=settings.gemini_model,
+            config=types.CreateCachedContentConfig(
+                contents=contents,
+                system_instruction=system_instruction,
+                ttl=f"{ttl_seconds}s",
+                display_name=display_name,
+            ),
+        ))
+    except Exception as e:
+        print(f"Gemini context cache unavailable, sending full prompts: {e}")
+        return None
+    
+    print(f"Gemini context cache created: {cached.name} (~{estimated_tokens} tokens)")
+    return cached.name
+
+
+async def delete_context_cache(name: str):
+    """Delete a context cache early (it would otherwise expire with its TTL)."""
+    try:
+        await get_client().aio.caches.delete(name=name)
+    except Exception as e:
+        print(f"Gemini context cache delete failed ({name}): {e}")
+
+
+def is_context_cache_error(error: Exception) -> bool:
+    """Whether a generate() failure was caused by a missing/expired context cache."""
+    message = str(error).lower()
+    return "cachedcontent" in message or "cached content" in message or "cached_content" in message
 
 
 async def generate_with_grounding(
     prompt: Any,
     system_instruction: Optional[str] = None,
+    cache: bool = True,
 ) -> dict:
     """
     Generate content with Google Search grounding enabled.
@@ -115,14 +313,34 @@ async def generate_with_grounding(
     Args:
         prompt: The user prompt
         system_instruction: Optional system prompt
+        cache: Serve/store the response in the LLM response cache and share
+            one upstream call among concurrent identical requests
     
     Returns:
         dict with:
         - 'text': Generated content
         - 'grounding_metadata': Dict with 'sources' and 'search_queries'
     """
-    client = get_client()
-    
+    if not cache:
+        return await _generate_with_grounding_uncached(prompt, system_instruction)
+    
+    key = cache_key("grounding", settings.gemini_model, prompt, system_instruction)
+    cached = await llm_cache.get(key)
+    if cached is not None:
+        print(f"Gemini grounded response served from cache (model={settings.gemini_model})")
+        return cached
+    
+    async def call():
+        result = await _generate_with_grounding_uncached(prompt, system_instruction)
+        if result['text']:
+            await llm_cache.set(key, settings.gemini_model, result)
+        return result
+    
+    return await _singleflight(key, call)
+
+
+async def _generate_with_grounding_uncached(prompt: Any, system_instruction: Optional[str]) -> dict:
+    """One upstream grounded call."""
     # Build config with grounding enabled
     config = types.GenerateContentConfig(
         temperature=settings.gemini_temperature,
@@ -134,39 +352,30 @@ async def generate_with_grounding(
     if system_instruction:
         config.system_instruction = system_instruction
     
-    # Run blocking call in executor
-    import asyncio
-    from functools import partial
-    
-    loop = asyncio.get_running_loop()
-    
-    # Use partial to pass arguments to the synchronous function
-    generate_func = partial(
-        client.models.generate_content,
-        model=settings.gemini_model,
-        contents=prompt,
-        config=config,
-    )
-    
     print(f"Calling Gemini API with grounding (model={settings.gemini_model})...")
     
-    try:
-        response = await loop.run_in_executor(None, generate_func)
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
-        raise
+    response = await _generate_content(prompt, config, kind="grounding")
         
     print(f"Gemini API Response received ({len(response.text) if response.text else 0} chars)")
     
-    # Extract grounding metadata
+    return {
+        'text': response.text,
+        'grounding_metadata': _grounding_metadata(response)
+    }
+
+
+def _grounding_metadata(response: Any) -> dict:
+    """Search queries and cited sources of a grounded response (or its last stream chunk)."""
     grounding_metadata = {
         'sources': [],
         'search_queries': []
     }
     
-    if hasattr(response, 'grounding_metadata') and response.grounding_metadata:
-        metadata = response.grounding_metadata
-        
+    metadata = getattr(response, 'grounding_metadata', None)
+    if not metadata and getattr(response, 'candidates', None):
+        metadata = response.candidates[0].grounding_metadata
+    
+    if metadata:
         # Extract search queries
         if hasattr(metadata, 'web_search_queries') and metadata.web_search_queries:
             grounding_metadata['search_queries'] = list(metadata.web_search_queries)
@@ -184,11 +393,48 @@ async def generate_with_grounding(
     else:
         print("No grounding metadata found in response")
     
-    return {
-        'text': response.text,
-        'grounding_metadata': grounding_metadata
-    }
+    return grounding_metadata
+
 
+async def _stream_content(prompt: Any, config: types.GenerateContentConfig, kind: str = "generate"):
+    """
+    Yield response chunks from the async streaming API.
+    
+    Opening the stream (up to the first chunk) goes through the model's rate
+    limiter, so throttled or failed starts are retried; a failure after
+    output has started is raised to the caller. Token usage is recorded from
+    the final chunk.
+    """
+    client = get_client()
+    model = settings.gemini_model
+    started = time.monotonic()
+    
+    async def open_stream():
+        iterator = await client.aio.models.generate_content_stream(
+            model=model,
+            contents=prompt,
+            config=config,
+        )
+        try:
+            first = await iterator.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return iterator, first
+    
+    try:
+        iterator, chunk = await limiter_for(model).call(open_stream)
+    except Exception as e:
+        print(f"Gemini API Error: {e}")
+        raise
+    
+    last = chunk
+    if chunk is not None:
+        yield chunk
+        async for chunk in iterator:
+            last = chunk
+            yield chunk
+    
+    usage_ledger.record(model, last, (time.monotonic() - started) * 1000, kind=kind)
 
 
 async def stream(
@@ -205,8 +451,6 @@ async def stream(
     Yields:
         Text chunks as they stream in
     """
-    client = get_client()
-    
     # Build config (no structured output for streaming)
     config = types.GenerateContentConfig(
         temperature=settings.gemini_temperature,
@@ -217,13 +461,58 @@ async def stream(
     if system_instruction:
         config.system_instruction = system_instruction
     
-    # Stream response
-    response_stream = client.models.generate_content_stream(
-        model=settings.gemini_model,
-        contents=prompt,
-        config=config,
+    async for chunk in _stream_content(prompt, config):
+        if chunk.text:
+            yield chunk.text
+
+
+async def stream_with_grounding(
+    prompt: Any,
+    system_instruction: Optional[str] = None,
+    cache: bool = True,
+):
+    """
+    Streaming counterpart of generate_with_grounding().
+    
+    Shares its response cache: a cached result is replayed as a single chunk.
+    
+    Yields:
+        ("text", chunk) as text arrives, then one ("grounding_metadata", dict)
+        with 'sources' and 'search_queries'
+    """
+    key = None
+    if cache and llm_cache.enabled:
+        key = cache_key("grounding", settings.gemini_model, prompt, system_instruction)
+        cached = await llm_cache.get(key)
+        if cached is not None:
+            print(f"Gemini grounded response served from cache (model={settings.gemini_model})")
+            yield "text", cached["text"] or ""
+            yield "grounding_metadata", cached["grounding_metadata"]
+            return
+    
+    config = types.GenerateContentConfig(
+        temperature=settings.gemini_temperature,
+        max_output_tokens=settings.gemini_max_tokens,
+        tools=[types.Tool(google_search=types.GoogleSearch())],
     )
+    if system_instruction:
+        config.system_instruction = system_instruction
     
-    for chunk in response_stream:
+    print(f"Streaming Gemini API with grounding (model={settings.gemini_model})...")
+    
+    parts = []
+    grounded = None  # Chunk carrying the grounding metadata (usually the last)
+    async for chunk in _stream_content(prompt, config, kind="grounding"):
+        if chunk.candidates and chunk.candidates[0].grounding_metadata:
+            grounded = chunk
         if chunk.text:
-            yield chunk.text
+            parts.append(chunk.text)
+            yield "text", chunk.text
+    
+    text = "".join(parts)
+    print(f"Gemini API stream complete ({len(text)} chars)")
+    
+    grounding_metadata = _grounding_metadata(grounded)
+    if key and text:
+        await llm_cache.set(key, settings.gemini_model, {'text': text, 'grounding_metadata': grounding_metadata})
+    yield "grounding_metadata", grounding_metadata
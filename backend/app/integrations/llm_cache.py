@@ -0,0 +1,189 @@
+"""LLM response cache - in-memory LRU in front of a SQLite table, with TTL."""
+
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+
+from app.config import settings
+
+
+# Expired rows are purged after this many writes
+PURGE_EVERY_WRITES = 100
+
+
+def _jsonable(value: Any) -> Any:
+    """Fallback serializer for SDK objects (Content, Part) inside prompts."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    return repr(value)
+
+
+def cache_key(
+    kind: str,
+    model: str,
+    prompt: Any,
+    system_instruction: Optional[str] = None,
+    response_schema: Optional[Type[BaseModel]] = None,
+    cached_content: Optional[str] = None,
+) -> str:
+    """Stable key for a request; generation settings are part of it."""
+    payload = {
+        "kind": kind,
+        "model": model,
+        "prompt": prompt,
+        "system_instruction": system_instruction,
+        "cached_content": cached_content,
+        "schema": response_schema.model_json_schema() if response_schema else None,
+        "structured": settings.use_structured_output,
+        "temperature": settings.gemini_temperature,
+        "max_tokens": settings.gemini_max_tokens,
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier response cache.
+
+    Hits are served from memory first, then from the `llm_cache` table
+    (surviving restarts). Entries expire after `context_cache_ttl_seconds`;
+    the table is purged of expired rows and capped at `llm_cache_max_rows`
+    on startup and every PURGE_EVERY_WRITES writes.
+    Cache failures never fail the LLM call.
+    """
+
+    def __init__(self, max_entries: int = None, ttl_seconds: int = None):
+        self.max_entries = max_entries or settings.llm_cache_max_entries
+        self.ttl_seconds = ttl_seconds or settings.context_cache_ttl_seconds
+        # key -> (expires_at epoch, response)
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.llm_cache_enabled and self.ttl_seconds > 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached response, or None on miss/expiry."""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                # Callers mutate results (e.g. analysis["file_tree"])
+                return copy.deepcopy(entry[1])
+            del self._memory[key]
+
+        try:
+            from app.db.database import async_session_context
+            from app.db.models import LLMCacheEntry
+
+            async with async_session_context() as session:
+                row = await session.get(LLMCacheEntry, key)
+                if row is not None and row.expires_at > datetime.utcnow():
+                    expires_at = now + (row.expires_at - datetime.utcnow()).total_seconds()
+                    self._remember(key, expires_at, row.response)
+                    self.hits += 1
+                    return copy.deepcopy(row.response)
+        except Exception as e:
+            print(f"[LLMCache] Lookup failed: {e}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, model: str, response: Any):
+        """Store a response in both tiers."""
+        if not self.enabled or response is None:
+            return
+
+        self._remember(key, time.time() + self.ttl_seconds, copy.deepcopy(response))
+
+        try:
+            from app.db.database import async_session_context
+            from app.db.models import LLMCacheEntry
+
+            async with async_session_context() as session:
+                await session.merge(LLMCacheEntry(
+                    key=key,
+                    model=model,
+                    response=response,
+                    created_at=datetime.utcnow(),
+                    expires_at=datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+                ))
+                await session.commit()
+        except Exception as e:
+            print(f"[LLMCache] Store failed: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES == 0:
+            await self.purge()
+
+    async def purge(self) -> int:
+        """
+        Delete expired rows, then the oldest rows beyond `llm_cache_max_rows`.
+
+        Returns:
+            Number of rows deleted
+        """
+        try:
+            from app.db.database import async_session_context
+            from app.db.models import LLMCacheEntry
+
+            async with async_session_context() as session:
+                result = await session.execute(
+                    delete(LLMCacheEntry).where(LLMCacheEntry.expires_at <= datetime.utcnow())
+                )
+                deleted = result.rowcount or 0
+                if settings.llm_cache_max_rows > 0:
+                    keep = (
+                        select(LLMCacheEntry.key)
+                        .order_by(LLMCacheEntry.created_at.desc())
+                        .limit(settings.llm_cache_max_rows)
+                    )
+                    result = await session.execute(
+                        delete(LLMCacheEntry).where(LLMCacheEntry.key.not_in(keep))
+                    )
+                    deleted += result.rowcount or 0
+                await session.commit()
+        except Exception as e:
+            print(f"[LLMCache] Purge failed: {e}")
+            return 0
+
+        if deleted:
+            print(f"[LLMCache] Purged {deleted} rows")
+        return deleted
+
+    async def clear(self):
+        """Drop every cached response."""
+        self._memory.clear()
+        from app.db.database import async_session_context
+        from app.db.models import LLMCacheEntry
+
+        async with async_session_context() as session:
+            await session.execute(delete(LLMCacheEntry))
+            await session.commit()
+
+    def _remember(self, key: str, expires_at: float, response: Any):
+        self._memory[key] = (expires_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+# Singleton instance
+llm_cache = LLMCache()
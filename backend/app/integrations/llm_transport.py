@@ -0,0 +1,180 @@
+"""Record/replay HTTP transport for the Gemini client.
+
+LLM_TRANSPORT selects the mode:
+- "live": plain HTTP (default)
+- "record": live HTTP, every exchange appended to the cassette (JSONL)
+- "replay": responses served from the cassette, no network or API key needed
+
+Replay matches a request by method, URL and JSON body; a request the
+cassette doesn't hold raises CassetteMiss, so a stale cassette fails
+loudly. With LLM_REPLAY_FALLBACK=true (e.g. prompts containing temp paths)
+the next unused exchange recorded for the same endpoint is served instead.
+Disable the LLM response
+cache (LLM_CACHE_ENABLED=false) when benchmarking so every call reaches
+the transport.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+
+
+TRANSPORT_MODES = ("live", "record", "replay")
+
+
+class CassetteMiss(Exception):
+    """Replay found no recorded response for a request."""
+
+
+def _endpoint(url: httpx.URL) -> str:
+    """Path plus query, without the API key."""
+    params = [(k, v) for k, v in url.params.multi_items() if k != "key"]
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return f"{url.path}?{query}" if query else url.path
+
+
+def _body_digest(content: bytes) -> str:
+    try:
+        normalized = json.dumps(json.loads(content), sort_keys=True)
+    except ValueError:
+        normalized = content.decode(errors="replace")
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def request_key(request: httpx.Request) -> str:
+    return f"{request.method} {_endpoint(request.url)} {_body_digest(request.content)}"
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests through and appends each exchange to the cassette."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, cassette_path: Path):
+        self.inner = inner
+        self.cassette_path = cassette_path
+        self.cassette_path.parent.mkdir(parents=True, exist_ok=True)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        # Streams are buffered (and decompressed): the whole body goes in the cassette
+        body = await response.aread()
+        await response.aclose()
+        latency_ms = int((time.monotonic() - started) * 1000)
+
+        headers = {"content-type": response.headers.get("content-type", "application/json")}
+        if response.headers.get("retry-after"):
+            headers["retry-after"] = response.headers["retry-after"]
+
+        exchange = {
+            "key": request_key(request),
+            "method": request.method,
+            "endpoint": _endpoint(request.url),
+            "status": response.status_code,
+            "headers": headers,
+            "body": body.decode(errors="replace"),
+            "latency_ms": latency_ms,
+            "recorded_at": time.time(),
+        }
+        with open(self.cassette_path, "a") as f:
+            f.write(json.dumps(exchange) + "\n")
+
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded exchanges, with their recorded latency or none."""
+
+    def __init__(self, cassette_path: Path, latency: str = "recorded", fallback: bool = False):
+        self.latency = latency
+        self.fallback = fallback
+        self._by_key: Dict[str, Deque[dict]] = defaultdict(deque)
+        self._by_endpoint: Dict[str, Deque[dict]] = defaultdict(deque)
+        self._last: Dict[str, dict] = {}
+        self.hits = 0
+        self.fallbacks = 0
+
+        exchanges = self._load(cassette_path)
+        for exchange in exchanges:
+            self._by_key[exchange["key"]].append(exchange)
+            self._by_endpoint[f"{exchange['method']} {exchange['endpoint']}"].append(exchange)
+        print(f"[LLMTransport] Replaying {len(exchanges)} recorded exchanges from {cassette_path}")
+
+    @staticmethod
+    def _load(cassette_path: Path) -> List[dict]:
+        if not cassette_path.exists():
+            raise FileNotFoundError(f"LLM cassette not found: {cassette_path}")
+        with open(cassette_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _take(self, request: httpx.Request) -> Optional[dict]:
+        key = request_key(request)
+        endpoint = f"{request.method} {_endpoint(request.url)}"
+
+        exact = self._by_key.get(key)
+        if exact:
+            exchange = exact.popleft()
+            self._by_endpoint[endpoint].remove(exchange)
+            self.hits += 1
+        elif self.fallback and self._by_endpoint.get(endpoint):
+            exchange = self._by_endpoint[endpoint].popleft()
+            self._by_key[exchange["key"]].remove(exchange)
+            self.fallbacks += 1
+            print(f"[LLMTransport] No exact match for {endpoint}; serving the next recorded response")
+        else:
+            # Recording exhausted: repeat the last response of this request (or endpoint, with fallback)
+            exchange = self._last.get(key) or (self._last.get(endpoint) if self.fallback else None)
+            if exchange is None:
+                return None
+
+        self._last[key] = self._last[endpoint] = exchange
+        return exchange
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        exchange = self._take(request)
+        if exchange is None:
+            endpoint = f"{request.method} {_endpoint(request.url)}"
+            unused = len(self._by_endpoint.get(endpoint) or ())
+            raise CassetteMiss(
+                f"No recorded response for {endpoint} with this body ({unused} unused for the endpoint); "
+                "re-record the cassette or set LLM_REPLAY_FALLBACK=true"
+            )
+
+        if self.latency == "recorded" and exchange.get("latency_ms"):
+            await asyncio.sleep(exchange["latency_ms"] / 1000)
+
+        return httpx.Response(
+            exchange["status"],
+            headers=exchange["headers"],
+            content=exchange["body"].encode(),
+            request=request,
+        )
+
+
+def build_transport(live: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+    """Wrap or replace the live transport according to LLM_TRANSPORT."""
+    mode = settings.llm_transport
+    if mode not in TRANSPORT_MODES:
+        raise ValueError(f"LLM_TRANSPORT must be one of {', '.join(TRANSPORT_MODES)}, got {mode!r}")
+
+    cassette_path = Path(settings.llm_cassette_path)
+    if mode == "record":
+        print(f"[LLMTransport] Recording Gemini traffic to {cassette_path}")
+        return RecordingTransport(live, cassette_path)
+    if mode == "replay":
+        return ReplayTransport(
+            cassette_path,
+            latency=settings.llm_replay_latency,
+            fallback=settings.llm_replay_fallback,
+        )
+    return live
@@ -0,0 +1,66 @@
+"""Model router - picks the main or the fast Gemini model for each call.
+
+MODEL_ROUTING maps a call site to a mode:
+- "main": always GEMINI_MODEL (the default for unlisted call sites)
+- "fast": GEMINI_FAST_MODEL, except for a few steps after a failure signal
+- "tiered": the fast model for routine follow-ups (e.g. after a successful
+  list_dir/read_file), the main model otherwise and for a few steps after
+  any failure signal (tool error, loop warning, failed test gate)
+
+Without GEMINI_FAST_MODEL every call uses the main model.
+"""
+
+from typing import Optional, Tuple
+
+from app.config import settings
+
+
+# Tools whose successful result rarely needs the main model to act on
+ROUTINE_TOOLS = {"list_dir", "read_file"}
+
+
+class ModelRouter:
+    """Routing state for one call site (e.g. one executor phase)."""
+
+    def __init__(self, call_site: str):
+        self.call_site = call_site
+        self.escalated_steps = 0
+        self.escalation_reason: Optional[str] = None
+        self.last_step_routine = False
+
+    @property
+    def mode(self) -> str:
+        if not settings.gemini_fast_model:
+            return "main"
+        return settings.model_routing.get(self.call_site, "main")
+
+    def is_fast(self, model: str) -> bool:
+        return bool(settings.gemini_fast_model) and model == settings.gemini_fast_model != settings.gemini_model
+
+    def choose(self) -> Tuple[str, str]:
+        """Return (model, reason) for the next call."""
+        mode = self.mode
+        if mode == "main":
+            return settings.gemini_model, "main model"
+
+        # Failure signals escalate in "fast" mode too
+        if self.escalated_steps > 0:
+            self.escalated_steps -= 1
+            return settings.gemini_model, f"escalated: {self.escalation_reason}"
+        if mode == "fast":
+            return settings.gemini_fast_model, "fast model"
+        if self.last_step_routine:
+            return settings.gemini_fast_model, "routine follow-up"
+        return settings.gemini_model, "default"
+
+    def escalate(self, reason: str, steps: Optional[int] = None):
+        """Use the main model for the next `steps` calls."""
+        self.escalated_steps = max(self.escalated_steps, steps or settings.model_escalation_steps)
+        self.escalation_reason = reason
+        self.last_step_routine = False
+
+    def record_tool(self, tool_name: Optional[str], succeeded: bool):
+        """Note the outcome of the step's tool call."""
+        self.last_step_routine = succeeded and tool_name in ROUTINE_TOOLS
+        if not succeeded:
+            self.escalate(f"{tool_name} failed")
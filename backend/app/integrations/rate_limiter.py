@@ -0,0 +1,298 @@
+"""Rate limiting for Gemini calls - one limiter per model, shared by every caller.
+
+Each call passes, in order: the circuit breaker, any server-requested pause
+(Retry-After on a 429), a token bucket (requests per minute) and an AIMD
+concurrency window. Failed attempts are retried with exponential backoff and
+full jitter.
+"""
+
+import asyncio
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from google.genai import errors
+
+from app.config import settings
+
+
+# HTTP statuses worth retrying (429 is handled as throttling)
+TRANSIENT_STATUS_CODES = {408, 500, 502, 503, 504}
+
+# Quota errors within this window count as one congestion signal
+DECREASE_COOLDOWN_SECONDS = 1.0
+
+
+class CircuitOpenError(Exception):
+    """The model failed repeatedly; calls are refused until the cooldown ends."""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Gemini circuit open for {model}; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """'throttle' for quota errors, 'transient' for retryable failures, else None."""
+    if isinstance(error, errors.APIError):
+        if error.code == 429:
+            return "throttle"
+        if error.code in TRANSIENT_STATUS_CODES:
+            return "transient"
+        return None
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError)):
+        return "transient"
+    return None
+
+
+def _find_retry_delay(details: Any) -> Optional[str]:
+    if isinstance(details, dict):
+        if "retryDelay" in details:
+            return details["retryDelay"]
+        details = list(details.values())
+    if isinstance(details, list):
+        for item in details:
+            found = _find_retry_delay(item)
+            if found:
+                return found
+    return None
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Server-requested delay: the Retry-After header or a RetryInfo detail ("17s")."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            value = headers.get("retry-after")
+            if value:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+
+    delay = _find_retry_delay(getattr(error, "details", None))
+    if delay:
+        match = re.match(r"([\d.]+)s?$", str(delay))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, server_delay: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, never shorter than the server asked."""
+    ceiling = min(settings.gemini_retry_max_delay, settings.gemini_retry_base_delay * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if server_delay:
+        delay = max(delay, server_delay)
+    return delay
+
+
+class TokenBucket:
+    """Requests-per-minute limit; bursts up to `capacity` requests."""
+
+    def __init__(self, requests_per_minute: int, capacity: Optional[int] = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = capacity or max(1, requests_per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD window on in-flight requests: +1 after a window's worth of
+    successes, halved on quota errors.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(min_limit, max_limit)
+        self.min_limit = min_limit
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit // 2)
+        self._successes = 0
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one probe through after the cooldown."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def check(self, model: str) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go through.
+
+        Returns:
+            True if the call is the half-open probe (see release_probe)
+        """
+        if self.state == "closed":
+            return False
+        remaining = self.opened_at + self.reset_seconds - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        raise CircuitOpenError(model, max(remaining, 1.0))
+
+    def release_probe(self):
+        """Free the probe slot if the probe ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> bool:
+        """Count a failure. Returns True if it opened the circuit."""
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            opened = self.state != "open"
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = False
+            return opened
+        return False
+
+
+class ModelLimiter:
+    """Limiter, breaker and retry policy for one model."""
+
+    def __init__(self, model: str):
+        self.model = model
+        rpm = settings.gemini_model_rpm.get(model, settings.gemini_requests_per_minute)
+        self.bucket = TokenBucket(rpm) if rpm > 0 else None
+        self.concurrency = AdaptiveConcurrency(
+            settings.gemini_model_concurrency.get(model, settings.gemini_max_concurrency)
+        )
+        self.breaker = CircuitBreaker(
+            settings.gemini_circuit_failure_threshold,
+            settings.gemini_circuit_reset_seconds,
+        )
+        self.resume_at = 0.0
+
+    async def call(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `request()` under the limits, retrying throttled and transient failures."""
+        attempt = 0
+        while True:
+            probe = self.breaker.check(self.model)
+            try:
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                if self.bucket:
+                    await self.bucket.acquire()
+
+                await self.concurrency.acquire()
+                error = None
+                try:
+                    result = await request()
+                except Exception as e:
+                    error = e
+                finally:
+                    await self.concurrency.release()
+
+                if error is None:
+                    self.concurrency.on_success()
+                    self.breaker.record_success()
+                    return result
+
+                kind = classify_error(error)
+                if kind is None:
+                    # Not a capacity problem (e.g. a 400): the API is healthy
+                    self.breaker.record_success()
+                    raise error
+
+                server_delay = retry_after(error)
+                opened = False
+                if kind == "throttle":
+                    self.concurrency.on_throttle()
+                    if server_delay:
+                        # Hold back every caller of this model, not just this one
+                        self.resume_at = max(self.resume_at, time.monotonic() + server_delay)
+                    if probe:
+                        # The model is still not taking calls: reopen the circuit
+                        opened = self.breaker.record_failure()
+                else:
+                    opened = self.breaker.record_failure()
+
+                if opened:
+                    # Our own failure opened the circuit: report the upstream error
+                    # (not the CircuitOpenError the next check would raise)
+                    circuit = CircuitOpenError(self.model, self.breaker.reset_seconds)
+                    error.retry_after = circuit.retry_after
+                    raise error from circuit
+
+                if attempt >= settings.gemini_max_retries or (server_delay or 0) > settings.gemini_retry_max_delay:
+                    raise error
+
+                delay = backoff_delay(attempt, server_delay)
+                attempt += 1
+                print(
+                    f"Gemini {kind} error on {self.model} ({error}); retry {attempt}/{settings.gemini_max_retries} "
+                    f"in {delay:.1f}s (concurrency limit {self.concurrency.limit})"
+                )
+                await asyncio.sleep(delay)
+            finally:
+                if probe:
+                    # Cancelled, or ended without closing/reopening the circuit
+                    self.breaker.release_probe()
+
+
+_limiters: Dict[str, ModelLimiter] = {}
+
+
+def limiter_for(model: str) -> ModelLimiter:
+    limiter = _limiters.get(model)
+    if limiter is None:
+        limiter = _limiters[model] = ModelLimiter(model)
+    return limiter
+
+
+def reset_limiters():
+    """Drop all limiter state (called when the client is closed)."""
+    _limiters.clear()
@@ -0,0 +1,219 @@
+"""Token accounting - per-call usage attributed to job, phase, step and call site."""
+
+import copy
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+
+
+# Calls kept in a job's "recent_calls" list
+RECENT_CALLS = 50
+
+# Analyses whose usage waits for a job to be created from them (oldest dropped)
+PENDING_ANALYSES = 256
+
+# Attribution of the calls made in the current task
+_scope: ContextVar[Dict[str, Any]] = ContextVar("usage_scope", default={})
+
+
+class TokenBudgetExceeded(Exception):
+    """A job used up its token budget."""
+
+
+@contextmanager
+def usage_scope(**attributes):
+    """
+    Attribute LLM calls made inside the block.
+
+    Scopes nest: inner values (e.g. step) override outer ones (e.g. job_id).
+    Calls made before a job exists are attributed with analysis_id (the
+    analysis workspace path) and charged to the job created from it.
+
+        with usage_scope(job_id=job.id, call_site="planner"):
+            await generate_with_grounding(...)
+    """
+    merged = dict(_scope.get())
+    merged.update({k: v for k, v in attributes.items() if v is not None})
+    token = _scope.set(merged)
+    try:
+        yield merged
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Dict[str, Any]:
+    return _scope.get()
+
+
+def _empty_totals() -> dict:
+    return {
+        "calls": 0,
+        "prompt_tokens": 0,
+        "output_tokens": 0,
+        "cached_tokens": 0,
+        "total_tokens": 0,
+        "latency_ms": 0,
+    }
+
+
+def analysis_key(workspace_path: str) -> str:
+    return os.path.realpath(workspace_path)
+
+
+def _add(totals: dict, call: dict):
+    totals["calls"] += 1
+    for key in ("prompt_tokens", "output_tokens", "cached_tokens", "total_tokens", "latency_ms"):
+        totals[key] += call[key]
+
+
+def usage_from_response(response: Any) -> dict:
+    """Token counts from a response's usage_metadata (zeros when absent)."""
+    metadata = getattr(response, "usage_metadata", None)
+    prompt = getattr(metadata, "prompt_token_count", None) or 0
+    output = getattr(metadata, "candidates_token_count", None) or 0
+    cached = getattr(metadata, "cached_content_token_count", None) or 0
+    total = getattr(metadata, "total_token_count", None) or (prompt + output)
+    return {
+        "prompt_tokens": prompt,
+        "output_tokens": output,
+        "cached_tokens": cached,
+        "total_tokens": total,
+    }
+
+
+class UsageLedger:
+    """
+    Running token totals, per job and for the whole process.
+
+    A job's usage is seeded from what was persisted on the Job (see attach),
+    so totals keep growing across restarts. Jobs are tracked only while
+    they make calls: release() hands the usage back to the Job.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        # analysis workspace -> usage, until claim_analysis() moves it to a job
+        self._analyses: "OrderedDict[str, dict]" = OrderedDict()
+        self.totals = _empty_totals()
+
+    def attach(self, job) -> dict:
+        """Start tracking a job, continuing from its persisted token_usage."""
+        usage = self._jobs.get(job.id)
+        if usage is None:
+            usage = copy.deepcopy(job.token_usage) if job.token_usage else self._new_usage()
+            self._jobs[job.id] = usage
+        return usage
+
+    def record(
+        self,
+        model: str,
+        response: Any,
+        latency_ms: int,
+        kind: str = "generate",
+        coalesced: bool = False,
+    ) -> dict:
+        """
+        Record one API call under the current usage scope.
+
+        Grounded calls are counted under the "grounding" call site; the
+        caller's own site is kept in the call record. A coalesced call
+        (another caller's response, shared) is charged to the job but not
+        to the process totals.
+
+        Returns:
+            {"model", "call_site", "caller", "job_id", "phase_id", "step",
+             "prompt_tokens", "output_tokens", "cached_tokens", "total_tokens",
+             "latency_ms", "coalesced", "at"}
+        """
+        scope = current_scope()
+        caller = scope.get("call_site", "unknown")
+        call = {
+            "model": model,
+            "call_site": "grounding" if kind == "grounding" else caller,
+            "caller": caller,
+            "job_id": scope.get("job_id"),
+            "phase_id": scope.get("phase_id"),
+            "step": scope.get("step"),
+            **usage_from_response(response),
+            "latency_ms": int(latency_ms),
+            "coalesced": coalesced,
+            "at": datetime.utcnow().isoformat(),
+        }
+
+        if not coalesced:
+            _add(self.totals, call)
+        job_id = call["job_id"]
+        analysis_id = scope.get("analysis_id")
+        usage = None
+        if job_id:
+            usage = self._jobs.setdefault(job_id, self._new_usage())
+        elif analysis_id:
+            key = analysis_key(analysis_id)
+            usage = self._analyses.setdefault(key, self._new_usage())
+            self._analyses.move_to_end(key)
+            while len(self._analyses) > PENDING_ANALYSES:
+                self._analyses.popitem(last=False)
+        if usage is not None:
+            _add(usage, call)
+            _add(usage["by_call_site"].setdefault(call["call_site"], _empty_totals()), call)
+            if call["phase_id"] is not None:
+                _add(usage["by_phase"].setdefault(str(call["phase_id"]), _empty_totals()), call)
+            usage["recent_calls"].append(call)
+            del usage["recent_calls"][:-RECENT_CALLS]
+
+        print(
+            f"[Usage] {call['call_site']}: {call['prompt_tokens']} in "
+            f"({call['cached_tokens']} cached) / {call['output_tokens']} out, {call['latency_ms']}ms"
+            f"{' (coalesced)' if coalesced else ''}"
+        )
+        return call
+
+    def snapshot(self, job_id: str) -> Optional[dict]:
+        """Copy of a job's usage, suitable for Job.token_usage."""
+        usage = self._jobs.get(job_id)
+        return copy.deepcopy(usage) if usage is not None else None
+
+    def total_tokens(self, job_id: str) -> int:
+        usage = self._jobs.get(job_id)
+        return usage["total_tokens"] if usage else 0
+
+    def budget_for(self, job) -> int:
+        """The job's token budget (0 = unlimited)."""
+        return job.token_budget or settings.job_token_budget or 0
+
+    def check_budget(self, job):
+        """Raise TokenBudgetExceeded once the job has used its budget."""
+        budget = self.budget_for(job)
+        used = self.total_tokens(job.id)
+        if budget and used >= budget:
+            raise TokenBudgetExceeded(f"Token budget exhausted: {used} of {budget} tokens used")
+
+    def claim_analysis(self, job, workspace_path: str):
+        """Charge a new job with the usage of the analysis it was created from."""
+        usage = self._analyses.pop(analysis_key(workspace_path), None)
+        if usage is not None:
+            job.token_usage = usage
+
+    def release(self, job):
+        """
+        Save a job's usage to job.token_usage (the caller commits it) and stop
+        tracking the job. Called when a job reaches a final state or waits on
+        the user, and after one-off calls (verifier, audit); attach() picks
+        the usage up again from the Job.
+        """
+        usage = self._jobs.pop(job.id, None)
+        if usage is not None:
+            job.token_usage = usage
+
+    @staticmethod
+    def _new_usage() -> dict:
+        return dict(_empty_totals(), by_call_site={}, by_phase={}, recent_calls=[])
+
+
+# Singleton instance
+usage_ledger = UsageLedger()
@@ -7,7 +7,12 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.db.database import init_db
+from app.integrations.gemini import close_client
+from app.integrations.llm_cache import llm_cache
 from app.integrations.redis_client import close_redis
+from app.services.job_scheduler import job_scheduler
+from app.services.metrics import shutdown_worker_pool
+from app.services.workspace_gc import workspace_reaper
 
 
 @asynccontextmanager
@@ -17,9 +22,20 @@ async def lifespan(app: FastAPI):
     print(f"Kandra starting in {settings.app_env} mode")
     await init_db()
     print("Database initialized")
+    await llm_cache.purge()
+    workspace_reaper.start()
+    if settings.execution_recover_on_startup:
+        from app.api.jobs import recover_executions
+        requeued = await recover_executions()
+        if requeued:
+            print(f"Requeued {requeued} interrupted executions")
     yield
     # Shutdown
+    await job_scheduler.stop()
+    await workspace_reaper.stop()
     await close_redis()
+    await close_client()
+    shutdown_worker_pool()
     print("Kandra shutting down")
 
 
@@ -1,14 +1,54 @@
 """Clone service - handles repository cloning with smart caching."""
 
+import asyncio
+import hashlib
 import os
+import re
 import shutil
-import subprocess
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 
 from app.config import settings
+from app.services.scan_index import INDEX_FILENAME
+from app.services.scanner import CODE_EXTENSIONS, CONFIG_FILES, SKIP_DIRS
+
+
+# Bare mirrors shared by all workspaces live here
+MIRRORS_DIRNAME = ".mirrors"
+
+# Marker file in .kandra/ whose mtime is the workspace's last access
+LAST_ACCESS_FILENAME = "last_access"
+
+# Async callback receiving {"stage", "percent", "message"} progress dicts
+ProgressCallback = Callable[[dict], Awaitable[None]]
+
+# e.g. "Receiving objects:  45% (450/1000), 1.20 MiB | 1.10 MiB/s"
+GIT_PROGRESS_RE = re.compile(r"^(?:remote:\s*)?([A-Za-z ]+):\s+(\d{1,3})%")
+
+
+def sparse_patterns(sparse_paths: Optional[List[str]] = None) -> List[str]:
+    """
+    Build non-cone sparse-checkout patterns.
+    
+    With `sparse_paths` the checkout holds root-level files plus those
+    directories (e.g. the one service being migrated). Otherwise it holds
+    the files the scanner reads: code and config files outside skipped dirs.
+    """
+    if sparse_paths:
+        patterns = ["/*", "!/*/"]
+        for path in sparse_paths:
+            path = path.replace("\\", "/").strip("/")
+            if path and ".." not in path.split("/"):
+                patterns.append(f"/{path}/")
+    else:
+        patterns = [f"*{ext}" for ext in sorted(CODE_EXTENSIONS)] + sorted(CONFIG_FILES)
+    # Last match wins; `dir/` alone would not override `*.js` for files inside
+    patterns += [f"!**/{d}/**" for d in sorted(SKIP_DIRS)]
+    return patterns
 
 
 class CloneService:
@@ -17,6 +57,14 @@ class CloneService:
     def __init__(self):
         self.base_path = Path(settings.workspace_base_path).resolve()
         self.base_path.mkdir(parents=True, exist_ok=True)
+        self.mirrors_path = self.base_path / MIRRORS_DIRNAME
+        # One lock per mirror so concurrent clones of a repo share one fetch
+        self._mirror_locks: Dict[str, asyncio.Lock] = {}
+        self._mirror_refreshed_at: Dict[str, float] = {}
+        # Clones reading each mirror right now (the reaper must not delete it)
+        self._mirror_leases: Dict[str, int] = {}
+        # One lock per sparse checkout so on-demand fetches don't race on the index
+        self._materialize_locks: Dict[str, asyncio.Lock] = {}
     
     def get_workspace_path(self, repo_name: str, session_id: str = None) -> Path:
         """Get a unique workspace path for a repository session."""
@@ -45,19 +93,38 @@ class CloneService:
         clone_url: str,
         repo_name: str,
         force: bool = False,
+        on_progress: Optional[ProgressCallback] = None,
+        partial: Optional[bool] = None,
+        sparse_paths: Optional[List[str]] = None,
     ) -> dict:
         """
         Clone a repository to the workspace using the standardized layout.
         
+        Runs `git clone --progress` as an asyncio subprocess so the event loop
+        stays responsive. Progress updates are passed to `on_progress` as
+        {"stage": str, "percent": int, "message": str}. Cancelling the calling
+        task kills git and removes the partial workspace.
+        
+        With `partial` (default: settings.clone_partial) the clone is blob-less
+        (`--filter=blob:none`, bypassing the mirror cache) and only code and
+        config files are checked out. `sparse_paths` restricts the checkout to
+        those directories plus root-level files. Paths left out are fetched on
+        demand by `materialize()`.
+        
         Returns:
             {
                 "workspace_path": str,  # Root project path
                 "source_path": str,     # path to legacy code
                 "target_path": str,     # path for new code
                 "cloned": bool,
+                "sparse": bool,         # Only part of the tree is checked out
                 "message": str
             }
         """
+        if partial is None:
+            partial = settings.clone_partial
+        sparse = partial or bool(sparse_paths)
+        
         workspace_path = self.get_workspace_path(repo_name)
         source_path = workspace_path / "source"
         target_path = workspace_path / "target"
@@ -70,47 +137,401 @@ class CloneService:
         
         # Clone the repository into source/
         try:
-            # Use shallow clone for speed
-            result = subprocess.run(
-                [
-                    "git", "clone",
-                    "--depth", "1",
-                    "--single-branch",
-                    clone_url,
-                    ".", # Clone into current dir (which is source_path)
-                ],
-                cwd=str(source_path),
-                capture_output=True,
-                text=True,
-                timeout=120,
-            )
+            mirror = None
+            # A mirror holds every blob, which is what a partial clone avoids
+            use_mirror = settings.clone_mirror_cache and not force and not partial
+            
+            if use_mirror:
+                # Leased from the refresh until the local clone has read it
+                with self._lease_mirror(self.get_mirror_path(clone_url)):
+                    try:
+                        mirror = await self._refresh_mirror(clone_url, on_progress)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        print(f"Mirror cache unavailable, cloning directly: {e}")
+                    
+                    if mirror:
+                        # Local clone from the mirror: objects are hardlinked, no network
+                        await self._run_git(
+                            ["clone", "--progress", "--single-branch"]
+                            + (["--no-checkout"] if sparse else [])
+                            + [str(mirror), "."],
+                            cwd=source_path,
+                            timeout=settings.clone_timeout_seconds,
+                            on_progress=on_progress,
+                        )
+            
+            if mirror:
+                await self._run_git(
+                    ["remote", "set-url", "origin", clone_url],
+                    cwd=source_path,
+                    timeout=30,
+                )
+            else:
+                # Use shallow clone for speed
+                await self._run_git(
+                    [
+                        "clone",
+                        "--progress",
+                        "--depth", "1",
+                        "--single-branch",
+                    ]
+                    + (["--filter=blob:none", "--no-checkout"] if sparse else [])
+                    + [
+                        clone_url,
+                        ".", # Clone into current dir (which is source_path)
+                    ],
+                    cwd=source_path,
+                    timeout=settings.clone_timeout_seconds,
+                    on_progress=on_progress,
+                )
+            
+            if sparse:
+                await self._sparse_checkout(source_path, sparse_patterns(sparse_paths), on_progress)
             
-            if result.returncode != 0:
-                raise Exception(f"Git clone failed: {result.stderr}")
+            self._seed_scan_index(workspace_path)
+            self.touch(workspace_path)
             
             return {
                 "workspace_path": str(workspace_path),
                 "source_path": str(source_path),
                 "target_path": str(target_path),
                 "cloned": True,
-                "message": f"Cloned {clone_url} to {source_path}",
+                "sparse": sparse,
+                "message": f"Cloned {clone_url} to {source_path}"
+                + (" (via mirror cache)" if mirror else "")
+                + (" (sparse checkout)" if sparse else ""),
             }
             
-        except subprocess.TimeoutExpired:
-            raise Exception("Clone timeout - repository too large or network issue")
+        except asyncio.CancelledError:
+            print(f"Clone cancelled: {clone_url}")
+            shutil.rmtree(workspace_path, ignore_errors=True)
+            raise
         except Exception as e:
             # Cleanup on failure
             if workspace_path.exists():
-                shutil.rmtree(workspace_path)
+                shutil.rmtree(workspace_path, ignore_errors=True)
             raise Exception(f"Clone failed: {str(e)}")
     
+    def get_mirror_path(self, clone_url: str) -> Path:
+        """Bare mirror location for a remote URL (one mirror per URL)."""
+        # Strip credentials so tokens never end up in directory names
+        public_url = re.sub(r"//[^/@]*@", "//", clone_url)
+        tail = public_url.rstrip("/").split("/")[-1]
+        if tail.endswith(".git"):
+            tail = tail[:-4]
+        tail = re.sub(r"[^A-Za-z0-9._-]", "_", tail) or "repo"
+        digest = hashlib.sha1(public_url.encode()).hexdigest()[:12]
+        return self.mirrors_path / f"{tail}-{digest}.git"
+    
+    async def _refresh_mirror(self, clone_url: str, on_progress: Optional[ProgressCallback] = None) -> Path:
+        """
+        Create or update the bare mirror for a remote.
+        
+        The first call pays for a full `git clone --mirror`; later calls only
+        `git fetch` the delta. Concurrent callers for the same URL wait on
+        one refresh instead of fetching in parallel.
+        
+        The mirror is keyed by the URL without credentials, so a caller that
+        reuses another caller's refresh still checks its own URL against the
+        remote (`git ls-remote`) before getting the mirror.
+        """
+        mirror = self.get_mirror_path(clone_url)
+        lock = self._mirror_locks.setdefault(str(mirror), asyncio.Lock())
+        requested_at = time.monotonic()
+        
+        async with lock:
+            # Another caller may have refreshed it while we were waiting
+            shared = self._mirror_refreshed_at.get(str(mirror), 0) >= requested_at
+            if not shared:
+                await self._fetch_mirror(mirror, clone_url, on_progress)
+        
+        if shared:
+            # The refresh used someone else's URL: a private mirror must not
+            # be handed out on wrong or missing credentials
+            await self._run_git(
+                ["ls-remote", "--heads", clone_url],
+                cwd=self.mirrors_path,
+                timeout=settings.clone_timeout_seconds,
+            )
+        
+        return mirror
+    
+    async def _fetch_mirror(self, mirror: Path, clone_url: str, on_progress: Optional[ProgressCallback] = None):
+        """Fetch into the mirror, or create it with `git clone --mirror` (mirror lock held)."""
+        if (mirror / "HEAD").exists():
+            print(f"Refreshing mirror {mirror.name}...")
+            await self._run_git(
+                ["--git-dir", str(mirror), "fetch", "--progress", "--prune", clone_url,
+                 "+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"],
+                cwd=self.mirrors_path,
+                timeout=settings.clone_timeout_seconds,
+                on_progress=on_progress,
+            )
+        else:
+            print(f"Creating mirror {mirror.name}...")
+            self.mirrors_path.mkdir(parents=True, exist_ok=True)
+            tmp_mirror = mirror.with_name(f"{mirror.name}.{uuid.uuid4().hex[:8]}.tmp")
+            try:
+                await self._run_git(
+                    ["clone", "--mirror", "--progress", clone_url, str(tmp_mirror)],
+                    cwd=self.mirrors_path,
+                    timeout=settings.clone_timeout_seconds,
+                    on_progress=on_progress,
+                )
+                os.replace(tmp_mirror, mirror)
+            finally:
+                shutil.rmtree(tmp_mirror, ignore_errors=True)
+        
+        self._mirror_refreshed_at[str(mirror)] = time.monotonic()
+        # mtime doubles as the mirror's last access for LRU eviction
+        os.utime(mirror)
+    
+    async def _sparse_checkout(
+        self,
+        source_path: Path,
+        patterns: List[str],
+        on_progress: Optional[ProgressCallback] = None,
+    ):
+        """Restrict a `--no-checkout` clone to `patterns`, then check it out."""
+        await self._run_git(
+            ["sparse-checkout", "set", "--no-cone", *patterns],
+            cwd=source_path,
+            timeout=30,
+        )
+        # In a blob-less clone this is where the needed blobs are fetched
+        await self._run_git(
+            ["checkout", "--progress"],
+            cwd=source_path,
+            timeout=settings.clone_timeout_seconds,
+            on_progress=on_progress,
+        )
+    
+    async def materialize(self, source_path, rel_path: str) -> bool:
+        """
+        Check out a tracked path that the sparse checkout left out.
+        
+        Missing blobs of a partial clone are fetched from origin. Returns
+        True if the path exists afterwards.
+        """
+        source_path = Path(source_path)
+        if not (source_path / ".git" / "info" / "sparse-checkout").exists():
+            return False
+        
+        rel_path = Path(os.path.normpath(rel_path)).as_posix()
+        if rel_path.startswith("..") or os.path.isabs(rel_path):
+            return False
+        
+        lock = self._materialize_locks.setdefault(str(source_path), asyncio.Lock())
+        async with lock:
+            if (source_path / rel_path).exists():
+                return True
+            
+            try:
+                tracked = (await self._run_git(
+                    ["ls-files", "--", rel_path], cwd=source_path, timeout=30,
+                )).splitlines()
+                if not tracked:
+                    return False
+                
+                # A single exact match is a file, anything else a directory
+                pattern = f"/{rel_path}" if tracked == [rel_path] else f"/{rel_path}/"
+                await self._run_git(
+                    ["sparse-checkout", "add", pattern],
+                    cwd=source_path,
+                    timeout=settings.clone_timeout_seconds,
+                )
+                print(f"Materialized {rel_path} in {source_path}")
+            except Exception as e:
+                print(f"Materialize failed for {rel_path}: {e}")
+                return False
+        
+        return (source_path / rel_path).exists()
+    
+    async def _run_git(
+        self,
+        args: List[str],
+        cwd: Path,
+        timeout: float,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> str:
+        """
+        Run a git command without blocking the event loop.
+        
+        git writes progress to stderr using carriage returns, so stderr is
+        read in raw chunks and split on both CR and LF. Returns stdout.
+        """
+        process = await asyncio.create_subprocess_exec(
+            "git", *args,
+            cwd=str(cwd),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        
+        stderr_tail: List[str] = []
+        last_reported = None
+        
+        async def read_stderr():
+            nonlocal last_reported
+            buffer = ""
+            while True:
+                chunk = await process.stderr.read(4096)
+                if not chunk:
+                    break
+                buffer += chunk.decode(errors="replace")
+                *lines, buffer = re.split(r"[\r\n]", buffer)
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    stderr_tail.append(line)
+                    del stderr_tail[:-20]
+                    
+                    match = GIT_PROGRESS_RE.search(line)
+                    if match and on_progress:
+                        stage, percent = match.group(1), int(match.group(2))
+                        if (stage, percent) != last_reported:
+                            last_reported = (stage, percent)
+                            try:
+                                await on_progress({"stage": stage, "percent": percent, "message": line})
+                            except Exception as e:
+                                print(f"Clone progress callback failed: {e}")
+        
+        async def communicate():
+            return await asyncio.gather(process.stdout.read(), read_stderr(), process.wait())
+        
+        try:
+            stdout, _, _ = await asyncio.wait_for(communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._kill(process)
+            await process.wait()
+            raise Exception(f"git {self._subcommand(args)} timed out after {timeout:g}s - repository too large or network issue")
+        except asyncio.CancelledError:
+            self._kill(process)
+            await process.wait()
+            raise
+        
+        if process.returncode != 0:
+            details = "\n".join(stderr_tail)
+            raise Exception(f"git {self._subcommand(args)} failed: {details}")
+        
+        return stdout.decode(errors="replace")
+    
+    @staticmethod
+    def _subcommand(args: List[str]) -> str:
+        """The git subcommand of an argument list, skipping global options ("--git-dir X fetch" -> "fetch")."""
+        i = 0
+        while i < len(args) and args[i].startswith("-"):
+            i += 2 if args[i] in ("--git-dir", "-C", "-c") else 1
+        if i >= len(args):
+            return "command"
+        # sparse-checkout is only meaningful with its action (set/add)
+        return " ".join(args[i:i + 2]) if args[i] == "sparse-checkout" else args[i]
+    
+    @staticmethod
+    def _kill(process: asyncio.subprocess.Process):
+        """Kill a subprocess if it is still running."""
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+    
+    def _seed_scan_index(self, workspace_path: Path):
+        """
+        Warm-start the scan index from the newest sibling workspace of the
+        same repository. Entries are revalidated by git blob id, so only
+        files that changed upstream are re-read.
+        """
+        repo_key = workspace_path.name.rsplit("_", 1)[0]
+        candidates = [
+            p / ".kandra" / INDEX_FILENAME
+            for p in self.base_path.iterdir()
+            if p != workspace_path and p.name.rsplit("_", 1)[0] == repo_key
+        ]
+        candidates = [c for c in candidates if c.exists()]
+        if not candidates:
+            return
+        
+        newest = max(candidates, key=lambda c: c.stat().st_mtime)
+        try:
+            shutil.copy2(newest, workspace_path / ".kandra" / INDEX_FILENAME)
+        except OSError as e:
+            print(f"Scan index seed skipped: {e}")
+    
+    def list_workspaces(self, repo_name: str = None) -> List[Path]:
+        """List workspace directories, optionally only those of one repository."""
+        if not self.base_path.exists():
+            return []
+        
+        repo_key = repo_name.replace("/", "_").replace("\\", "_") if repo_name else None
+        workspaces = []
+        for p in self.base_path.iterdir():
+            if not p.is_dir() or p.name.startswith("."):
+                continue
+            if repo_key and p.name.rsplit("_", 1)[0] != repo_key:
+                continue
+            workspaces.append(p)
+        return workspaces
+    
+    def touch(self, workspace_path) -> None:
+        """Record an access to a workspace (used for LRU eviction)."""
+        marker = Path(workspace_path) / ".kandra" / LAST_ACCESS_FILENAME
+        try:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+        except OSError:
+            pass
+    
+    def last_access(self, workspace_path: Path) -> float:
+        """Timestamp of the last recorded access to a workspace."""
+        marker = workspace_path / ".kandra" / LAST_ACCESS_FILENAME
+        try:
+            return marker.stat().st_mtime
+        except OSError:
+            return workspace_path.stat().st_mtime
+    
+    def remove_workspace(self, workspace_path) -> bool:
+        """Delete a workspace directory (only ever inside base_path)."""
+        workspace_path = Path(workspace_path).resolve()
+        if workspace_path.parent != self.base_path or not workspace_path.exists():
+            return False
+        shutil.rmtree(workspace_path, ignore_errors=True)
+        return True
+    
+    @contextmanager
+    def _lease_mirror(self, mirror: Path):
+        """Mark a mirror in use (see is_mirror_busy) for the duration of the block."""
+        key = str(mirror)
+        self._mirror_leases[key] = self._mirror_leases.get(key, 0) + 1
+        if mirror.exists():
+            os.utime(mirror)  # Last access, for LRU eviction and the reaper's min-idle guard
+        try:
+            yield
+        finally:
+            self._mirror_leases[key] -= 1
+            if not self._mirror_leases[key]:
+                del self._mirror_leases[key]
+    
+    def is_mirror_busy(self, mirror: Path) -> bool:
+        """Whether a mirror is being refreshed or a clone is reading it right now."""
+        lock = self._mirror_locks.get(str(mirror))
+        return bool(lock and lock.locked()) or self._mirror_leases.get(str(mirror), 0) > 0
+    
+    def remove_mirror(self, mirror: Path) -> bool:
+        """Delete a bare mirror (workspaces cloned from it keep their hardlinked objects)."""
+        mirror = Path(mirror).resolve()
+        if mirror.parent != self.mirrors_path or self.is_mirror_busy(mirror):
+            return False
+        shutil.rmtree(mirror, ignore_errors=True)
+        self._mirror_refreshed_at.pop(str(mirror), None)
+        return True
+    
     def cleanup(self, repo_name: str) -> bool:
-        """Remove a workspace."""
-        workspace_path = self.get_workspace_path(repo_name)
-        if workspace_path.exists():
-            shutil.rmtree(workspace_path)
-            return True
-        return False
+        """Remove all workspaces of a repository."""
+        removed = [self.remove_workspace(p) for p in self.list_workspaces(repo_name)]
+        return any(removed)
 
 
 # Singleton instance
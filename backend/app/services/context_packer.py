@@ -0,0 +1,185 @@
+"""Context packer - ranks scanned files and fits them into a token budget."""
+
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.services.scanner import CONFIG_FILES
+
+
+# Rough token estimate used for budgeting (Gemini averages ~4 chars/token)
+CHARS_PER_TOKEN = 4
+
+ENTRY_POINTS = {
+    "main.py", "app.py", "server.py", "manage.py", "wsgi.py", "asgi.py", "__main__.py",
+    "index.js", "index.ts", "main.js", "main.ts", "server.js", "server.ts", "app.js", "app.ts",
+    "main.go", "main.rs", "lib.rs", "Program.cs", "Application.java", "Main.java",
+    "index.php", "config.ru", "application.rb",
+}
+
+IMPORT_PATTERNS = [
+    re.compile(r"^\s*from\s+([\w\.]+)\s+import", re.M),                 # Python
+    re.compile(r"^\s*import\s+([\w\.]+)", re.M),                        # Python / Java
+    re.compile(r"""require(?:_relative)?\(?\s*['"]([^'"]+)['"]"""),     # Node / Ruby
+    re.compile(r"""(?:import|export)\s[^'"]*?from\s+['"]([^'"]+)['"]"""),  # ES modules
+    re.compile(r"""^\s*import\s+['"]([^'"]+)['"]""", re.M),             # Side-effect / Go
+    re.compile(r"""^\s*(?:use|mod)\s+(?:crate::)?([\w:]+)""", re.M),    # Rust
+]
+
+OUTLINE_PATTERN = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:pub\s+)?"
+    r"(?:def|class|function|func|fn|struct|interface|type|enum|impl|module|trait"
+    r"|public|private|protected|const\s+\w+\s*=\s*(?:async\s*)?(?:\(|function))"
+    r"|^\s*@\w+"
+    r"|^\s*(?:app|router)\.(?:get|post|put|patch|delete|use|route)\b"
+)
+
+TEST_MARKERS = ("test", "tests", "spec", "__tests__")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budgeting."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _module_stem(module: str) -> str:
+    """Reduce an import target to the file stem it most likely refers to."""
+    module = module.rstrip("/")
+    if "/" in module:
+        # Path-like: './models/user.js', 'lodash/fp'
+        return os.path.splitext(module.rsplit("/", 1)[-1])[0]
+    # Dotted or Rust paths: 'app.models', '..models', 'crate::db'
+    return re.split(r"::|\.", module.strip("."))[-1]
+
+
+def _file_stems(path: str) -> List[str]:
+    """Names other files could use to import this file."""
+    stem, _ = os.path.splitext(os.path.basename(path))
+    stems = [stem]
+    # `import x from './models'` resolves to models/index.js, `from pkg import` to pkg/__init__.py
+    if stem in ("index", "__init__", "mod"):
+        parent = os.path.basename(os.path.dirname(path))
+        if parent:
+            stems.append(parent)
+    return stems
+
+
+def import_in_degree(files: List[dict]) -> Dict[str, int]:
+    """Count how many other files import each file (import-graph centrality)."""
+    by_stem: Dict[str, List[str]] = {}
+    for f in files:
+        for stem in _file_stems(f["path"]):
+            by_stem.setdefault(stem, []).append(f["path"])
+
+    in_degree = {f["path"]: 0 for f in files}
+    for f in files:
+        targets = set()
+        for pattern in IMPORT_PATTERNS:
+            for module in pattern.findall(f["content"]):
+                for target in by_stem.get(_module_stem(module), []):
+                    if target != f["path"]:
+                        targets.add(target)
+        for target in targets:
+            in_degree[target] += 1
+    return in_degree
+
+
+def outline(content: str, max_lines: int = 40) -> str:
+    """Reduce a file to its imports and top-level signatures."""
+    lines = []
+    for line in content.splitlines():
+        stripped = line.strip()
+        is_import = stripped.startswith(("import ", "from ", "require", "use ", "#include", "package "))
+        if is_import or OUTLINE_PATTERN.match(line):
+            lines.append(line.rstrip())
+            if len(lines) >= max_lines:
+                lines.append("...")
+                break
+    return "\n".join(lines)
+
+
+def rank_files(files: List[dict]) -> List[dict]:
+    """
+    Score files by importance, highest first.
+
+    Signals: manifest/config files, conventional entry points, import-graph
+    in-degree, file size, path depth, and a penalty for tests.
+    """
+    in_degree = import_in_degree(files)
+    max_in = max(in_degree.values()) if in_degree else 0
+
+    ranked = []
+    for f in files:
+        path = f["path"]
+        name = os.path.basename(path)
+        parts = [p.lower() for p in path.split(os.sep)]
+        size = f.get("size") or len(f["content"])
+
+        score = 0.0
+        if name in CONFIG_FILES:
+            score += 100
+        if name in ENTRY_POINTS:
+            score += 60
+        if max_in:
+            score += 40 * in_degree[path] / max_in
+        score += min(10.0, max(0.0, math.log2(max(size, 1) / 256)))
+        score -= 3 * (len(parts) - 1)
+        if any(p in TEST_MARKERS for p in parts[:-1]) or name.startswith("test_") \
+                or ".test." in name or ".spec." in name:
+            score -= 25
+
+        ranked.append({**f, "score": round(score, 2), "imported_by": in_degree[path]})
+
+    ranked.sort(key=lambda f: f["score"], reverse=True)
+    return ranked
+
+
+def pack_context(files: List[dict], token_budget: Optional[int] = None, max_full_files: Optional[int] = None) -> dict:
+    """
+    Fill a token budget with the most important files.
+
+    The top `max_full_files` ranked files are sent in full when they fit;
+    everything else is sent as an outline, and whatever still does not fit
+    is listed by path only.
+
+    Returns:
+        {
+            "files": [{"path", "language", "content", "mode": "full"|"outline", "score"}],
+            "omitted": [path, ...],
+            "tokens": int  # Estimated tokens used
+        }
+    """
+    token_budget = token_budget or settings.context_token_budget
+    max_full_files = max_full_files or settings.context_max_files
+
+    packed = []
+    omitted = []
+    used = 0
+
+    for rank, f in enumerate(rank_files(files)):
+        header = f"=== {f['path']} ({f['language']}) ===\n"
+        candidates = []
+        if rank < max_full_files or f["path"].split(os.sep)[-1] in CONFIG_FILES:
+            candidates.append(("full", f["content"]))
+        candidates.append(("outline", outline(f["content"])))
+
+        for mode, body in candidates:
+            if not body.strip():
+                continue
+            cost = estimate_tokens(header + body)
+            if used + cost <= token_budget:
+                packed.append({
+                    "path": f["path"],
+                    "language": f["language"],
+                    "content": body,
+                    "mode": mode,
+                    "score": f["score"],
+                })
+                used += cost
+                break
+        else:
+            omitted.append(f["path"])
+
+    return {"files": packed, "omitted": omitted, "tokens": used}
@@ -0,0 +1,208 @@
+"""Job scheduler - admits executions by machine capacity instead of one at a time.
+
+Every execution costs a weight (estimated CPU cores / GB of RAM) looked up
+from its target stack, and runs once the weights of the running jobs leave
+room for it. Waiting jobs are ordered by priority, then by how many jobs
+their owner already runs (so one user can't fill the machine), then FIFO.
+The head of the queue is never overtaken by a smaller job, so heavy stacks
+don't starve.
+
+    await job_scheduler.submit(job, run_executor)
+    await job_scheduler.cancel(job_id)
+"""
+
+import asyncio
+import itertools
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.db.models import Job
+from app.integrations.redis_client import publish_event
+
+
+def machine_capacity() -> float:
+    """Capacity units the machine holds: min(CPU cores, GB of RAM)."""
+    cpus = os.cpu_count() or 1
+    try:
+        memory_gb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3
+    except (AttributeError, ValueError, OSError):
+        return float(cpus)
+    return float(max(1, min(cpus, int(memory_gb))))
+
+
+def stack_weight(target_stack: Optional[str]) -> float:
+    """Estimated cost of running a job for a target stack (SCHEDULER_STACK_WEIGHTS)."""
+    stack = (target_stack or "").lower()
+    for name, weight in settings.scheduler_stack_weights.items():
+        if re.search(rf"(?<![a-z0-9]){re.escape(name.lower())}(?![a-z0-9])", stack):
+            return weight
+    return settings.scheduler_default_weight
+
+
+def job_owner(job: Job) -> str:
+    """Fairness key: the job's owner, else the repository owner."""
+    if job.owner:
+        return job.owner
+    match = re.search(r"[:/]([^/:]+)/[^/]+?(?:\.git)?/?$", job.repo_url or "")
+    return match.group(1).lower() if match else "anonymous"
+
+
+@dataclass
+class ScheduledJob:
+    job_id: str
+    owner: str
+    priority: int
+    weight: float
+    run: Callable[[], Awaitable[Any]]
+    seq: int
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class JobScheduler:
+    """Weighted-capacity admission with a priority/fair queue and cancellation."""
+
+    def __init__(self):
+        self._queue: List[ScheduledJob] = []
+        self._running: Dict[str, ScheduledJob] = {}
+        self._seq = itertools.count()
+        self._lock = asyncio.Lock()
+
+    @property
+    def capacity(self) -> float:
+        return settings.scheduler_capacity or machine_capacity()
+
+    @property
+    def used(self) -> float:
+        return sum(job.weight for job in self._running.values())
+
+    def is_scheduled(self, job_id: str) -> bool:
+        return job_id in self._running or any(job.job_id == job_id for job in self._queue)
+
+    async def submit(self, job: Job, run: Callable[[], Awaitable[Any]], priority: Optional[int] = None) -> int:
+        """
+        Queue an execution. `run` is called (and awaited in a task) once admitted.
+
+        Returns:
+            Queue position (0 if the job started right away)
+        """
+        async with self._lock:
+            if self.is_scheduled(job.id):
+                return self.position(job.id)
+            # A job heavier than the machine still runs, alone
+            weight = min(stack_weight(job.target_stack), self.capacity)
+            self._queue.append(ScheduledJob(
+                job_id=job.id,
+                owner=job_owner(job),
+                priority=(job.priority or 0) if priority is None else priority,
+                weight=weight,
+                run=run,
+                seq=next(self._seq),
+            ))
+            print(f"[Scheduler] Job {job.id} queued (weight {weight:g}, {len(self._queue)} waiting)")
+            await self._dispatch()
+            return self.position(job.id)
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Remove a waiting job or cancel a running one.
+
+        Returns:
+            "queued" or "running" (where the job was), or None if unknown
+        """
+        async with self._lock:
+            for job in self._queue:
+                if job.job_id == job_id:
+                    self._queue.remove(job)
+                    print(f"[Scheduler] Job {job_id} removed from the queue")
+                    await self._publish_positions()
+                    return "queued"
+            running = self._running.get(job_id)
+        if running is None:
+            return None
+        running.task.cancel()
+        # Wait for the job to unwind without absorbing a cancellation of this call
+        await asyncio.wait([running.task])
+        if not running.task.cancelled() and running.task.exception() is not None:
+            print(f"[Scheduler] Job {job_id} failed while cancelling: {running.task.exception()}")
+        print(f"[Scheduler] Job {job_id} cancelled while running")
+        return "running"
+
+    def position(self, job_id: str) -> int:
+        """1-based queue position, 0 if running or unknown."""
+        for i, job in enumerate(self._ordered()):
+            if job.job_id == job_id:
+                return i + 1
+        return 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "used": self.used,
+            "running": sorted(self._running),
+            "queued": [job.job_id for job in self._ordered()],
+        }
+
+    async def stop(self):
+        """Cancel running executions (jobs stay EXECUTING) and drop the queue."""
+        self._queue.clear()
+        tasks = [job.task for job in self._running.values() if job.task]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _ordered(self) -> List[ScheduledJob]:
+        running_per_owner: Dict[str, int] = {}
+        for job in self._running.values():
+            running_per_owner[job.owner] = running_per_owner.get(job.owner, 0) + 1
+        return sorted(
+            self._queue,
+            key=lambda job: (-job.priority, running_per_owner.get(job.owner, 0), job.seq),
+        )
+
+    async def _dispatch(self):
+        """Start queued jobs while the head of the queue fits (lock held)."""
+        started = False
+        while self._queue:
+            head = self._ordered()[0]
+            if self._running and self.used + head.weight > self.capacity:
+                break
+            self._queue.remove(head)
+            self._running[head.job_id] = head
+            head.task = asyncio.create_task(self._run(head))
+            started = True
+            print(f"🚀 [Scheduler] Job {head.job_id} started ({self.used:g}/{self.capacity:g} capacity in use)")
+            await publish_event(f"job:{head.job_id}", {
+                "type": "queue_position",
+                "job_id": head.job_id,
+                "position": 0,
+                "queued_jobs": len(self._queue),
+                "running_jobs": len(self._running),
+            })
+        if started or self._queue:
+            await self._publish_positions()
+
+    async def _publish_positions(self):
+        for i, job in enumerate(self._ordered()):
+            await publish_event(f"job:{job.job_id}", {
+                "type": "queue_position",
+                "job_id": job.job_id,
+                "position": i + 1,
+                "queued_jobs": len(self._queue),
+                "running_jobs": len(self._running),
+            })
+
+    async def _run(self, job: ScheduledJob):
+        try:
+            await job.run()
+        finally:
+            async with self._lock:
+                self._running.pop(job.job_id, None)
+                await self._dispatch()
+
+
+# Singleton instance
+job_scheduler = JobScheduler()
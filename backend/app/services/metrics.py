@@ -0,0 +1,344 @@
+"""Metrics engine - cloc-style line, byte and file counts per language."""
+
+import hashlib
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.scanner import BINARY_SNIFF_BYTES, SKIP_DIRS
+
+
+METRICS_VERSION = 1
+
+# Cached results live here, keyed by commit (shared by all workspaces)
+METRICS_DIRNAME = ".metrics"
+
+# Cache entries kept before the oldest are pruned
+MAX_CACHE_ENTRIES = 500
+
+# Files per worker task
+CHUNK_SIZE = 500
+
+# Files listed under "largest_files"
+LARGEST_FILES = 10
+
+# Files are read in blocks of this size, so memory doesn't grow with file size
+READ_BLOCK_BYTES = 1 << 16
+
+# Bytes kept from the start of each line: enough to classify it as blank/comment
+LINE_HEAD_BYTES = 256
+
+# extension -> (language, line comment prefixes). Names match the scanner's.
+LANGUAGES: Dict[str, Tuple[str, Tuple[bytes, ...]]] = {
+    ".py": ("Python", (b"#",)),
+    ".js": ("JavaScript", (b"//",)),
+    ".mjs": ("JavaScript", (b"//",)),
+    ".cjs": ("JavaScript", (b"//",)),
+    ".ts": ("TypeScript", (b"//",)),
+    ".jsx": ("React", (b"//",)),
+    ".tsx": ("React TypeScript", (b"//",)),
+    ".vue": ("Vue", (b"//", b"<!--")),
+    ".svelte": ("Svelte", (b"//", b"<!--")),
+    ".go": ("Go", (b"//",)),
+    ".rs": ("Rust", (b"//",)),
+    ".java": ("Java", (b"//",)),
+    ".kt": ("Kotlin", (b"//",)),
+    ".scala": ("Scala", (b"//",)),
+    ".rb": ("Ruby", (b"#",)),
+    ".php": ("PHP", (b"//", b"#")),
+    ".swift": ("Swift", (b"//",)),
+    ".c": ("C", (b"//",)),
+    ".h": ("C", (b"//",)),
+    ".cpp": ("C++", (b"//",)),
+    ".hpp": ("C++", (b"//",)),
+    ".cs": ("C#", (b"//",)),
+    ".m": ("Objective-C", (b"//",)),
+    ".sh": ("Shell", (b"#",)),
+    ".bash": ("Shell", (b"#",)),
+    ".zsh": ("Shell", (b"#",)),
+    ".sql": ("SQL", (b"--",)),
+    ".html": ("HTML", (b"<!--",)),
+    ".css": ("CSS", (b"/*",)),
+    ".scss": ("SCSS", (b"//", b"/*")),
+    ".json": ("JSON", ()),
+    ".yml": ("YAML", (b"#",)),
+    ".yaml": ("YAML", (b"#",)),
+    ".toml": ("TOML", (b"#",)),
+    ".xml": ("XML", (b"<!--",)),
+    ".md": ("Markdown", ()),
+}
+
+
+def _empty_counts() -> dict:
+    return {"files": 0, "lines": 0, "code": 0, "comment": 0, "blank": 0, "bytes": 0}
+
+
+def count_lines(f, prefixes: Tuple[bytes, ...]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Count (lines, blank, comment, bytes) of an open binary file, reading
+    it in fixed-size blocks. Lines end at LF; a trailing CR is whitespace.
+
+    Returns None for binary files (NUL byte in the first block).
+    """
+    lines = blank = comment = size = 0
+    head = b""  # Start of the current line without leading whitespace (capped)
+    in_line = False
+    first_block = True
+
+    while True:
+        block = f.read(READ_BLOCK_BYTES)
+        if not block:
+            break
+        if first_block and b"\0" in block[:BINARY_SNIFF_BYTES]:
+            return None
+        first_block = False
+        size += len(block)
+
+        parts = block.split(b"\n")
+        for i, part in enumerate(parts):
+            if not head:
+                head = part.lstrip()[:LINE_HEAD_BYTES]
+            elif len(head) < LINE_HEAD_BYTES:
+                head += part[:LINE_HEAD_BYTES - len(head)]
+            in_line = in_line or bool(part)
+            if i == len(parts) - 1:
+                break  # The line continues in the next block
+
+            stripped = head.rstrip()
+            lines += 1
+            if not stripped:
+                blank += 1
+            elif prefixes and stripped.startswith(prefixes):
+                comment += 1
+            head = b""
+            in_line = False
+
+    if in_line:
+        stripped = head.rstrip()
+        lines += 1
+        if not stripped:
+            blank += 1
+        elif prefixes and stripped.startswith(prefixes):
+            comment += 1
+    return lines, blank, comment, size
+
+
+def count_files(root: str, paths: List[str]) -> dict:
+    """
+    Count lines in a batch of files (runs in a worker process).
+
+    Files with unknown extensions only contribute to byte and file totals;
+    binary files are skipped for line counts.
+
+    Returns:
+        {"languages": {lang: counts}, "other": counts, "largest": [(bytes, path, lines, lang)]}
+    """
+    languages: Dict[str, dict] = {}
+    other = _empty_counts()
+    largest: List[tuple] = []
+
+    for rel_path in paths:
+        full_path = os.path.join(root, rel_path)
+        language, prefixes = LANGUAGES.get(os.path.splitext(rel_path)[1].lower(), (None, ()))
+        try:
+            with open(full_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                result = count_lines(f, prefixes) if language else None
+        except OSError:
+            continue  # Not checked out (sparse) or unreadable
+
+        if result is None:
+            other["files"] += 1
+            other["bytes"] += size
+            continue
+
+        lines, blank, comment, size = result
+        counts = languages.setdefault(language, _empty_counts())
+        counts["files"] += 1
+        counts["lines"] += lines
+        counts["blank"] += blank
+        counts["comment"] += comment
+        counts["code"] += lines - blank - comment
+        counts["bytes"] += size
+        largest.append((size, rel_path, lines, language))
+
+    largest.sort(reverse=True)
+    return {"languages": languages, "other": other, "largest": largest[:LARGEST_FILES]}
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _worker_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all collect() calls, sized by METRICS_MAX_WORKERS."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = max(1, min(settings.metrics_max_workers, os.cpu_count() or 1))
+            _pool = ProcessPoolExecutor(max_workers=workers)
+        return _pool
+
+
+def shutdown_worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+class MetricsEngine:
+    """Computes repository metrics across the whole tree, cached per commit."""
+
+    def __init__(self, cache_dir: Optional[Path] = None, parallel_threshold: int = None):
+        self.cache_dir = cache_dir or Path(settings.workspace_base_path).resolve() / METRICS_DIRNAME
+        self.parallel_threshold = parallel_threshold or settings.metrics_parallel_threshold
+
+    def collect(self, source_path: str) -> dict:
+        """
+        Compute metrics for a checkout, reusing the cached result of the
+        same commit when available.
+
+        Returns:
+            {
+                "commit": str|None,
+                "totals": {"files", "lines", "code", "comment", "blank", "bytes"},
+                "languages": {lang: {"files", "lines", "code", "comment", "blank", "bytes"}},
+                "largest_files": [{"path", "bytes", "lines", "language"}],
+                "cached": bool
+            }
+        """
+        source = Path(source_path)
+        if not source.exists():
+            raise FileNotFoundError(f"Workspace not found: {source_path}")
+
+        cache_key = self._cache_key(source)
+        if cache_key:
+            cached = self._load(cache_key)
+            if cached:
+                return dict(cached, cached=True)
+
+        paths = self._list_files(source)
+        if len(paths) >= self.parallel_threshold:
+            chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+            try:
+                partials = list(_worker_pool().map(count_files, [str(source)] * len(chunks), chunks))
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed): start a fresh pool next time
+                shutdown_worker_pool()
+                partials = [count_files(str(source), paths)]
+        else:
+            partials = [count_files(str(source), paths)]
+
+        metrics = self._merge(partials)
+        metrics["commit"] = cache_key.split("-", 1)[0] if cache_key else None
+        if cache_key:
+            self._save(cache_key, metrics)
+        return dict(metrics, cached=False)
+
+    def _cache_key(self, source: Path) -> Optional[str]:
+        """HEAD commit, plus the sparse-checkout patterns when not fully checked out."""
+        if not (source / ".git").exists():
+            return None
+        try:
+            result = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=str(source), capture_output=True, text=True, timeout=10,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+
+        key = result.stdout.strip()
+        sparse_file = source / ".git" / "info" / "sparse-checkout"
+        if sparse_file.exists():
+            key += "-" + hashlib.sha1(sparse_file.read_bytes()).hexdigest()[:12]
+        return key
+
+    def _list_files(self, source: Path) -> List[str]:
+        """Tracked files (or every file outside a git checkout), skipping vendored dirs."""
+        paths = None
+        if (source / ".git").exists():
+            try:
+                result = subprocess.run(
+                    ["git", "ls-files", "-z"],
+                    cwd=str(source), capture_output=True, timeout=60,
+                )
+                if result.returncode == 0:
+                    paths = [p for p in result.stdout.decode(errors="replace").split("\0") if p]
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+
+        if paths is None:
+            paths = []
+            for root, dirs, files in os.walk(source):
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+                rel_root = os.path.relpath(root, source)
+                for name in files:
+                    paths.append(name if rel_root == "." else os.path.join(rel_root, name))
+            return paths
+
+        return [
+            p for p in paths
+            if not any(part in SKIP_DIRS for part in p.split("/")[:-1])
+        ]
+
+    @staticmethod
+    def _merge(partials: List[dict]) -> dict:
+        languages: Dict[str, dict] = {}
+        totals = _empty_counts()
+        largest = []
+        for partial in partials:
+            for language, counts in partial["languages"].items():
+                merged = languages.setdefault(language, _empty_counts())
+                for key, value in counts.items():
+                    merged[key] += value
+                    totals[key] += value
+            totals["files"] += partial["other"]["files"]
+            totals["bytes"] += partial["other"]["bytes"]
+            largest.extend(partial["largest"])
+
+        largest.sort(reverse=True)
+        return {
+            "totals": totals,
+            "languages": dict(sorted(languages.items(), key=lambda kv: kv[1]["code"], reverse=True)),
+            "largest_files": [
+                {"path": path, "bytes": size, "lines": lines, "language": language}
+                for size, path, lines, language in largest[:LARGEST_FILES]
+            ],
+        }
+
+    def _load(self, cache_key: str) -> Optional[dict]:
+        try:
+            data = json.loads((self.cache_dir / f"{cache_key}.json").read_text())
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != METRICS_VERSION:
+            return None
+        return data["metrics"]
+
+    def _save(self, cache_key: str, metrics: dict):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self.cache_dir / f"{cache_key}.json"
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({"version": METRICS_VERSION, "metrics": metrics}))
+            os.replace(tmp_path, path)
+
+            entries = sorted(self.cache_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            for stale in entries[:-MAX_CACHE_ENTRIES]:
+                stale.unlink(missing_ok=True)
+        except OSError as e:
+            print(f"[Metrics] Failed to cache metrics: {e}")
+
+
+# Singleton instance
+metrics_engine = MetricsEngine()
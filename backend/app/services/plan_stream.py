@@ -0,0 +1,87 @@
+"""Incremental plan parser - surfaces plan phases while the plan JSON is still streaming."""
+
+import json
+from typing import List, Optional
+
+
+class PhaseStreamParser:
+    """
+    Scans streamed plan text once, tracking strings and nesting, and returns
+    each element of the top-level "phases" array as soon as its closing
+    brace arrives. Text around the JSON (e.g. code fences) is ignored.
+
+        parser = PhaseStreamParser()
+        for chunk in chunks:
+            for phase in parser.feed(chunk):
+                ...
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.phases: List[dict] = []
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_top_level_string: Optional[str] = None
+        self._phases_depth: Optional[int] = None  # Depth inside the "phases" array
+        self._phases_done = False
+        self._phase_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Add streamed text; return the phases completed by it."""
+        self.text += chunk
+        text = self.text
+        completed = []
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_top_level_string = text[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == "{" or ch == "[":
+                self._depth += 1
+                if (
+                    ch == "["
+                    and self._depth == 2
+                    and not self._phases_done
+                    and self._last_top_level_string == "phases"
+                ):
+                    self._phases_depth = self._depth
+                elif ch == "{" and self._phases_depth and self._depth == self._phases_depth + 1:
+                    self._phase_start = i
+            elif ch == "}" or ch == "]":
+                if ch == "}" and self._phase_start is not None and self._depth == self._phases_depth + 1:
+                    phase = self._parse(text[self._phase_start:i + 1])
+                    if phase is not None:
+                        completed.append(phase)
+                    self._phase_start = None
+                elif ch == "]" and self._phases_depth and self._depth == self._phases_depth:
+                    self._phases_depth = None
+                    self._phases_done = True
+                self._depth = max(0, self._depth - 1)
+
+        self._pos = len(text)
+        self.phases.extend(completed)
+        return completed
+
+    @staticmethod
+    def _parse(fragment: str) -> Optional[dict]:
+        try:
+            phase = json.loads(fragment)
+        except ValueError:
+            return None
+        return phase if isinstance(phase, dict) else None
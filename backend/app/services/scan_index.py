@@ -0,0 +1,176 @@
+"""Scan index - persistent per-workspace cache of scanned file entries.
+
+Each entry is keyed by relative path and validated by size + mtime. When the
+stat signature changes (fresh checkout, touch) the entry is still reused if the
+git blob id of the file matches, so a re-scan only reads files whose content
+actually changed.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+from pathlib import Path
+from typing import Dict, Optional
+
+
+INDEX_VERSION = 1
+INDEX_FILENAME = "scan_index.json"
+
+
+def blob_id(data: bytes) -> str:
+    """Compute the git blob id of raw file content."""
+    header = f"blob {len(data)}\0".encode()
+    return hashlib.sha1(header + data).hexdigest()
+
+
+def git_blob_ids(repo_path: Path) -> Dict[str, str]:
+    """
+    Read blob ids of unmodified tracked files straight from the git index.
+
+    This costs one `git ls-files` call instead of hashing every file.
+    Returns an empty dict if the path is not a git checkout.
+    """
+    if not (repo_path / ".git").exists():
+        return {}
+
+    try:
+        staged = subprocess.run(
+            ["git", "ls-files", "--stage", "-z"],
+            cwd=str(repo_path), capture_output=True, timeout=30,
+        )
+        modified = subprocess.run(
+            ["git", "ls-files", "--modified", "-z"],
+            cwd=str(repo_path), capture_output=True, timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+
+    if staged.returncode != 0 or modified.returncode != 0:
+        return {}
+
+    dirty = set(modified.stdout.decode(errors="replace").split("\0"))
+    blobs = {}
+    for record in staged.stdout.decode(errors="replace").split("\0"):
+        if not record:
+            continue
+        # "<mode> <sha> <stage>\t<path>"
+        meta, _, path = record.partition("\t")
+        parts = meta.split(" ")
+        if len(parts) == 3 and path not in dirty:
+            blobs[path.replace("/", os.sep)] = parts[1]
+    return blobs
+
+
+class ScanIndex:
+    """Persistent index of scan entries for one workspace."""
+
+    def __init__(self, index_path: Optional[Path], max_chars_per_file: int):
+        self.index_path = index_path
+        self.max_chars_per_file = max_chars_per_file
+        self.entries: Dict[str, dict] = {}
+        self._by_blob: Dict[str, dict] = {}
+        self._seen: set = set()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def path_for(workspace_path: Path) -> Optional[Path]:
+        """
+        Locate the index for a scanned directory.
+
+        Uses the `.kandra/` metadata folder of the standardized workspace
+        layout (`<workspace>/source` is scanned). Directories outside that
+        layout are scanned without a persistent index.
+        """
+        metadata_path = workspace_path.parent / ".kandra"
+        if metadata_path.is_dir():
+            return metadata_path / INDEX_FILENAME
+        return None
+
+    def load(self) -> "ScanIndex":
+        """Load entries from disk, discarding incompatible indexes."""
+        if not self.index_path or not self.index_path.exists():
+            return self
+
+        try:
+            data = json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return self
+
+        if (
+            data.get("version") != INDEX_VERSION
+            or data.get("max_chars_per_file") != self.max_chars_per_file
+        ):
+            return self
+
+        self.entries = data.get("entries", {})
+        self._by_blob = {
+            e["blob"]: e for e in self.entries.values() if e.get("blob")
+        }
+        return self
+
+    def lookup(self, rel_path: str, stat: os.stat_result) -> Optional[dict]:
+        """Return the cached entry if size and mtime still match."""
+        entry = self.entries.get(rel_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            self._seen.add(rel_path)
+            self.hits += 1
+            return entry
+        return None
+
+    def lookup_blob(self, rel_path: str, stat: os.stat_result, blob: str) -> Optional[dict]:
+        """Content-hash fallback: reuse any entry with the same blob id."""
+        entry = self._by_blob.get(blob)
+        if not entry:
+            return None
+
+        # Refresh the stat signature so the next scan hits the fast path
+        refreshed = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        self.entries[rel_path] = refreshed
+        self._seen.add(rel_path)
+        self.dirty = True
+        self.hits += 1
+        return refreshed
+
+    def store(self, rel_path: str, stat: os.stat_result, blob: Optional[str], content: Optional[str]) -> dict:
+        """Record a freshly read file (content is None for binary files)."""
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "blob": blob,
+            "content": content,
+        }
+        self.entries[rel_path] = entry
+        if blob:
+            self._by_blob[blob] = entry
+        self._seen.add(rel_path)
+        self.dirty = True
+        self.misses += 1
+        return entry
+
+    def save(self, prune: bool = True):
+        """
+        Persist the index, dropping entries for files that disappeared.
+
+        Pass prune=False after a partial walk so unvisited entries survive.
+        """
+        stale = set(self.entries) - self._seen if prune else set()
+        for rel_path in stale:
+            del self.entries[rel_path]
+
+        if not self.index_path or not (self.dirty or stale):
+            return
+
+        payload = {
+            "version": INDEX_VERSION,
+            "max_chars_per_file": self.max_chars_per_file,
+            "entries": self.entries,
+        }
+        tmp_path = self.index_path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(payload))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"[Scanner] Failed to persist scan index: {e}")
@@ -5,6 +5,8 @@ from pathlib import Path
 from typing import Optional
 
 from app.config import settings
+from app.services.scan_index import ScanIndex, git_blob_ids
+from app.services.tree_summary import summarize_tree
 
 
 # File extensions to include in analysis
@@ -22,6 +24,9 @@ CONFIG_FILES = {
     "next.config.js", "next.config.ts", "vite.config.ts", "webpack.config.js",
 }
 
+# Bytes inspected to decide whether a file is binary
+BINARY_SNIFF_BYTES = 8192
+
 SKIP_DIRS = {
     "node_modules", ".git", "__pycache__", ".next", "dist", "build",
     "target", "vendor", ".venv", "venv", ".tox", ".mypy_cache",
@@ -32,89 +37,235 @@ SKIP_DIRS = {
 class Scanner:
     """Scans workspace and extracts file content for analysis."""
     
-    def __init__(self, max_files: int = None, max_chars_per_file: int = None):
+    def __init__(self, max_files: int = None, max_chars_per_file: int = None, use_index: bool = None):
         self.max_files = max_files or settings.context_max_files
         self.max_chars_per_file = max_chars_per_file or settings.context_max_chars_per_file
+        self.use_index = settings.scan_index_enabled if use_index is None else use_index
+        self.max_tree_lines = settings.scan_tree_max_lines
+        self.max_tree_chars = settings.scan_tree_max_chars
     
-    def scan(self, workspace_path: str) -> dict:
+    def scan(self, workspace_path: str, streaming: bool = None) -> dict:
         """
         Scan workspace and return structured data for analysis.
         
+        File contents are served from the workspace scan index when the
+        file is unchanged, so repeated scans only read modified files.
+        In streaming mode the walk stops as soon as the file and tree
+        budgets are met (see `iter_scan`).
+        
+        The tree is summarized to `scan_tree_max_chars`: every top-level
+        entry is listed and large directories are aggregated into counts
+        and dominant extensions (see `summarize_tree`).
+        
         Returns:
             {
-                "tree": str,  # Directory tree structure
+                "tree": str,  # Summarized directory tree
                 "files": [
-                    {"path": str, "content": str, "language": str}
+                    {"path": str, "content": str, "language": str, "size": int}
                 ],
                 "stats": {
                     "total_files": int,
                     "included_files": int,
-                    "languages": {lang: count}
+                    "languages": {lang: count},  # Across all walked files
+                    "index_hits": int,
+                    "index_misses": int,
+                    "complete": bool  # False if the walk stopped early
                 }
             }
         """
-        workspace = Path(workspace_path)
-        if not workspace.exists():
-            raise FileNotFoundError(f"Workspace not found: {workspace_path}")
+        if streaming is None:
+            streaming = settings.scan_streaming
         
-        # Build tree structure
-        tree_lines = []
+        file_paths = []
+        skipped_dirs = []
         files = []
         language_counts = {}
         total_files = 0
+        stats = {}
         
-        for root, dirs, filenames in os.walk(workspace):
-            # Skip excluded directories
-            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for item in self.iter_scan(workspace_path, stop_early=streaming, summary=stats):
+            if item["kind"] == "tree":
+                continue
+            if item["kind"] == "skipped":
+                skipped_dirs.append(item["path"])
+                continue
             
-            rel_root = Path(root).relative_to(workspace)
-            depth = len(rel_root.parts)
-            indent = "  " * depth
+            total_files += 1
+            file_paths.append(item["path"])
+            filename = os.path.basename(item["path"])
+            language = item["language"] or self._detect_language(filename, os.path.splitext(filename)[1].lower())
+            if language != "Unknown":
+                language_counts[language] = language_counts.get(language, 0) + 1
             
-            if depth > 0:
-                tree_lines.append(f"{indent}{rel_root.name}/")
-            
-            for filename in sorted(filenames):
-                total_files += 1
-                file_path = Path(root) / filename
-                rel_path = file_path.relative_to(workspace)
-                ext = file_path.suffix.lower()
-                
-                tree_lines.append(f"{indent}  {filename}")
-                
-                # Check if we should include content
-                is_config = filename in CONFIG_FILES
-                is_code = ext in CODE_EXTENSIONS
-                
-                if (is_config or is_code) and len(files) < self.max_files:
-                    try:
-                        content = file_path.read_text(errors="ignore")
-                        # Truncate if too long
-                        if len(content) > self.max_chars_per_file:
-                            content = content[:self.max_chars_per_file] + "\n... (truncated)"
-                        
-                        # Detect language
-                        language = self._detect_language(filename, ext)
-                        language_counts[language] = language_counts.get(language, 0) + 1
-                        
-                        files.append({
-                            "path": str(rel_path),
-                            "content": content,
-                            "language": language,
-                        })
-                    except Exception:
-                        pass  # Skip unreadable files
+            if item.get("content") is not None:
+                files.append({
+                    "path": item["path"],
+                    "content": item["content"],
+                    "language": language,
+                    "size": item["size"],
+                })
+        
+        tree = summarize_tree(file_paths, skipped_dirs, self.max_tree_chars, priority_files=CONFIG_FILES)
+        if not stats.get("complete", True):
+            tree += "\n... (walk stopped early, tree is partial)"
         
         return {
-            "tree": "\n".join(tree_lines[:100]),  # Limit tree size
+            "tree": tree,
             "files": files,
             "stats": {
                 "total_files": total_files,
                 "included_files": len(files),
                 "languages": language_counts,
+                "index_hits": stats.get("index_hits", 0),
+                "index_misses": stats.get("index_misses", 0),
+                "complete": stats.get("complete", True),
             },
         }
     
+    def iter_scan(self, workspace_path: str, stop_early: bool = True, summary: Optional[dict] = None):
+        """
+        Walk the workspace with `os.scandir` and yield results as they are found.
+        
+        Yields dicts of three kinds:
+            {"kind": "tree", "line": str}
+            {"kind": "file", "path": str, "size": int,
+             "content": Optional[str], "language": Optional[str]}
+            {"kind": "skipped", "path": str}  # Vendored/generated dir not walked
+        
+        `content` is only set for the first `max_files` code/config files that
+        are not binary; only a prefix of each file is read. With `stop_early`
+        the walk ends once the file budget and the tree line budget are both
+        met, so memory and I/O stay bounded regardless of repository size.
+        If `summary` is given it is filled with index stats and completeness.
+        """
+        workspace = Path(workspace_path)
+        if not workspace.exists():
+            raise FileNotFoundError(f"Workspace not found: {workspace_path}")
+        
+        index_path = ScanIndex.path_for(workspace) if self.use_index else None
+        index = ScanIndex(index_path, self.max_chars_per_file).load()
+        git_blobs = None  # Loaded lazily on the first stat miss
+        
+        included = 0
+        tree_count = 0
+        complete = True
+        
+        # Depth-first walk: directory line, its files, then its subdirectories
+        stack = [(str(workspace), "", 0)]
+        try:
+            while stack:
+                dir_path, rel_dir, depth = stack.pop()
+                indent = "  " * depth
+                
+                if depth > 0:
+                    tree_count += 1
+                    yield {"kind": "tree", "line": f"{indent}{os.path.basename(dir_path)}/"}
+                
+                try:
+                    with os.scandir(dir_path) as it:
+                        entries = sorted(it, key=lambda e: e.name)
+                except OSError:
+                    continue
+                
+                subdirs = []
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    
+                    if is_dir:
+                        if entry.name not in SKIP_DIRS:
+                            subdirs.append(entry)
+                        elif not entry.name.startswith((".", "__")):
+                            # Report vendored/build dirs, not VCS or cache dirs
+                            yield {
+                                "kind": "skipped",
+                                "path": os.path.join(rel_dir, entry.name) if rel_dir else entry.name,
+                            }
+                        continue
+                    
+                    if stop_early and included >= self.max_files and tree_count >= self.max_tree_lines:
+                        complete = False
+                        return
+                    
+                    filename = entry.name
+                    rel_path = os.path.join(rel_dir, filename) if rel_dir else filename
+                    ext = os.path.splitext(filename)[1].lower()
+                    
+                    tree_count += 1
+                    yield {"kind": "tree", "line": f"{indent}  {filename}"}
+                    
+                    item = {"kind": "file", "path": rel_path, "size": 0, "content": None, "language": None}
+                    
+                    # Check if we should include content
+                    is_config = filename in CONFIG_FILES
+                    is_code = ext in CODE_EXTENSIONS
+                    
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                        item["size"] = stat.st_size
+                        
+                        if (is_config or is_code) and included < self.max_files:
+                            cached = index.lookup(rel_path, stat)
+                            
+                            if cached is None:
+                                if git_blobs is None:
+                                    git_blobs = git_blob_ids(workspace)
+                                blob = git_blobs.get(rel_path)
+                                if blob:
+                                    cached = index.lookup_blob(rel_path, stat, blob)
+                            
+                            if cached is None:
+                                content = self._read_prefix(entry.path)
+                                cached = index.store(rel_path, stat, blob, content)
+                            
+                            if cached["content"] is not None:
+                                included += 1
+                                item["content"] = cached["content"]
+                                item["language"] = self._detect_language(filename, ext)
+                    except Exception:
+                        pass  # Skip unreadable files
+                    
+                    yield item
+                
+                if stop_early and included >= self.max_files and tree_count >= self.max_tree_lines:
+                    complete = not subdirs and not stack
+                    return
+                
+                for sub in reversed(subdirs):
+                    sub_rel = os.path.join(rel_dir, sub.name) if rel_dir else sub.name
+                    stack.append((sub.path, sub_rel, depth + 1))
+        finally:
+            index.save(prune=complete)
+            if summary is not None:
+                summary.update({
+                    "index_hits": index.hits,
+                    "index_misses": index.misses,
+                    "complete": complete,
+                })
+    
+    def _read_prefix(self, file_path: str) -> Optional[str]:
+        """
+        Read only the bytes needed for `max_chars_per_file` characters.
+        
+        Returns None for binary files (NUL byte in the first block).
+        """
+        # UTF-8 needs at most 4 bytes per character
+        max_bytes = self.max_chars_per_file * 4
+        with open(file_path, "rb") as f:
+            data = f.read(min(BINARY_SNIFF_BYTES, max_bytes))
+            if b"\0" in data:
+                return None
+            if len(data) == min(BINARY_SNIFF_BYTES, max_bytes):
+                data += f.read(max_bytes - len(data) + 1)
+        
+        content = data[:max_bytes].decode("utf-8", errors="ignore")
+        # Truncate if too long
+        if len(content) > self.max_chars_per_file or len(data) > max_bytes:
+            content = content[:self.max_chars_per_file] + "\n... (truncated)"
+        return content
+    
     def _detect_language(self, filename: str, ext: str) -> str:
         """Detect programming language from filename/extension."""
         lang_map = {
@@ -149,5 +300,6 @@ class Scanner:
         return lang_map.get(ext, "Unknown")
 
 
-# Singleton instance
-scanner = Scanner()
+# Singleton instance (collects a wide candidate pool; the context packer
+# decides what actually goes into the prompt)
+scanner = Scanner(max_files=settings.context_candidate_files)
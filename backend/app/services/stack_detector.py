@@ -0,0 +1,471 @@
+"""Stack detector - fingerprints a codebase from its dependency manifests."""
+
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:  # pragma: no cover - older runtimes use the regex fallback
+    tomllib = None
+
+
+# Manifests are only trusted this many directories below the root
+MAX_MANIFEST_DEPTH = 2
+
+# Largest manifest read from disk
+MAX_MANIFEST_BYTES = 1024 * 1024
+
+# manifest filename -> (ecosystem, language)
+MANIFESTS = {
+    "package.json": ("node", "JavaScript"),
+    "requirements.txt": ("python", "Python"),
+    "pyproject.toml": ("python", "Python"),
+    "go.mod": ("go", "Go"),
+    "Cargo.toml": ("rust", "Rust"),
+    "Gemfile.lock": ("ruby", "Ruby"),
+    "Gemfile": ("ruby", "Ruby"),
+    "pom.xml": ("java", "Java"),
+}
+
+# Runtime name used when no framework is recognized
+ECOSYSTEM_RUNTIMES = {
+    "node": "Node.js",
+    "python": "Python",
+    "go": "Go",
+    "rust": "Rust",
+    "ruby": "Ruby",
+    "java": "Java",
+}
+
+# (ecosystem, dependency, framework, kind) in precedence order.
+# Kinds: "meta" frameworks include their UI library, "server" frameworks
+# compete with each other, "ui" libraries are reported next to a server.
+FRAMEWORKS = [
+    ("node", "next", "Next.js", "meta"),
+    ("node", "nuxt", "Nuxt", "meta"),
+    ("node", "@remix-run/node", "Remix", "meta"),
+    ("node", "@sveltejs/kit", "SvelteKit", "meta"),
+    ("node", "@nestjs/core", "NestJS", "server"),
+    ("node", "fastify", "Fastify", "server"),
+    ("node", "express", "Express.js", "server"),
+    ("node", "koa", "Koa", "server"),
+    ("node", "hono", "Hono", "server"),
+    ("node", "@hapi/hapi", "hapi", "server"),
+    ("node", "@angular/core", "Angular", "ui"),
+    ("node", "react", "React", "ui"),
+    ("node", "vue", "Vue", "ui"),
+    ("node", "svelte", "Svelte", "ui"),
+    ("python", "django", "Django", "server"),
+    ("python", "fastapi", "FastAPI", "server"),
+    ("python", "flask", "Flask", "server"),
+    ("python", "starlette", "Starlette", "server"),
+    ("python", "tornado", "Tornado", "server"),
+    ("python", "aiohttp", "aiohttp", "server"),
+    ("go", "github.com/gin-gonic/gin", "Gin", "server"),
+    ("go", "github.com/gofiber/fiber", "Fiber", "server"),
+    ("go", "github.com/labstack/echo", "Echo", "server"),
+    ("go", "github.com/go-chi/chi", "chi", "server"),
+    ("go", "github.com/gorilla/mux", "Gorilla Mux", "server"),
+    ("rust", "actix-web", "Actix Web", "server"),
+    ("rust", "axum", "Axum", "server"),
+    ("rust", "rocket", "Rocket", "server"),
+    ("ruby", "rails", "Ruby on Rails", "server"),
+    ("ruby", "sinatra", "Sinatra", "server"),
+    ("java", "spring-boot", "Spring Boot", "server"),
+    ("java", "quarkus", "Quarkus", "server"),
+    ("java", "micronaut", "Micronaut", "server"),
+]
+
+# dependency -> data layer shown as "with X"
+DATA_LIBRARIES = {
+    "mongoose": "MongoDB", "mongodb": "MongoDB", "pymongo": "MongoDB", "motor": "MongoDB",
+    "prisma": "Prisma", "@prisma/client": "Prisma", "typeorm": "TypeORM", "sequelize": "Sequelize",
+    "pg": "PostgreSQL", "psycopg2": "PostgreSQL", "psycopg2-binary": "PostgreSQL", "asyncpg": "PostgreSQL",
+    "mysql": "MySQL", "mysql2": "MySQL", "pymysql": "MySQL",
+    "sqlalchemy": "SQLAlchemy", "redis": "Redis", "ioredis": "Redis",
+    "gorm.io/gorm": "GORM", "diesel": "Diesel", "sqlx": "SQLx",
+    "activerecord": "ActiveRecord", "spring-boot-starter-data-jpa": "JPA",
+}
+
+
+def _normalize(name: str) -> str:
+    """Normalize a dependency name for matching (PEP 503 style for Python)."""
+    return re.sub(r"[_.]+", "-", name.strip().lower()) if "/" not in name else name.strip().lower()
+
+
+def _major_version(spec: Optional[str]) -> Optional[str]:
+    """
+    Extract the major version from a requirement spec ('^14.1.0' -> '14').
+    0.x releases keep the minor version ('>=0.110.0' -> '0.110'), which is
+    where their breaking changes go.
+    """
+    if not spec or not isinstance(spec, str):
+        return None
+    match = re.search(r"(\d+)(?:\.(\d+))?", spec)
+    if not match:
+        return None
+    if match.group(1) == "0" and match.group(2):
+        return f"0.{match.group(2)}"
+    return match.group(1)
+
+
+def _toml_tables(content: str) -> Dict[str, dict]:
+    """
+    Parse the TOML tables needed here.
+
+    Uses tomllib when available; otherwise a line-based fallback that
+    understands `[table]` headers, `key = "value"`, inline tables and
+    (multi-line) string arrays, which covers dependency declarations.
+    """
+    if tomllib:
+        try:
+            data = tomllib.loads(content)
+        except tomllib.TOMLDecodeError:
+            return {}
+        tables: Dict[str, dict] = {}
+
+        def flatten(prefix: str, table: dict):
+            tables[prefix] = table
+            for key, value in table.items():
+                if isinstance(value, dict):
+                    flatten(f"{prefix}.{key}" if prefix else key, value)
+
+        flatten("", data)
+        return tables
+
+    tables = {"": {}}
+    current = tables[""]
+    array_key = None
+    for raw in content.splitlines():
+        line = raw.split("#", 1)[0].strip() if '"' not in raw else raw.strip()
+        if not line:
+            continue
+        if array_key:
+            current[array_key].extend(re.findall(r"""["']([^"']+)["']""", line))
+            if "]" in line:
+                array_key = None
+            continue
+        header = re.match(r"^\[+([^\]]+)\]+$", line)
+        if header:
+            current = tables.setdefault(header.group(1).strip(), {})
+            continue
+        pair = re.match(r"""^["']?([\w.\-]+)["']?\s*=\s*(.+)$""", line)
+        if not pair:
+            continue
+        key, value = pair.group(1), pair.group(2).strip()
+        if value.startswith("["):
+            current[key] = re.findall(r"""["']([^"']+)["']""", value)
+            if "]" not in value:
+                array_key = key
+        elif value.startswith("{"):
+            version = re.search(r"""version\s*=\s*["']([^"']+)["']""", value)
+            current[key] = {"version": version.group(1) if version else None}
+        else:
+            current[key] = value.strip("\"'")
+    return tables
+
+
+# === Manifest parsers: content -> {dependency: version spec or None} ===
+
+def parse_package_json(content: str) -> Dict[str, Optional[str]]:
+    data = json.loads(content)
+    deps: Dict[str, Optional[str]] = {}
+    for section in ("peerDependencies", "devDependencies", "dependencies"):
+        for name, spec in (data.get(section) or {}).items():
+            deps[_normalize(name)] = spec if isinstance(spec, str) else None
+    return deps
+
+
+def _parse_requirement(line: str) -> Optional[Tuple[str, Optional[str]]]:
+    line = line.split("#", 1)[0].split(";", 1)[0].strip()
+    if not line or line.startswith("-"):
+        return None
+    match = re.match(r"^([A-Za-z0-9][A-Za-z0-9._\-]*)(?:\[[^\]]*\])?\s*(.*)$", line)
+    if not match:
+        return None
+    return _normalize(match.group(1)), match.group(2) or None
+
+
+def parse_requirements_txt(content: str) -> Dict[str, Optional[str]]:
+    deps = {}
+    for line in content.splitlines():
+        parsed = _parse_requirement(line)
+        if parsed:
+            deps[parsed[0]] = parsed[1]
+    return deps
+
+
+def parse_pyproject_toml(content: str) -> Dict[str, Optional[str]]:
+    tables = _toml_tables(content)
+    deps: Dict[str, Optional[str]] = {}
+
+    # PEP 621
+    for requirement in tables.get("project", {}).get("dependencies", []) or []:
+        parsed = _parse_requirement(requirement)
+        if parsed:
+            deps[parsed[0]] = parsed[1]
+
+    # Poetry
+    for name, spec in tables.get("tool.poetry.dependencies", {}).items():
+        if name.lower() == "python":
+            continue
+        if isinstance(spec, dict):
+            spec = spec.get("version")
+        deps[_normalize(name)] = spec if isinstance(spec, str) else None
+    return deps
+
+
+def parse_go_mod(content: str) -> Dict[str, Optional[str]]:
+    deps = {}
+    in_block = False
+    for line in content.splitlines():
+        line = line.split("//", 1)[0].strip()
+        if line.startswith("require ("):
+            in_block = True
+            continue
+        if in_block and line == ")":
+            in_block = False
+            continue
+        if line.startswith("require "):
+            line = line[len("require "):]
+        elif not in_block:
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            # Strip major-version suffixes: github.com/gofiber/fiber/v2
+            module = re.sub(r"/v\d+$", "", parts[0].lower())
+            deps[module] = parts[1]
+    return deps
+
+
+def parse_cargo_toml(content: str) -> Dict[str, Optional[str]]:
+    tables = _toml_tables(content)
+    deps: Dict[str, Optional[str]] = {}
+    for table in ("dependencies", "workspace.dependencies"):
+        for name, spec in tables.get(table, {}).items():
+            if isinstance(spec, dict):
+                spec = spec.get("version")
+            deps[_normalize(name)] = spec if isinstance(spec, str) else None
+    return deps
+
+
+def parse_gemfile_lock(content: str) -> Dict[str, Optional[str]]:
+    deps = {}
+    # Top-level gems are indented by 4 spaces under "specs:"
+    for match in re.finditer(r"^    ([A-Za-z0-9_.\-]+) \(([^)]+)\)$", content, re.M):
+        deps[_normalize(match.group(1))] = match.group(2)
+    return deps
+
+
+def parse_gemfile(content: str) -> Dict[str, Optional[str]]:
+    deps = {}
+    for match in re.finditer(r"""^\s*gem\s+["']([^"']+)["'](?:\s*,\s*["']([^"']+)["'])?""", content, re.M):
+        deps[_normalize(match.group(1))] = match.group(2)
+    return deps
+
+
+def parse_pom_xml(content: str) -> Dict[str, Optional[str]]:
+    root = ET.fromstring(content)
+    # Drop XML namespaces so paths stay readable
+    for element in root.iter():
+        if isinstance(element.tag, str) and "}" in element.tag:
+            element.tag = element.tag.split("}", 1)[1]
+
+    deps: Dict[str, Optional[str]] = {}
+    for dep in root.findall("./parent") + root.findall(".//dependencies/dependency"):
+        artifact = dep.findtext("artifactId")
+        if artifact:
+            deps[_normalize(artifact)] = dep.findtext("version")
+    return deps
+
+
+PARSERS = {
+    "package.json": parse_package_json,
+    "requirements.txt": parse_requirements_txt,
+    "pyproject.toml": parse_pyproject_toml,
+    "go.mod": parse_go_mod,
+    "Cargo.toml": parse_cargo_toml,
+    "Gemfile.lock": parse_gemfile_lock,
+    "Gemfile": parse_gemfile,
+    "pom.xml": parse_pom_xml,
+}
+
+
+def _find_manifests(files: List[dict], source_path: Optional[Path]) -> Dict[str, str]:
+    """
+    Collect manifest contents keyed by relative path.
+
+    Manifests are read from disk when the checkout is available, because
+    scanned content is truncated and Gemfile.lock is not scanned at all.
+    """
+    paths = {
+        f["path"] for f in files
+        if os.path.basename(f["path"]) in MANIFESTS and f["path"].count(os.sep) <= MAX_MANIFEST_DEPTH
+    }
+    contents = {f["path"]: f["content"] for f in files if f["path"] in paths}
+
+    if source_path and source_path.is_dir():
+        for name in MANIFESTS:
+            if (source_path / name).is_file():
+                paths.add(name)
+        for rel_path in paths:
+            full_path = source_path / rel_path
+            try:
+                if full_path.stat().st_size <= MAX_MANIFEST_BYTES:
+                    contents[rel_path] = full_path.read_text(encoding="utf-8", errors="replace")
+            except OSError:
+                continue
+    return contents
+
+
+def _match_frameworks(ecosystem: str, deps: Dict[str, Optional[str]]) -> List[Tuple[str, str, Optional[str]]]:
+    """Frameworks present in `deps` as (name, kind, major version), by precedence."""
+    matches = []
+    for rule_ecosystem, dependency, name, kind in FRAMEWORKS:
+        if rule_ecosystem != ecosystem:
+            continue
+        found = [d for d in deps if d == dependency or (ecosystem == "java" and d.startswith(dependency))]
+        if found:
+            matches.append((name, kind, _major_version(deps[found[0]])))
+    return matches
+
+
+def detect_stack(files: List[dict], source_path=None) -> dict:
+    """
+    Fingerprint the stack from dependency manifests.
+
+    Args:
+        files: Scanned files ({path, content, language})
+        source_path: Checkout root, used to read manifests in full
+
+    Returns:
+        {
+            "stack": str,           # e.g. "Next.js 14 with Prisma (TypeScript)"
+            "language": str,
+            "ecosystem": str|None,
+            "framework": str|None,
+            "version": str|None,    # Framework major version (major.minor for 0.x)
+            "confidence": float,    # 0.0-1.0
+            "manifests": [path, ...],
+            "dependencies": [name, ...],
+            "evidence": [str, ...]
+        }
+    """
+    source_path = Path(source_path) if source_path else None
+    language_counts = Counter(f.get("language") for f in files if f.get("language"))
+
+    # ecosystem -> (shallowest depth, merged dependencies, manifest paths)
+    ecosystems: Dict[str, Tuple[int, Dict[str, Optional[str]], List[str]]] = {}
+    evidence = []
+    for rel_path, content in sorted(_find_manifests(files, source_path).items()):
+        name = os.path.basename(rel_path)
+        ecosystem, _ = MANIFESTS[name]
+        try:
+            deps = PARSERS[name](content)
+        except Exception as e:
+            evidence.append(f"{rel_path}: unparseable ({e.__class__.__name__})")
+            continue
+        depth = rel_path.count(os.sep)
+        previous = ecosystems.get(ecosystem, (depth, {}, []))
+        merged = dict(previous[1])
+        for dep, spec in deps.items():
+            if merged.get(dep) is None:
+                merged[dep] = spec
+        ecosystems[ecosystem] = (min(depth, previous[0]), merged, previous[2] + [rel_path])
+
+    if not ecosystems:
+        language = language_counts.most_common(1)[0][0] if language_counts else "Unknown"
+        return {
+            "stack": language,
+            "language": language,
+            "ecosystem": None,
+            "framework": None,
+            "version": None,
+            "confidence": 0.3 if language_counts else 0.0,
+            "manifests": [],
+            "dependencies": [],
+            "evidence": evidence + ["No dependency manifest found"],
+        }
+
+    # Primary ecosystem: shallowest manifest, then most source files
+    ecosystem_languages = {ecosystem: language for ecosystem, language in MANIFESTS.values()}
+
+    def source_share(ecosystem: str) -> int:
+        if ecosystem == "node":
+            return sum(n for lang, n in language_counts.items() if "Script" in lang or lang in ("React", "Vue"))
+        return language_counts.get(ecosystem_languages[ecosystem], 0)
+
+    primary = min(ecosystems, key=lambda e: (ecosystems[e][0], -source_share(e)))
+    depth, deps, manifests = ecosystems[primary]
+    language = ecosystem_languages[primary]
+    if primary == "node" and ("typescript" in deps or any(
+        os.path.basename(f["path"]) == "tsconfig.json" for f in files
+    )):
+        language = "TypeScript"
+
+    matches = _match_frameworks(primary, deps)
+    confidence = 0.6
+    framework = version = None
+    parts = []
+    if matches:
+        name, kind, version = matches[0]
+        framework = name
+        parts.append(f"{name} {version}" if version else name)
+        if kind == "ui":
+            # A UI library alone leaves the server/build side unknown
+            confidence = 0.65
+            evidence.append(f"Only a UI library matched ({name}); no server or meta framework")
+        else:
+            confidence = 0.9
+        if version:
+            confidence += 0.05
+
+        servers = [m for m in matches if m[1] == "server"]
+        uis = [m for m in matches if m[1] == "ui"]
+        if kind == "server" and len(servers) > 1:
+            # e.g. express and fastify both declared: ambiguous
+            confidence -= 0.15
+            evidence.append(f"Competing frameworks: {', '.join(m[0] for m in servers)}")
+        if kind == "server" and uis:
+            parts.append(f"+ {uis[0][0]}")
+    else:
+        parts.append(ECOSYSTEM_RUNTIMES[primary])
+
+    data_layers = []
+    for dep in deps:
+        layer = DATA_LIBRARIES.get(dep)
+        if layer and layer not in data_layers:
+            data_layers.append(layer)
+    if data_layers:
+        parts.append("with " + " and ".join(data_layers[:2]))
+    if language == "TypeScript":
+        parts.append("(TypeScript)")
+
+    if depth > 0:
+        confidence -= 0.1
+        evidence.append("Manifests only found below the repository root")
+    others = [e for e in ecosystems if e != primary and ecosystems[e][0] <= depth]
+    if others:
+        confidence -= 0.2
+        evidence.append(f"Other ecosystems at the same level: {', '.join(others)}")
+
+    evidence.insert(0, f"{', '.join(manifests)}: {len(deps)} dependencies")
+    if framework:
+        evidence.insert(1, f"Framework dependency: {framework}" + (f" {version}" if version else ""))
+
+    return {
+        "stack": " ".join(parts),
+        "language": language,
+        "ecosystem": primary,
+        "framework": framework,
+        "version": version,
+        "confidence": round(max(0.0, min(1.0, confidence)), 2),
+        "manifests": manifests,
+        "dependencies": list(deps)[:30],
+        "evidence": evidence,
+    }
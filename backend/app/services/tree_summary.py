@@ -0,0 +1,177 @@
+"""Tree summarizer - renders a repository tree within a character budget.
+
+Directories start collapsed into one aggregate line (file count and dominant
+extensions). The largest, shallowest directories are expanded first while the
+budget allows; top-level entries are always shown.
+"""
+
+import heapq
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+
+INDENT = "  "
+
+# Files listed per expanded directory before the rest are aggregated
+MAX_FILES_PER_DIR = 12
+
+# Extensions named in an aggregate line
+TOP_EXTENSIONS = 3
+
+
+class TreeNode:
+    """Directory with aggregate counts of everything below it."""
+
+    __slots__ = ("name", "depth", "files", "dirs", "total_files", "extensions", "vendored")
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.files: List[str] = []
+        self.dirs: Dict[str, "TreeNode"] = {}
+        self.total_files = 0
+        self.extensions: Counter = Counter()
+        self.vendored = False
+
+    def child(self, name: str) -> "TreeNode":
+        node = self.dirs.get(name)
+        if node is None:
+            node = self.dirs[name] = TreeNode(name, self.depth + 1)
+        return node
+
+
+def _extension(filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return ext or filename
+
+
+def _describe(counts: Counter, total: int) -> str:
+    """'124 files: .ts 80, .tsx 30, +14'"""
+    label = f"{total} file{'s' if total != 1 else ''}"
+    if not counts:
+        return label
+    top = counts.most_common(TOP_EXTENSIONS)
+    shown = sum(n for _, n in top)
+    parts = [f"{ext} {n}" for ext, n in top]
+    if total > shown:
+        parts.append(f"+{total - shown}")
+    return f"{label}: {', '.join(parts)}"
+
+
+def _dir_summary(node: TreeNode) -> str:
+    if node.vendored:
+        return f"{node.name}/ (vendored or generated, not scanned)"
+    if not node.total_files:
+        return f"{node.name}/ (empty)"
+    return f"{node.name}/ ({_describe(node.extensions, node.total_files)})"
+
+
+def build_tree(file_paths: Iterable[str], vendored_dirs: Iterable[str] = ()) -> TreeNode:
+    """Build the directory model from relative file paths."""
+    root = TreeNode("", -1)
+    for rel_path in file_paths:
+        *parts, filename = rel_path.split(os.sep)
+        ext = _extension(filename)
+        node = root
+        node.total_files += 1
+        node.extensions[ext] += 1
+        for part in parts:
+            node = node.child(part)
+            node.total_files += 1
+            node.extensions[ext] += 1
+        node.files.append(filename)
+
+    for rel_dir in vendored_dirs:
+        node = root
+        for part in rel_dir.split(os.sep):
+            node = node.child(part)
+        node.vendored = True
+    return root
+
+
+def _file_lines(node: TreeNode, priority: frozenset) -> List[str]:
+    """File lines of an expanded directory (overflow aggregated into one line)."""
+    files = sorted(node.files, key=lambda f: (f not in priority, f))
+    if len(files) <= MAX_FILES_PER_DIR + 1:
+        return files
+    lines = files[:MAX_FILES_PER_DIR]
+    rest = files[MAX_FILES_PER_DIR:]
+    if rest:
+        counts = Counter(_extension(f) for f in rest)
+        lines.append(f"... {_describe(counts, len(rest))}")
+    return lines
+
+
+def _line_cost(depth: int, text: str) -> int:
+    return len(INDENT) * max(depth, 0) + len(text) + 1
+
+
+def _expanded_cost(node: TreeNode, priority: frozenset) -> int:
+    """Characters to show a directory's header, its files and collapsed subdirectories."""
+    cost = _line_cost(node.depth, f"{node.name}/") if node.depth >= 0 else 0
+    for sub in node.dirs.values():
+        cost += _line_cost(sub.depth, _dir_summary(sub))
+    for line in _file_lines(node, priority):
+        cost += _line_cost(node.depth + 1, line)
+    return cost
+
+
+def summarize_tree(
+    file_paths: Iterable[str],
+    vendored_dirs: Iterable[str] = (),
+    max_chars: int = 6000,
+    priority_files: Iterable[str] = (),
+) -> str:
+    """
+    Render a compact tree that fits `max_chars`.
+
+    Args:
+        file_paths: Relative paths of every file found
+        vendored_dirs: Relative paths of skipped directories (shown collapsed)
+        max_chars: Character budget (top-level entries may exceed it)
+        priority_files: File names listed first in a directory (e.g. manifests)
+    """
+    priority = frozenset(priority_files)
+    root = build_tree(file_paths, vendored_dirs)
+
+    expanded = {id(root)}
+    used = _expanded_cost(root, priority)
+
+    # Expand shallow, large directories first
+    heap: List[Tuple[int, int, int, TreeNode]] = []
+    counter = 0
+
+    def push_children(node: TreeNode):
+        nonlocal counter
+        for sub in node.dirs.values():
+            if not sub.vendored and (sub.files or sub.dirs):
+                heapq.heappush(heap, (sub.depth, -sub.total_files, counter, sub))
+                counter += 1
+
+    push_children(root)
+    while heap:
+        _, _, _, node = heapq.heappop(heap)
+        delta = _expanded_cost(node, priority) - _line_cost(node.depth, _dir_summary(node))
+        if used + delta > max_chars:
+            continue
+        used += delta
+        expanded.add(id(node))
+        push_children(node)
+
+    lines: List[str] = []
+
+    def render(node: TreeNode):
+        for name in sorted(node.dirs):
+            sub = node.dirs[name]
+            if id(sub) in expanded:
+                lines.append(f"{INDENT * sub.depth}{sub.name}/")
+                render(sub)
+            else:
+                lines.append(f"{INDENT * sub.depth}{_dir_summary(sub)}")
+        for line in _file_lines(node, priority):
+            lines.append(f"{INDENT * (node.depth + 1)}{line}")
+
+    render(root)
+    return "\n".join(lines)
+
@@ -0,0 +1,189 @@
+"""Workspace reaper - evicts stale workspaces to keep disk usage under quota."""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.services.clone import CloneService, clone_service
+
+
+# Jobs in these states are reading or writing their workspace right now
+ACTIVE_JOB_STATUSES = {"ANALYZING", "PLANNING", "EXECUTING"}
+
+# Jobs waiting on the user: kept out of quota eviction, but often abandoned,
+# so they still expire after WORKSPACE_CLEANUP_AFTER_HOURS of inactivity
+WAITING_JOB_STATUSES = {"CREATED", "AWAITING_APPROVAL"}
+
+
+def disk_usage(path: Path) -> int:
+    """Bytes allocated on disk below a directory (symlinks are not followed)."""
+    total = 0
+    stack = [str(path)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            st = entry.stat(follow_symlinks=False)
+                            total += getattr(st, "st_blocks", 0) * 512 or st.st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+class WorkspaceReaper:
+    """
+    Periodically removes workspaces that are idle too long or that push the
+    workspace volume over its disk quota (least recently used first).
+    Workspaces of active jobs are never touched; those of jobs waiting on
+    the user (CREATED, AWAITING_APPROVAL) only expire when idle.
+    """
+
+    def __init__(self, clones: CloneService):
+        self.clones = clones
+        self._task: Optional[asyncio.Task] = None
+        # workspace path -> (last_access, size); idle workspaces don't change
+        self._size_cache: Dict[str, Tuple[float, int]] = {}
+
+    def start(self):
+        """Start the background reaper loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Stop the background reaper loop."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Reaper] Workspace GC failed: {e}")
+            await asyncio.sleep(settings.workspace_gc_interval_seconds)
+
+    async def run_once(self) -> dict:
+        """
+        Run one GC pass.
+
+        Returns:
+            {"evicted": [path, ...], "freed_bytes": int, "total_bytes": int}
+        """
+        active, waiting = await self._job_workspaces()
+        return await asyncio.to_thread(self._collect, active, waiting)
+
+    async def _job_workspaces(self) -> Tuple[Set[str], Set[str]]:
+        """
+        Resolved workspace paths of active jobs (including executions the
+        scheduler holds) and of jobs waiting on the user.
+        """
+        from app.db.database import async_session_context
+        from app.db.models import Job
+        from app.services.job_scheduler import job_scheduler
+
+        scheduled = job_scheduler.snapshot()
+        scheduled_ids = scheduled["running"] + scheduled["queued"]
+        async with async_session_context() as session:
+            result = await session.execute(
+                select(Job.workspace_path, Job.status).where(
+                    Job.status.in_(ACTIVE_JOB_STATUSES | WAITING_JOB_STATUSES) | Job.id.in_(scheduled_ids)
+                )
+            )
+            rows = result.all()
+
+        active = {str(Path(p).resolve()) for p, status in rows if p and status not in WAITING_JOB_STATUSES}
+        waiting = {str(Path(p).resolve()) for p, status in rows if p and status in WAITING_JOB_STATUSES}
+        return active, waiting - active
+
+    def _size(self, path: Path, last_access: float) -> int:
+        cached = self._size_cache.get(str(path))
+        if cached and cached[0] == last_access:
+            return cached[1]
+        size = disk_usage(path)
+        self._size_cache[str(path)] = (last_access, size)
+        return size
+
+    def _collect(self, active: Set[str], waiting: Set[str] = frozenset()) -> dict:
+        now = time.time()
+        max_idle = settings.workspace_cleanup_after_hours * 3600
+        min_idle = settings.workspace_gc_min_idle_minutes * 60
+        quota = settings.workspace_disk_quota_mb * 1024 * 1024
+
+        # (last_access, path, size, is_mirror)
+        entries: List[Tuple[float, Path, int, bool]] = []
+        for path in self.clones.list_workspaces():
+            last_access = self.clones.last_access(path)
+            entries.append((last_access, path, self._size(path, last_access), False))
+
+        if self.clones.mirrors_path.exists():
+            for mirror in self.clones.mirrors_path.iterdir():
+                if mirror.is_dir() and mirror.suffix == ".git":
+                    last_access = mirror.stat().st_mtime
+                    entries.append((last_access, mirror, self._size(mirror, last_access), True))
+
+        total = sum(e[2] for e in entries)
+        evicted = []
+        freed = 0
+
+        def evictable(last_access: float, path: Path, is_mirror: bool) -> bool:
+            if str(path.resolve()) in active:
+                return False
+            if is_mirror and self.clones.is_mirror_busy(path):
+                return False
+            return now - last_access >= min_idle
+
+        def evict(path: Path, size: int, is_mirror: bool, reason: str):
+            nonlocal total, freed
+            removed = self.clones.remove_mirror(path) if is_mirror else self.clones.remove_workspace(path)
+            if not removed:
+                return
+            print(f"[Reaper] Evicted {path.name} ({size / 1024 / 1024:.1f} MB, {reason})")
+            self._size_cache.pop(str(path), None)
+            evicted.append(str(path))
+            total -= size
+            freed += size
+
+        # 1. Idle expiry (mirrors are only evicted under quota pressure)
+        for last_access, path, size, is_mirror in entries:
+            if not is_mirror and now - last_access > max_idle and evictable(last_access, path, is_mirror):
+                evict(path, size, is_mirror, "idle")
+
+        # 2. Quota: least recently used first, workspaces before mirrors
+        if quota and total > quota:
+            remaining = [e for e in entries if str(e[1]) not in evicted]
+            remaining.sort(key=lambda e: (e[3], e[0]))
+            for last_access, path, size, is_mirror in remaining:
+                if total <= quota:
+                    break
+                if str(path.resolve()) in waiting:
+                    continue  # Only idle expiry removes a workspace awaiting the user
+                if evictable(last_access, path, is_mirror):
+                    evict(path, size, is_mirror, "quota")
+
+            if total > quota:
+                print(f"[Reaper] Still over quota ({total / 1024 / 1024:.0f} MB): remaining workspaces are in use")
+
+        return {"evicted": evicted, "freed_bytes": freed, "total_bytes": total}
+
+
+# Singleton instance
+workspace_reaper = WorkspaceReaper(clone_service)
@@ -1,5 +1,5 @@
 import os
-from typing import Any, Dict, List
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from app.tools.base import BaseTool, ToolResult
 
 class ListDirTool(BaseTool):
@@ -58,8 +58,10 @@ class ReadFileTool(BaseTool):
     name = "read_file"
     description = "Read the contents of a file"
     
-    def __init__(self, workspace_path: str):
+    def __init__(self, workspace_path: str, materializer: Optional[Callable[[str], Awaitable[bool]]] = None):
         self.workspace_path = workspace_path
+        # Called with the full path of a missing file (e.g. sparse checkout)
+        self.materializer = materializer
         
     def get_schema(self) -> Dict[str, Any]:
         return {
@@ -73,6 +75,8 @@ class ReadFileTool(BaseTool):
     async def execute(self, path: str) -> ToolResult:
         try:
             full_path = os.path.join(self.workspace_path, path)
+            if not os.path.exists(full_path) and self.materializer:
+                await self.materializer(full_path)
             if not os.path.exists(full_path):
                 return ToolResult(output="", error=f"File not found: {path}")
                 
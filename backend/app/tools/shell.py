@@ -144,6 +144,13 @@ class ShellTool(BaseTool):
                     except: pass
                     hang_reason = f"Command timed out after {final_timeout}s without completion or Ready signal."
 
+            except asyncio.CancelledError:
+                # Job cancelled: take the whole process tree down with it
+                try:
+                    os.killpg(os.getpgid(process.pid), signal.SIGKILL)
+                except: pass
+                readers.cancel()
+                raise
             except Exception as e:
                 print(f"Error in monitor loop: {e}")
                 try: process.kill()
@@ -0,0 +1,123 @@
+"""CloneService against local file:// repositories (no network)."""
+
+import asyncio
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from app.config import settings
+from app.services.clone import CloneService
+
+
+def git(*args, cwd):
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=str(cwd), check=True, capture_output=True,
+    )
+
+
+def commit_files(work: Path, files: dict, message: str):
+    for rel_path, content in files.items():
+        path = work / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    git("add", "-A", cwd=work)
+    git("commit", "-m", message, cwd=work)
+    git("push", "origin", "HEAD", cwd=work)
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """A bare repository (served over file://) plus a working copy that pushes to it."""
+    bare = tmp_path / "origin.git"
+    git("init", "--bare", str(bare), cwd=tmp_path)
+    # Partial clones need the server to accept --filter
+    git("config", "uploadpack.allowFilter", "true", cwd=bare)
+
+    work = tmp_path / "work"
+    git("clone", str(bare), str(work), cwd=tmp_path)
+    commit_files(work, {
+        "README.md": "# demo\n",
+        "svc/app.py": "print('svc')\n",
+        "other/lib.py": "print('other')\n",
+    }, "initial")
+    return {"url": bare.resolve().as_uri(), "work": work}
+
+
+@pytest.fixture
+def clones(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "workspace_base_path", str(tmp_path / "workspaces"))
+    monkeypatch.setattr(settings, "clone_mirror_cache", True)
+    monkeypatch.setattr(settings, "clone_partial", False)
+    return CloneService()
+
+
+def test_clone_creates_mirror_and_workspace(clones, origin):
+    result = asyncio.run(clones.clone(origin["url"], "demo"))
+
+    source = Path(result["source_path"])
+    assert (source / "svc" / "app.py").read_text() == "print('svc')\n"
+    assert (Path(result["workspace_path"]) / "target").is_dir()
+    assert "via mirror cache" in result["message"]
+    assert (clones.get_mirror_path(origin["url"]) / "HEAD").exists()
+
+
+def test_second_clone_refetches_mirror(clones, origin):
+    first = asyncio.run(clones.clone(origin["url"], "demo"))
+    commit_files(origin["work"], {"svc/new.py": "x = 1\n"}, "add new.py")
+
+    second = asyncio.run(clones.clone(origin["url"], "demo"))
+
+    assert first["workspace_path"] != second["workspace_path"]
+    assert not (Path(first["source_path"]) / "svc" / "new.py").exists()
+    assert (Path(second["source_path"]) / "svc" / "new.py").read_text() == "x = 1\n"
+    # Still a single mirror for the URL
+    assert len(list(clones.mirrors_path.glob("*.git"))) == 1
+
+
+def test_sparse_clone_materializes_on_demand(clones, origin):
+    result = asyncio.run(clones.clone(origin["url"], "demo", sparse_paths=["svc"]))
+    source = Path(result["source_path"])
+
+    assert result["sparse"]
+    assert (source / "README.md").exists()
+    assert (source / "svc" / "app.py").exists()
+    assert not (source / "other").exists()
+
+    assert asyncio.run(clones.materialize(source, "other/lib.py"))
+    assert (source / "other" / "lib.py").read_text() == "print('other')\n"
+    # Untracked paths and escapes are refused
+    assert not asyncio.run(clones.materialize(source, "missing.py"))
+    assert not asyncio.run(clones.materialize(source, "../outside"))
+
+
+def test_partial_clone_fetches_missing_blobs(clones, origin):
+    result = asyncio.run(clones.clone(origin["url"], "demo", partial=True, sparse_paths=["svc"]))
+    source = Path(result["source_path"])
+
+    assert "via mirror cache" not in result["message"]
+    assert not (source / "other").exists()
+    assert asyncio.run(clones.materialize(source, "other"))
+    assert (source / "other" / "lib.py").read_text() == "print('other')\n"
+
+
+def test_waiter_reusing_a_refresh_is_checked_against_the_remote(clones, origin, monkeypatch, tmp_path):
+    # Same mirror key, but this URL's access is refused (as with wrong credentials)
+    refused_url = (tmp_path / "no-access.git").as_uri()
+    mirror_for = clones.get_mirror_path
+    monkeypatch.setattr(clones, "get_mirror_path", lambda url: mirror_for(origin["url"]))
+
+    async def scenario():
+        return await asyncio.gather(
+            clones._refresh_mirror(origin["url"]),
+            clones._refresh_mirror(refused_url),
+            clones._refresh_mirror(origin["url"]),
+            return_exceptions=True,
+        )
+
+    authorised, refused, reused = asyncio.run(scenario())
+
+    assert (authorised / "HEAD").exists()
+    assert isinstance(refused, Exception) and "git ls-remote failed" in str(refused)
+    assert reused == authorised
@@ -0,0 +1,181 @@
+"""Gemini context caches and the executor's fallback to the inline phase brief (fake client)."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.agents.executor as executor_module
+import app.integrations.gemini as gemini
+from app.agents.executor import ExecutorAgent
+from app.config import settings
+
+
+class FakeCaches:
+    def __init__(self, fail_create=False):
+        self.fail_create = fail_create
+        self.created = []
+        self.deleted = []
+
+    async def create(self, model, config):
+        if self.fail_create:
+            raise RuntimeError("400 CachedContent is too small")
+        self.created.append((model, config))
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    async def delete(self, name):
+        self.deleted.append(name)
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    fake = FakeCaches()
+    client = SimpleNamespace(aio=SimpleNamespace(caches=fake))
+    monkeypatch.setattr(gemini, "get_client", lambda: client)
+    monkeypatch.setattr(settings, "gemini_context_cache_enabled", True)
+    monkeypatch.setattr(settings, "gemini_context_cache_min_tokens", 50)
+    monkeypatch.setattr(settings, "gemini_context_cache_ttl_seconds", 600)
+    return fake
+
+
+BRIEF = [{"role": "user", "parts": [{"text": "phase brief " * 50}]}]
+
+
+def test_create_context_cache_returns_name(caches):
+    name = asyncio.run(gemini.create_context_cache(BRIEF, system_instruction="system", display_name="demo"))
+
+    assert name == "cachedContents/1"
+    model, config = caches.created[0]
+    assert model == settings.gemini_model
+    assert config.ttl == "600s"
+    assert config.display_name == "demo"
+
+
+def test_create_context_cache_skips_small_or_disabled(caches, monkeypatch):
+    small = [{"role": "user", "parts": [{"text": "hi"}]}]
+    assert asyncio.run(gemini.create_context_cache(small)) is None
+
+    monkeypatch.setattr(settings, "gemini_context_cache_enabled", False)
+    assert asyncio.run(gemini.create_context_cache(BRIEF)) is None
+    assert caches.created == []
+
+
+def test_create_context_cache_returns_none_when_refused(caches):
+    caches.fail_create = True
+    assert asyncio.run(gemini.create_context_cache(BRIEF)) is None
+
+
+def test_delete_context_cache(caches):
+    asyncio.run(gemini.delete_context_cache("cachedContents/7"))
+    assert caches.deleted == ["cachedContents/7"]
+
+
+def test_is_context_cache_error():
+    assert gemini.is_context_cache_error(Exception("404 NOT_FOUND: CachedContent not found"))
+    assert gemini.is_context_cache_error(Exception("403 PERMISSION_DENIED on cached content"))
+    assert not gemini.is_context_cache_error(Exception("429 RESOURCE_EXHAUSTED"))
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    job = SimpleNamespace(
+        id="job-1",
+        workspace_path=str(tmp_path),
+        target_stack="Node.js",
+        source_stack="Express",
+        repo_url="https://github.com/acme/demo",
+    )
+    agent = ExecutorAgent(job, session=None)
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def no_purge():
+        return []
+
+    agent.events = []
+
+    async def emit(event_type, payload, checkpoint=False):
+        agent.events.append(event_type)
+
+    monkeypatch.setattr(agent, "_emit", emit)
+    monkeypatch.setattr(agent, "_set_activity", noop)
+    monkeypatch.setattr(agent, "_check_token_budget", noop)
+    monkeypatch.setattr(agent, "_ensure_python_venv", noop)
+    monkeypatch.setattr(agent, "_purge_pollution", no_purge)
+    monkeypatch.setattr(settings, "gemini_fast_model", "")
+    return agent
+
+
+def run_phase_with(agent, monkeypatch, responses):
+    """Run one phase against scripted generate() results; returns the generate() calls."""
+    created, deleted, calls = [], [], []
+
+    async def create(contents, system_instruction=None, ttl_seconds=None, display_name=None):
+        created.append(display_name)
+        return "cachedContents/phase"
+
+    async def delete(name):
+        deleted.append(name)
+
+    async def generate(prompt, **kwargs):
+        calls.append({"prompt": prompt, **kwargs})
+        result = responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(executor_module, "create_context_cache", create)
+    monkeypatch.setattr(executor_module, "delete_context_cache", delete)
+    monkeypatch.setattr(gemini, "generate", generate)
+
+    phase = {"id": 1, "title": "Port models", "tasks": ["Port the models"], "files_impacted": []}
+    try:
+        asyncio.run(agent._execute_phase(phase))
+    finally:
+        agent.created, agent.deleted = created, deleted
+    return calls
+
+
+def brief_inline(call) -> bool:
+    return any("Port the models" in part["text"] for turn in call["prompt"] for part in turn["parts"])
+
+
+def test_executor_uses_cache_and_deletes_it_on_phase_exit(agent, monkeypatch):
+    calls = run_phase_with(agent, monkeypatch, [
+        {"thought": "Look around", "tool": "list_dir", "args": {"path": "."}},
+        {"thought": "Done", "status": "complete"},
+    ])
+
+    assert agent.created == ["kandra-job-1-phase-1"]
+    assert [c["cached_content"] for c in calls] == ["cachedContents/phase"] * 2
+    assert not any(brief_inline(c) for c in calls)
+    assert agent.deleted == ["cachedContents/phase"]
+    assert agent._phase_caches == {}
+    assert "phase_completed" in agent.events
+
+
+def test_executor_falls_back_to_inline_brief_when_cache_expires(agent, monkeypatch):
+    calls = run_phase_with(agent, monkeypatch, [
+        Exception("404 NOT_FOUND: CachedContent not found (or permission denied)"),
+        {"thought": "Done", "status": "complete"},
+    ])
+
+    assert calls[0]["cached_content"] == "cachedContents/phase"
+    assert not brief_inline(calls[0])
+    # The retry carries the brief itself instead of the expired cache
+    assert calls[1]["cached_content"] is None
+    assert brief_inline(calls[1])
+    # Nothing left to delete: the expired cache was dropped
+    assert agent.deleted == []
+    assert "phase_completed" in agent.events
+
+
+def test_executor_deletes_cache_when_phase_fails(agent, monkeypatch):
+    with pytest.raises(Exception, match="terminated by agent"):
+        run_phase_with(agent, monkeypatch, [
+            {"thought": "Cannot continue", "status": "blocked"},
+        ])
+
+    assert agent.deleted == ["cachedContents/phase"]
+    assert agent._phase_caches == {}
@@ -0,0 +1,133 @@
+"""JobScheduler cancellation."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.services.job_scheduler as job_scheduler_module
+from app.config import settings
+from app.services.job_scheduler import JobScheduler
+
+
+@pytest.fixture(autouse=True)
+def quiet(monkeypatch):
+    async def publish_event(channel, event):
+        return None
+
+    monkeypatch.setattr(job_scheduler_module, "publish_event", publish_event)
+    monkeypatch.setattr(settings, "scheduler_capacity", 1.0)
+    monkeypatch.setattr(settings, "scheduler_default_weight", 1.0)
+    monkeypatch.setattr(settings, "scheduler_stack_weights", {})
+
+
+def job(job_id):
+    return SimpleNamespace(id=job_id, owner="me", priority=0, target_stack="", repo_url="")
+
+
+def test_cancel_running_and_queued_jobs():
+    async def scenario():
+        scheduler = JobScheduler()
+        started = asyncio.Event()
+
+        async def run():
+            started.set()
+            await asyncio.sleep(10)
+
+        await scheduler.submit(job("a"), run)
+        assert await scheduler.submit(job("b"), run) == 1
+        await started.wait()
+
+        assert await scheduler.cancel("b") == "queued"
+        assert await scheduler.cancel("a") == "running"
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["running"] == []
+        assert await scheduler.cancel("missing") is None
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_the_cancel_request_propagates():
+    async def scenario():
+        scheduler = JobScheduler()
+        started = asyncio.Event()
+
+        async def slow_to_stop():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                await asyncio.shield(asyncio.sleep(0.2))  # Cleanup outlives the cancel request
+
+        await scheduler.submit(job("a"), slow_to_stop)
+        await started.wait()
+
+        request = asyncio.create_task(scheduler.cancel("a"))
+        await asyncio.sleep(0.05)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+
+    asyncio.run(scenario())
+
+
+class FakeSession:
+    """Just enough AsyncSession for cancel_job; `final_status` is what the run left."""
+
+    def __init__(self, job, final_status):
+        self.job = job
+        self.final_status = final_status
+        self.added = []
+
+    async def execute(self, statement):
+        return SimpleNamespace(scalar_one_or_none=lambda: self.job)
+
+    async def refresh(self, job):
+        job.status = self.final_status
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        return None
+
+
+@pytest.fixture
+def jobs_api(monkeypatch):
+    import app.api.jobs as jobs_api
+
+    async def publish_event(channel, event):
+        return None
+
+    async def cancel(job_id):
+        return "running"
+
+    monkeypatch.setattr(jobs_api, "publish_event", publish_event)
+    monkeypatch.setattr(jobs_api.job_scheduler, "cancel", cancel)
+    return jobs_api
+
+
+def test_cancel_job_marks_a_stopped_execution_cancelled(jobs_api):
+    job = SimpleNamespace(id="a", status="EXECUTING", updated_at=None)
+    session = FakeSession(job, final_status="EXECUTING")
+
+    result = asyncio.run(jobs_api.cancel_job("a", session=session))
+
+    assert result == {"status": "cancelled", "job_id": "a", "was": "running"}
+    assert job.status == "CANCELLED"
+    assert [event.event_type for event in session.added] == ["job_cancelled"]
+
+
+@pytest.mark.parametrize("final_status", ["COMPLETED", "FAILED"])
+def test_cancel_job_keeps_a_status_the_run_reached_first(jobs_api, final_status):
+    from fastapi import HTTPException
+
+    job = SimpleNamespace(id="a", status="EXECUTING", updated_at=None)
+    session = FakeSession(job, final_status=final_status)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(jobs_api.cancel_job("a", session=session))
+
+    assert raised.value.status_code == 409
+    assert job.status == final_status
+    assert session.added == []
@@ -0,0 +1,81 @@
+"""Record/replay transport for Gemini HTTP traffic."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.integrations.llm_transport import CassetteMiss, RecordingTransport, ReplayTransport
+
+API_KEY = "AIza-secret-test-key"
+URL = f"https://generativelanguage.googleapis.com/v1beta/models/m:generateContent?key={API_KEY}"
+
+
+def upstream(request: httpx.Request) -> httpx.Response:
+    prompt = json.loads(request.content)["prompt"]
+    return httpx.Response(200, json={"text": f"answer to {prompt}"})
+
+
+async def post(transport, prompt, url=URL):
+    async with httpx.AsyncClient(transport=transport) as client:
+        response = await client.post(url, json={"prompt": prompt}, headers={"x-goog-api-key": API_KEY})
+        return response.status_code, response.json()
+
+
+@pytest.fixture
+def cassette(tmp_path):
+    path = tmp_path / "cassettes" / "gemini.jsonl"
+
+    async def record():
+        transport = RecordingTransport(httpx.MockTransport(upstream), path)
+        return [await post(transport, "one"), await post(transport, "two")]
+
+    assert asyncio.run(record()) == [
+        (200, {"text": "answer to one"}),
+        (200, {"text": "answer to two"}),
+    ]
+    return path
+
+
+def test_record_strips_the_api_key(cassette):
+    exchanges = [json.loads(line) for line in cassette.read_text().splitlines()]
+
+    assert [e["endpoint"] for e in exchanges] == ["/v1beta/models/m:generateContent"] * 2
+    assert API_KEY not in cassette.read_text()
+
+
+def test_replay_serves_recorded_responses_by_body(cassette):
+    async def replay():
+        transport = ReplayTransport(cassette, latency="zero")
+        # Out of order: matched by body, not position
+        results = [await post(transport, "two"), await post(transport, "one")]
+        # A repeat of a recorded request gets its last response again
+        results.append(await post(transport, "one"))
+        return results, transport.hits
+
+    results, hits = asyncio.run(replay())
+
+    assert [body["text"] for _, body in results] == ["answer to two", "answer to one", "answer to one"]
+    assert hits == 2
+
+
+def test_replay_miss_fails_loudly(cassette):
+    async def replay():
+        transport = ReplayTransport(cassette, latency="zero")
+        await post(transport, "a prompt the cassette never saw")
+
+    with pytest.raises(CassetteMiss, match="LLM_REPLAY_FALLBACK"):
+        asyncio.run(replay())
+
+
+def test_replay_fallback_serves_next_exchange_of_the_endpoint(cassette):
+    async def replay():
+        transport = ReplayTransport(cassette, latency="zero", fallback=True)
+        result = await post(transport, "a prompt with /tmp/changed-path")
+        return result, transport.fallbacks
+
+    (status, body), fallbacks = asyncio.run(replay())
+
+    assert body == {"text": "answer to one"}
+    assert fallbacks == 1
@@ -0,0 +1,34 @@
+"""ModelRouter mode and escalation handling."""
+
+import pytest
+
+from app.config import settings
+from app.integrations.model_router import ModelRouter
+
+
+@pytest.fixture(autouse=True)
+def models(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_model", "main-model")
+    monkeypatch.setattr(settings, "gemini_fast_model", "fast-model")
+    monkeypatch.setattr(settings, "model_escalation_steps", 2)
+
+
+@pytest.mark.parametrize("mode", ["fast", "tiered"])
+def test_escalation_uses_main_model(monkeypatch, mode):
+    monkeypatch.setattr(settings, "model_routing", {"executor": mode})
+    router = ModelRouter("executor")
+    router.record_tool("list_dir", True)
+    assert router.choose()[0] == "fast-model"
+
+    router.escalate("tool loop")
+
+    assert router.choose() == ("main-model", "escalated: tool loop")
+    assert router.choose()[0] == "main-model"
+    assert router.choose()[0] == ("fast-model" if mode == "fast" else "main-model")
+
+
+def test_main_mode_never_uses_fast_model(monkeypatch):
+    monkeypatch.setattr(settings, "model_routing", {"executor": "main"})
+    router = ModelRouter("executor")
+    router.record_tool("read_file", True)
+    assert router.choose()[0] == "main-model"
@@ -0,0 +1,72 @@
+"""ExecutorAgent._run_phase_graph: concurrency, checkpoints and failures."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents.executor import ExecutorAgent
+from app.config import settings
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    job = SimpleNamespace(id="job-1", workspace_path=str(tmp_path), target_stack="Node.js", source_stack="Express")
+    agent = ExecutorAgent(job, session=None)
+    agent.checkpoints = []
+
+    async def emit(event_type, payload, checkpoint=False):
+        return None
+
+    async def write_checkpoint(phases, done):
+        agent.checkpoints.append(sorted(phases[i]["id"] for i in done))
+
+    monkeypatch.setattr(agent, "_emit", emit)
+    monkeypatch.setattr(agent, "_write_checkpoint", write_checkpoint)
+    monkeypatch.setattr(settings, "executor_max_parallel_phases", 2)
+    return agent
+
+
+PHASES = [
+    {"id": 1, "title": "Port models", "files_impacted": [{"target": "models.py"}]},
+    {"id": 2, "title": "Port routes", "files_impacted": [{"target": "routes.py"}]},
+    {"id": 3, "title": "Port views", "files_impacted": [{"target": "views.py"}]},
+]
+
+
+def test_failure_is_raised_after_recording_phases_finished_with_it(agent, monkeypatch):
+    async def scenario():
+        release = asyncio.Event()
+        started = []
+
+        async def execute_phase(phase):
+            started.append(phase["id"])
+            if len(started) == 2:
+                release.set()
+            await release.wait()
+            if phase["id"] == 1:
+                raise RuntimeError("phase 1 broke")
+
+        monkeypatch.setattr(agent, "_execute_phase", execute_phase)
+        with pytest.raises(RuntimeError, match="phase 1 broke"):
+            await agent._run_phase_graph(PHASES)
+        return started
+
+    started = asyncio.run(scenario())
+
+    assert started == [1, 2]
+    # One checkpoint for the batch, including phase 2 which finished alongside the failure
+    assert agent.checkpoints == [[2]]
+
+
+def test_completed_phases_are_skipped(agent, monkeypatch):
+    ran = []
+
+    async def execute_phase(phase):
+        ran.append(phase["id"])
+
+    monkeypatch.setattr(agent, "_execute_phase", execute_phase)
+    asyncio.run(agent._run_phase_graph(PHASES, completed={1}))
+
+    assert sorted(ran) == [2, 3]
+    assert agent.checkpoints[-1] == [1, 2, 3]
@@ -0,0 +1,40 @@
+"""Phase dependency derivation."""
+
+from app.agents.phase_graph import build_dependencies, describe
+
+
+def phase(phase_id, title, files=(), depends_on=None):
+    data = {"id": phase_id, "title": title, "files_impacted": [{"target": f} for f in files]}
+    if depends_on is not None:
+        data["depends_on"] = depends_on
+    return data
+
+
+def test_derived_dependencies():
+    phases = [
+        phase(1, "Project setup"),
+        phase(2, "Port models", ["app/models.py"]),
+        phase(3, "Port routes", ["app/routes.py"]),
+        phase(4, "Add model helpers", ["./target/app/models.py"]),
+        phase(5, "Verification"),
+    ]
+    assert describe(phases, build_dependencies(phases)) == {
+        "1": [], "2": [1], "3": [1], "4": [1, 2], "5": [1, 2, 3, 4],
+    }
+
+
+def test_declared_dependencies_only_add_edges():
+    phases = [
+        phase(1, "Scaffold the project", depends_on=[]),
+        phase(2, "Port models", ["app/models.py"], depends_on=[]),
+        phase(3, "Port routes", ["app/routes.py"], depends_on=[2]),
+        phase(4, "Integration tests", depends_on=[3]),
+    ]
+    assert describe(phases, build_dependencies(phases)) == {
+        "1": [], "2": [1], "3": [1, 2], "4": [1, 2, 3],
+    }
+
+
+def test_unknown_and_self_dependencies_are_ignored():
+    phases = [phase(1, "Port models", depends_on=[1, 99]), phase(2, "Port views", depends_on=["x"])]
+    assert build_dependencies(phases) == [set(), set()]
@@ -0,0 +1,127 @@
+"""ModelLimiter's circuit breaker: the half-open probe is always released."""
+
+import asyncio
+
+import pytest
+from google.genai import errors
+
+from app.config import settings
+from app.integrations.rate_limiter import CircuitOpenError, ModelLimiter
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setattr(settings, "gemini_requests_per_minute", 0)
+    monkeypatch.setattr(settings, "gemini_model_rpm", {})
+    monkeypatch.setattr(settings, "gemini_max_retries", 0)
+    monkeypatch.setattr(settings, "gemini_circuit_failure_threshold", 1)
+    monkeypatch.setattr(settings, "gemini_circuit_reset_seconds", 0.01)
+    return ModelLimiter("test-model")
+
+
+def quota_error():
+    return errors.ClientError(429, {"error": {"code": 429, "message": "quota", "status": "RESOURCE_EXHAUSTED"}})
+
+
+def unavailable_error():
+    return errors.ServerError(503, {"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}})
+
+
+async def fail_with(error):
+    raise error
+
+
+async def ok():
+    return "ok"
+
+
+async def open_circuit(limiter):
+    with pytest.raises(errors.ServerError):
+        await limiter.call(lambda: fail_with(unavailable_error()))
+    assert limiter.breaker.state == "open"
+    await asyncio.sleep(0.02)  # Past the cooldown: the next call is the probe
+
+
+def test_cancelled_probe_releases_the_slot(limiter):
+    async def scenario():
+        await open_circuit(limiter)
+
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(10)
+
+        probe = asyncio.create_task(limiter.call(hang))
+        await started.wait()
+        assert limiter.breaker.state == "half_open"
+        # While the probe runs, everyone else is refused
+        with pytest.raises(CircuitOpenError):
+            await limiter.call(ok)
+
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # A new probe may go through and closes the circuit
+        assert await limiter.call(ok) == "ok"
+        assert limiter.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_throttled_probe_reopens_the_circuit(limiter):
+    async def scenario():
+        await open_circuit(limiter)
+
+        with pytest.raises(errors.ClientError):
+            await limiter.call(lambda: fail_with(quota_error()))
+        assert limiter.breaker.state == "open"
+        assert not limiter.breaker._probing
+
+        with pytest.raises(CircuitOpenError):
+            await limiter.call(ok)
+        await asyncio.sleep(0.02)
+        assert await limiter.call(ok) == "ok"
+        assert limiter.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_non_capacity_error_closes_the_circuit(limiter):
+    async def scenario():
+        await open_circuit(limiter)
+
+        bad_request = errors.ClientError(400, {"error": {"code": 400, "message": "bad", "status": "INVALID_ARGUMENT"}})
+        with pytest.raises(errors.ClientError):
+            await limiter.call(lambda: fail_with(bad_request))
+        assert limiter.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_failure_that_opens_the_circuit_raises_the_upstream_error(limiter, monkeypatch):
+    monkeypatch.setattr(settings, "gemini_circuit_failure_threshold", 2)
+    monkeypatch.setattr(settings, "gemini_max_retries", 5)
+    monkeypatch.setattr(settings, "gemini_retry_base_delay", 0.001)
+    limiter = ModelLimiter("test-model")
+    attempts = []
+
+    async def overloaded():
+        attempts.append(1)
+        raise unavailable_error()
+
+    with pytest.raises(errors.ServerError) as raised:
+        asyncio.run(limiter.call(overloaded))
+
+    # Retried until the circuit opened, then the 503 itself was raised
+    assert len(attempts) == 2
+    assert "overloaded" in str(raised.value)
+    assert isinstance(raised.value.__cause__, CircuitOpenError)
+    assert raised.value.retry_after == settings.gemini_circuit_reset_seconds
+    assert limiter.breaker.state == "open"
+
+    # Later callers get the circuit error without reaching the model
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(limiter.call(overloaded))
+    assert len(attempts) == 2
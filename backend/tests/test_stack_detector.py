@@ -0,0 +1,103 @@
+"""Stack fingerprints from dependency manifests."""
+
+import json
+
+import pytest
+
+from app.config import settings
+from app.services.stack_detector import detect_stack
+
+
+def write(root, files):
+    for rel_path, content in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def detect(root, files, languages=()):
+    write(root, files)
+    scanned = [{"path": f"src/file{i}", "content": "", "language": lang} for i, lang in enumerate(languages)]
+    return detect_stack(scanned, root)
+
+
+def package_json(dependencies, dev_dependencies=None):
+    return json.dumps({"dependencies": dependencies, "devDependencies": dev_dependencies or {}})
+
+
+def test_node_server_framework(tmp_path):
+    result = detect(tmp_path, {
+        "package.json": package_json({"express": "^4.18.2", "mongoose": "^7.0.0"}),
+    }, ["JavaScript"] * 3)
+
+    assert result["stack"] == "Express.js 4 with MongoDB"
+    assert result["framework"] == "Express.js"
+    assert result["confidence"] == 0.95
+    assert result["confidence"] >= settings.stack_detection_confidence_threshold
+
+
+def test_meta_framework_with_typescript(tmp_path):
+    result = detect(tmp_path, {
+        "package.json": package_json({"next": "14.1.0", "react": "18.2.0"}, {"typescript": "^5"}),
+    })
+
+    assert result["stack"] == "Next.js 14 (TypeScript)"
+    assert result["confidence"] == 0.95
+
+
+def test_ui_library_alone_stays_below_the_grounding_threshold(tmp_path):
+    result = detect(tmp_path, {"package.json": package_json({"react": "^18.2.0"})})
+
+    assert result["framework"] == "React"
+    assert result["confidence"] == 0.7
+    assert result["confidence"] < settings.stack_detection_confidence_threshold
+    assert any("Only a UI library" in e for e in result["evidence"])
+
+
+def test_pyproject_keeps_minor_version_of_0x_releases(tmp_path):
+    result = detect(tmp_path, {
+        "pyproject.toml": (
+            '[project]\n'
+            'name = "svc"\n'
+            'dependencies = ["fastapi>=0.110.0", "sqlalchemy[asyncio]>=2.0"]\n'
+        ),
+    }, ["Python"])
+
+    assert result["stack"] == "FastAPI 0.110 with SQLAlchemy"
+    assert result["version"] == "0.110"
+    assert result["confidence"] == 0.95
+
+
+def test_go_mod(tmp_path):
+    result = detect(tmp_path, {
+        "go.mod": (
+            "module example.com/svc\n\n"
+            "go 1.22\n\n"
+            "require (\n"
+            "\tgithub.com/gofiber/fiber/v2 v2.52.0\n"
+            "\tgorm.io/gorm v1.25.7 // indirect\n"
+            ")\n"
+        ),
+    }, ["Go"])
+
+    assert result["stack"] == "Fiber 2 with GORM"
+    assert result["ecosystem"] == "go"
+    assert result["confidence"] == 0.95
+
+
+@pytest.mark.parametrize("files, expected_stack, expected_confidence", [
+    # No framework: runtime only
+    ({"requirements.txt": "requests==2.31.0\n"}, "Python", 0.6),
+    # Competing servers are ambiguous
+    ({"package.json": package_json({"express": "^4", "fastify": "^4"})}, "Fastify 4", 0.8),
+    # Manifest only in a subdirectory
+    ({"api/requirements.txt": "flask==3.0.0\n"}, "Flask 3", 0.85),
+])
+def test_confidence_penalties(tmp_path, files, expected_stack, expected_confidence):
+    write(tmp_path, files)
+    scanned = [{"path": path, "content": content, "language": None} for path, content in files.items()]
+
+    result = detect_stack(scanned, tmp_path)
+
+    assert result["stack"] == expected_stack
+    assert result["confidence"] == expected_confidence
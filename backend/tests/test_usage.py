@@ -0,0 +1,112 @@
+"""Token usage of coalesced (singleflight) Gemini calls."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.integrations.gemini as gemini
+from app.config import settings
+from app.integrations.usage import usage_ledger, usage_scope
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content(self, model, contents, config):
+        self.calls += 1
+        await asyncio.sleep(0.05)  # Long enough for the second caller to join
+        return SimpleNamespace(
+            text="hello",
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=10,
+                candidates_token_count=5,
+                cached_content_token_count=0,
+                total_token_count=15,
+            ),
+        )
+
+
+@pytest.fixture
+def models(monkeypatch):
+    fake = FakeModels()
+    client = SimpleNamespace(aio=SimpleNamespace(models=fake))
+    monkeypatch.setattr(gemini, "get_client", lambda: client)
+    monkeypatch.setattr(settings, "llm_cache_enabled", False)
+    return fake
+
+
+def test_coalesced_callers_are_each_charged(models):
+    async def ask(job_id):
+        with usage_scope(job_id=job_id, call_site="analyzer"):
+            return await gemini.generate("same prompt")
+
+    async def scenario():
+        return await asyncio.gather(ask("job-a"), ask("job-b"))
+
+    calls_before = usage_ledger.totals["calls"]
+    tokens_before = usage_ledger.totals["total_tokens"]
+
+    assert asyncio.run(scenario()) == ["hello", "hello"]
+
+    assert models.calls == 1
+    for job_id in ("job-a", "job-b"):
+        usage = usage_ledger.snapshot(job_id)
+        assert usage["total_tokens"] == 15
+        assert usage["by_call_site"]["analyzer"]["calls"] == 1
+    assert [c["coalesced"] for c in usage_ledger.snapshot("job-b")["recent_calls"]] == [True]
+    # One upstream call in the process totals
+    assert usage_ledger.totals["calls"] == calls_before + 1
+    assert usage_ledger.totals["total_tokens"] == tokens_before + 15
+
+
+def test_uncoalesced_calls_are_charged_once(models):
+    async def scenario():
+        with usage_scope(job_id="job-c", call_site="analyzer"):
+            await gemini.generate("first prompt")
+            await gemini.generate("second prompt")
+
+    asyncio.run(scenario())
+
+    assert models.calls == 2
+    assert usage_ledger.snapshot("job-c")["total_tokens"] == 30
+
+
+def test_release_saves_usage_and_stops_tracking(models):
+    job = SimpleNamespace(id="job-d", token_usage=None)
+
+    async def scenario():
+        usage_ledger.attach(job)
+        with usage_scope(job_id=job.id, call_site="planner"):
+            await gemini.generate("plan prompt")
+
+    asyncio.run(scenario())
+    usage_ledger.release(job)
+
+    assert job.token_usage["total_tokens"] == 15
+    assert usage_ledger.snapshot(job.id) is None
+    # A later stage continues from the saved usage
+    assert usage_ledger.attach(job)["total_tokens"] == 15
+    usage_ledger.release(job)
+
+
+def test_analysis_usage_is_charged_to_the_job_created_from_it(models, tmp_path):
+    workspace = tmp_path / "demo_1234"
+    workspace.mkdir()
+
+    async def scenario():
+        with usage_scope(analysis_id=str(workspace)):
+            with usage_scope(call_site="analyzer"):
+                await gemini.generate("analysis prompt")
+
+    asyncio.run(scenario())
+    job = SimpleNamespace(id="job-e", token_usage=None)
+    usage_ledger.claim_analysis(job, str(workspace) + "/")
+
+    assert job.token_usage["total_tokens"] == 15
+    assert job.token_usage["by_call_site"]["analyzer"]["calls"] == 1
+    # Claimed once
+    other = SimpleNamespace(id="job-f", token_usage=None)
+    usage_ledger.claim_analysis(other, str(workspace))
+    assert other.token_usage is None
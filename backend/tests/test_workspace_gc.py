@@ -0,0 +1,66 @@
+"""WorkspaceReaper quota eviction of bare mirrors."""
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.clone import CloneService
+from app.services.workspace_gc import WorkspaceReaper
+
+
+@pytest.fixture
+def clones(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "workspace_base_path", str(tmp_path / "workspaces"))
+    monkeypatch.setattr(settings, "workspace_disk_quota_mb", 1e-6)  # Always over quota
+    monkeypatch.setattr(settings, "workspace_gc_min_idle_minutes", 30)
+    return CloneService()
+
+
+def make_mirror(clones, name, age_seconds):
+    mirror = clones.mirrors_path / f"{name}.git"
+    mirror.mkdir(parents=True)
+    (mirror / "HEAD").write_text("ref: refs/heads/main\n")
+    past = time.time() - age_seconds
+    os.utime(mirror, (past, past))
+    return mirror
+
+
+def test_quota_spares_leased_and_recently_used_mirrors(clones):
+    leased = make_mirror(clones, "leased", age_seconds=7200)
+    recent = make_mirror(clones, "recent", age_seconds=60)
+    stale = make_mirror(clones, "stale", age_seconds=7200)
+    reaper = WorkspaceReaper(clones)
+
+    with clones._lease_mirror(leased):
+        os.utime(leased, (time.time() - 7200,) * 2)  # Lease alone must protect it
+        result = reaper._collect(active=set())
+
+    assert result["evicted"] == [str(stale)]
+    assert leased.exists() and recent.exists()
+    assert not clones.is_mirror_busy(leased)
+
+
+def test_mirror_is_leased_during_the_local_clone(clones, tmp_path, monkeypatch):
+    mirror = make_mirror(clones, "demo", age_seconds=0)
+    monkeypatch.setattr(clones, "get_mirror_path", lambda url: mirror)
+    busy_during = {}
+
+    async def refresh_mirror(url, on_progress=None):
+        return mirror
+
+    async def run_git(args, cwd, timeout, on_progress=None):
+        busy_during[args[0]] = clones.is_mirror_busy(mirror)
+        return ""
+
+    monkeypatch.setattr(clones, "_refresh_mirror", refresh_mirror)
+    monkeypatch.setattr(clones, "_run_git", run_git)
+    monkeypatch.setattr(settings, "clone_mirror_cache", True)
+    monkeypatch.setattr(settings, "clone_partial", False)
+
+    asyncio.run(clones.clone("https://example.com/acme/demo.git", "demo"))
+
+    assert busy_during["clone"] is True
+    assert not clones.is_mirror_busy(mirror)